@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+解析星曆引擎
+不依賴 kerykeion / Swiss Ephemeris 的低精度星曆，全部以 NumPy 向量化，可一次計算整批出生時刻：
+- 太陽：Meeus《Astronomical Algorithms》第 25 章低精度解
+- 月亮：Meeus 第 47 章主要週期項（截斷至振幅 > 0.0005°）
+- 行星：JPL 近似 Kepler 軌道根數（1800-2050 年適用），含歲差與章動修正
+- 上升 / 天頂與宮位（Placidus、Porphyry、等宮制、整宮制）：由視恆星時與黃赤交角計算
+
+精度：太陽、月亮約 0.01-0.05°，行星多在 0.1° 以內（外行星可達數角分），
+足以判定星座與宮位；逐星座邊界的極端情況請使用真實引擎。
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from perf_timing import NULL_TIMER
+from zodiac import ELEMENTS, HOUSE_KEYS, HOUSE_SYSTEMS, PLANET_KEYS, PLANET_NAMES, QUALITIES, SIGN_CODES, SIGN_NAMES
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+J2000 = 2451545.0
+DEG = np.pi / 180.0
+
+# 精度層級：(月亮週期項數, Kepler 迭代次數, Placidus 迭代次數)
+# approx 只保留振幅 > 0.03° 的月亮項並減少迭代，供預覽使用
+PRECISION_LEVELS = {
+    'fast': (50, 6, 10),
+    'approx': (13, 3, 3),
+}
+
+# JPL 近似軌道根數 (J2000 黃道與春分點)：a, e, I, L, 近日點經度, 升交點經度，以及每儒略世紀變化率
+_ELEMENTS = {
+    'mercury': ((0.38709927, 0.20563593, 7.00497902, 252.25032350, 77.45779628, 48.33076593),
+                (0.00000037, 0.00001906, -0.00594749, 149472.67411175, 0.16047689, -0.12534081)),
+    'venus': ((0.72333566, 0.00677672, 3.39467605, 181.97909950, 131.60246718, 76.67984255),
+              (0.00000390, -0.00004107, -0.00078890, 58517.81538729, 0.00268329, -0.27769418)),
+    'earth': ((1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0),
+              (0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0)),
+    'mars': ((1.52371034, 0.09339410, 1.84969142, -4.55343205, -23.94362959, 49.55953891),
+             (0.00001847, 0.00007882, -0.00813131, 19140.30268499, 0.44441088, -0.29257343)),
+    'jupiter': ((5.20288700, 0.04838624, 1.30439695, 34.39644051, 14.72847983, 100.47390909),
+                (-0.00011607, -0.00013253, -0.00183714, 3034.74612775, 0.21252668, 0.20469106)),
+    'saturn': ((9.53667594, 0.05386179, 2.48599187, 49.95424423, 92.59887831, 113.66242448),
+               (-0.00125060, -0.00050991, 0.00193609, 1222.49362201, -0.41897216, -0.28867794)),
+    'uranus': ((19.18916464, 0.04725744, 0.77263783, 313.23810451, 170.95427630, 74.01692503),
+               (-0.00196176, -0.00004397, -0.00242939, 428.48202785, 0.40805281, 0.04240589)),
+    'neptune': ((30.06992276, 0.00859048, 1.77004347, -55.12002969, 44.96476227, 131.78422574),
+                (0.00026291, 0.00005105, 0.00035372, 218.45945325, -0.32241464, -0.00508664)),
+    'pluto': ((39.48211675, 0.24882730, 17.14001206, 238.92903833, 224.06891629, 110.30393684),
+              (-0.00031596, 0.00004818, 0.00000501, 145.20780515, -0.04062942, -0.01183482)),
+}
+
+_BODIES = list(_ELEMENTS)
+_EARTH = _BODIES.index('earth')
+_ELEMENT_BASE = np.array([_ELEMENTS[b][0] for b in _BODIES])  # (9, 6)
+_ELEMENT_RATE = np.array([_ELEMENTS[b][1] for b in _BODIES])
+
+# 月亮黃經週期項 (D, M, M', F, 係數 ×1e-6 度)，Meeus 表 47.A
+_MOON_TERMS = np.array([
+    (0, 0, 1, 0, 6288774), (2, 0, -1, 0, 1274027), (2, 0, 0, 0, 658314),
+    (0, 0, 2, 0, 213618), (0, 1, 0, 0, -185116), (0, 0, 0, 2, -114332),
+    (2, 0, -2, 0, 58793), (2, -1, -1, 0, 57066), (2, 0, 1, 0, 53322),
+    (2, -1, 0, 0, 45758), (0, 1, -1, 0, -40923), (1, 0, 0, 0, -34720),
+    (0, 1, 1, 0, -30383), (2, 0, 0, -2, 15327), (0, 0, 1, 2, -12528),
+    (0, 0, 1, -2, 10980), (4, 0, -1, 0, 10675), (0, 0, 3, 0, 10034),
+    (4, 0, -2, 0, 8548), (2, 1, -1, 0, -7888), (2, 1, 0, 0, -6766),
+    (1, 0, -1, 0, -5163), (1, 1, 0, 0, 4987), (2, -1, 1, 0, 4036),
+    (2, 0, 2, 0, 3994), (4, 0, 0, 0, 3861), (2, 0, -3, 0, 3665),
+    (0, 1, -2, 0, -2689), (2, 0, -1, 2, -2602), (2, -1, -2, 0, 2390),
+    (1, 0, 1, 0, -2348), (2, -2, 0, 0, 2236), (0, 1, 2, 0, -2120),
+    (0, 2, 0, 0, -2069), (2, -2, -1, 0, 2048), (2, 0, 1, -2, -1773),
+    (2, 0, 0, 2, -1595), (4, -1, -1, 0, 1215), (0, 0, 2, 2, -1110),
+    (3, 0, -1, 0, -892), (2, 1, 1, 0, -810), (4, -1, -2, 0, 759),
+    (0, 2, -1, 0, -713), (2, 2, -1, 0, -700), (2, 1, -2, 0, 691),
+    (2, -1, 0, -2, 596), (4, 0, 1, 0, 549), (0, 0, 4, 0, 537),
+    (4, -1, 0, 0, 520), (1, 0, -2, 0, -487),
+], dtype=np.float64)
+
+
+def julian_day(year, month, day, hour=0.0) -> np.ndarray:
+    """
+    格里曆日期轉儒略日（Meeus 7.1），全部參數可為陣列
+
+    Args:
+        hour: UT 小時（可含小數）
+    """
+    year = np.asarray(year, dtype=np.float64)
+    month = np.asarray(month, dtype=np.float64)
+    day = np.asarray(day, dtype=np.float64) + np.asarray(hour, dtype=np.float64) / 24.0
+    shift = month <= 2
+    y = np.where(shift, year - 1, year)
+    m = np.where(shift, month + 12, month)
+    a = np.floor(y / 100)
+    b = 2 - a + np.floor(a / 4)
+    return np.floor(365.25 * (y + 4716)) + np.floor(30.6001 * (m + 1)) + day + b - 1524.5
+
+
+def timezone_info(name: str):
+    """
+    IANA 時區物件；沒有 zoneinfo 模組（Python < 3.9）時無法解析，回傳 None 視為 UTC
+
+    Raises:
+        ValueError: 無法識別的時區（不當作 UTC，以免算出錯誤的上升與宮位）
+    """
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        raise ValueError(f"無法識別的時區: {name}") from None
+
+
+def utc_offset_hours(year: int, month: int, day: int, hour: int, minute: int, timezone: str) -> float:
+    """
+    當地時間相對 UTC 的時差（小時）
+
+    Raises:
+        ValueError: 無法識別的時區
+    """
+    tz = timezone_info(timezone)
+    if tz is None:
+        return 0.0
+    offset = datetime(year, month, day, hour, minute, tzinfo=tz).utcoffset() or timedelta(0)
+    return offset.total_seconds() / 3600.0
+
+
+def local_julian_day(year: int, month: int, day: int, hour: int, minute: int, timezone: str) -> float:
+    """當地時間轉 UT 儒略日"""
+    offset = utc_offset_hours(year, month, day, hour, minute, timezone)
+    return float(julian_day(year, month, day, hour + minute / 60.0 - offset))
+
+
+_J2000_UTC = datetime(2000, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+
+def datetime_from_jd(jd: float, tz=None) -> datetime:
+    """UT 儒略日轉時區時間（四捨五入到秒）；tz 為 None 時回傳 UTC"""
+    moment = _J2000_UTC + timedelta(days=float(jd) - J2000)
+    moment = moment.astimezone(tz) if tz is not None else moment
+    return moment.replace(microsecond=0) + timedelta(seconds=round(moment.microsecond / 1e6))
+
+
+def _centuries(jd) -> np.ndarray:
+    return (np.asarray(jd, dtype=np.float64) - J2000) / 36525.0
+
+
+def _nutation(t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """低精度章動（度）：(黃經章動, 交角章動)"""
+    omega = (125.04452 - 1934.136261 * t) * DEG
+    l_sun = (280.4665 + 36000.7698 * t) * DEG
+    l_moon = (218.3165 + 481267.8813 * t) * DEG
+    dpsi = (-17.20 * np.sin(omega) - 1.32 * np.sin(2 * l_sun)
+            - 0.23 * np.sin(2 * l_moon) + 0.21 * np.sin(2 * omega)) / 3600.0
+    deps = (9.20 * np.cos(omega) + 0.57 * np.cos(2 * l_sun)
+            + 0.10 * np.cos(2 * l_moon) - 0.09 * np.cos(2 * omega)) / 3600.0
+    return dpsi, deps
+
+
+def _mean_obliquity(t: np.ndarray) -> np.ndarray:
+    return 23.439291111 - 0.013004167 * t - 1.6389e-7 * t ** 2 + 5.0361e-7 * t ** 3
+
+
+def obliquity(t: np.ndarray) -> np.ndarray:
+    """真黃赤交角（度）"""
+    return _mean_obliquity(t) + _nutation(t)[1]
+
+
+def sun_longitude(jd) -> np.ndarray:
+    """太陽視黃經（度）"""
+    t = _centuries(jd)
+    l0 = 280.46646 + 36000.76983 * t + 0.0003032 * t ** 2
+    m = (357.52911 + 35999.05029 * t - 0.0001537 * t ** 2) * DEG
+    c = ((1.914602 - 0.004817 * t - 0.000014 * t ** 2) * np.sin(m)
+         + (0.019993 - 0.000101 * t) * np.sin(2 * m) + 0.000289 * np.sin(3 * m))
+    omega = (125.04 - 1934.136 * t) * DEG
+    return np.mod(l0 + c - 0.00569 - 0.00478 * np.sin(omega), 360.0)
+
+
+def moon_longitude(jd, terms: int = 50) -> np.ndarray:
+    """月亮視黃經（度），terms 為採用的週期項數（依振幅排序）"""
+    t = _centuries(jd)
+    lp = 218.3164477 + 481267.88123421 * t - 0.0015786 * t ** 2 + t ** 3 / 538841 - t ** 4 / 65194000
+    d = 297.8501921 + 445267.1114034 * t - 0.0018819 * t ** 2 + t ** 3 / 545868 - t ** 4 / 113065000
+    m = 357.5291092 + 35999.0502909 * t - 0.0001536 * t ** 2 + t ** 3 / 24490000
+    mp = 134.9633964 + 477198.8675055 * t + 0.0087414 * t ** 2 + t ** 3 / 69699 - t ** 4 / 14712000
+    f = 93.2720950 + 483202.0175233 * t - 0.0036539 * t ** 2 - t ** 3 / 3526000 + t ** 4 / 863310000
+    e = 1 - 0.002516 * t - 0.0000074 * t ** 2
+
+    args = np.stack([d, m, mp, f], axis=-1) * DEG  # (..., 4)
+    table = _MOON_TERMS[:terms]
+    coeff = table[:, :4]
+    amp = table[:, 4]
+    angle = args @ coeff.T  # (..., terms)
+    m_power = np.abs(table[:, 1])
+    ecc = np.power(e[..., None], m_power)
+    sigma = np.sum(amp * ecc * np.sin(angle), axis=-1)
+
+    a1 = (119.75 + 131.849 * t) * DEG
+    a2 = (53.09 + 479264.290 * t) * DEG
+    sigma = sigma + 3958 * np.sin(a1) + 1962 * np.sin((lp - f) * DEG) + 318 * np.sin(a2)
+    return np.mod(lp + sigma / 1e6 + _nutation(t)[0], 360.0)
+
+
+def _solve_kepler(mean_anomaly: np.ndarray, e: np.ndarray, iterations: int = 6) -> np.ndarray:
+    """以牛頓法解 Kepler 方程（弧度）"""
+    ecc_anomaly = mean_anomaly + e * np.sin(mean_anomaly)
+    for _ in range(iterations):
+        delta = (ecc_anomaly - e * np.sin(ecc_anomaly) - mean_anomaly) / (1 - e * np.cos(ecc_anomaly))
+        ecc_anomaly = ecc_anomaly - delta
+    return ecc_anomaly
+
+
+def _heliocentric(t: np.ndarray, kepler_iterations: int = 6) -> np.ndarray:
+    """全部行星與地月質心的日心黃道直角座標 (J2000)，形狀 (..., 9, 3)"""
+    elements = _ELEMENT_BASE + _ELEMENT_RATE * np.asarray(t)[..., None, None]
+    a, e, inc, mean_long, peri, node = np.moveaxis(elements, -1, 0)
+    omega = (peri - node) * DEG
+    mean_anomaly = np.mod(mean_long - peri + 180.0, 360.0) * DEG - np.pi
+    ecc_anomaly = _solve_kepler(mean_anomaly, e, kepler_iterations)
+    xp = a * (np.cos(ecc_anomaly) - e)
+    yp = a * np.sqrt(1 - e * e) * np.sin(ecc_anomaly)
+
+    node_r, inc_r = node * DEG, inc * DEG
+    cw, sw = np.cos(omega), np.sin(omega)
+    cn, sn = np.cos(node_r), np.sin(node_r)
+    ci, si = np.cos(inc_r), np.sin(inc_r)
+    x = (cw * cn - sw * sn * ci) * xp + (-sw * cn - cw * sn * ci) * yp
+    y = (cw * sn + sw * cn * ci) * xp + (-sw * sn + cw * cn * ci) * yp
+    z = (sw * si) * xp + (cw * si) * yp
+    return np.stack([x, y, z], axis=-1)
+
+
+def _precession(t: np.ndarray) -> np.ndarray:
+    """J2000 至當日春分點的黃經總歲差（度）"""
+    return (5029.0966 * t + 1.11113 * t ** 2) / 3600.0
+
+
+def _planet_longitudes(jd, kepler_iterations: int = 6) -> Dict[str, np.ndarray]:
+    """水星至冥王星的地心視黃經（度），一次計算全部行星"""
+    t = _centuries(jd)
+    helio = _heliocentric(t, kepler_iterations)
+    geo = helio - helio[..., _EARTH:_EARTH + 1, :]
+    lon = np.arctan2(geo[..., 1], geo[..., 0]) / DEG
+    lon = np.mod(lon + (_precession(t) + _nutation(t)[0])[..., None], 360.0)
+    return {body: lon[..., i] for i, body in enumerate(_BODIES) if i != _EARTH}
+
+
+def planet_longitude(body: str, jd) -> np.ndarray:
+    """行星地心視黃經（度），body 為 mercury ... pluto"""
+    return _planet_longitudes(jd)[body]
+
+
+def body_longitude(body: str, jd) -> np.ndarray:
+    """任一天體的地心視黃經（度）"""
+    if body == 'sun':
+        return sun_longitude(jd)
+    if body == 'moon':
+        return moon_longitude(jd)
+    return planet_longitude(body, jd)
+
+
+def planet_longitudes(jd) -> Dict[str, np.ndarray]:
+    """全部十個天體的地心視黃經（度）"""
+    result = {'sun': sun_longitude(jd), 'moon': moon_longitude(jd)}
+    result.update(_planet_longitudes(jd))
+    return {key: result[key] for key in PLANET_KEYS}
+
+
+def retrograde_flags(jd) -> Dict[str, np.ndarray]:
+    """以前後半日黃經差判斷逆行"""
+    jd = np.asarray(jd, dtype=np.float64)
+    return _retrograde_from(_planet_longitudes(np.stack([jd - 0.5, jd + 0.5])), jd.shape)
+
+
+def _retrograde_from(around: Dict[str, np.ndarray], shape) -> Dict[str, np.ndarray]:
+    """around[body] 第 0、1 列分別為前、後半日黃經"""
+    flags = {'sun': np.zeros(shape, dtype=bool), 'moon': np.zeros(shape, dtype=bool)}
+    for body, lon in around.items():
+        delta = np.mod(lon[1] - lon[0] + 180.0, 360.0) - 180.0
+        flags[body] = delta < 0
+    return {key: flags[key] for key in PLANET_KEYS}
+
+
+# 極圈內上升點與宮位無明確定義；與 kerykeion（exact 層級）相同，緯度截斷在 ±66 度
+POLAR_LATITUDE = 66.0
+
+
+def _local_frame(jd, latitude, longitude) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(RAMC, 真黃赤交角, 地理緯度)，皆為弧度並已廣播為相同形狀；緯度截斷在 ±POLAR_LATITUDE"""
+    jd = np.asarray(jd, dtype=np.float64)
+    t = _centuries(jd)
+    dpsi, deps = _nutation(t)
+    eps = _mean_obliquity(t) + deps
+    gmst = 280.46061837 + 360.98564736629 * (jd - J2000) + 0.000387933 * t ** 2 - t ** 3 / 38710000
+    ramc = np.mod(gmst + dpsi * np.cos(eps * DEG) + np.asarray(longitude, dtype=np.float64), 360.0)
+    phi = np.clip(np.asarray(latitude, dtype=np.float64), -POLAR_LATITUDE, POLAR_LATITUDE)
+    return tuple(np.broadcast_arrays(ramc * DEG, eps * DEG, phi * DEG))
+
+
+def sidereal_time(jd, longitude) -> np.ndarray:
+    """當地視恆星時 RAMC（度）"""
+    return _local_frame(jd, 0.0, longitude)[0] / DEG
+
+
+def _angles(ramc: np.ndarray, eps: np.ndarray, phi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    mc = np.arctan2(np.sin(ramc), np.cos(ramc) * np.cos(eps))
+    asc = np.mod(np.arctan2(np.cos(ramc), -(np.sin(ramc) * np.cos(eps) + np.tan(phi) * np.sin(eps))) / DEG, 360.0)
+    mc = np.mod(mc / DEG, 360.0)
+    # 上升點必在天頂以東（黃經 0-180 度之內）；落在西側時取對面的交點，宮首才不會反向
+    asc = np.where(np.mod(asc - mc, 360.0) > 180.0, np.mod(asc + 180.0, 360.0), asc)
+    return asc, mc
+
+
+def angles(jd, latitude, longitude) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    上升點與天頂黃經（度）
+
+    Returns:
+        (ascendant, midheaven)
+    """
+    return _angles(*_local_frame(jd, latitude, longitude))
+
+
+def _ra_to_ecliptic(ra: np.ndarray, eps: np.ndarray) -> np.ndarray:
+    """黃道上某點赤經 → 黃經（弧度）"""
+    return np.arctan2(np.sin(ra), np.cos(ra) * np.cos(eps))
+
+
+# Placidus 中間宮首：11、12 宮取晝半弧的 1/3、2/3；2、3 宮取夜半弧的 2/3、1/3
+_PLACIDUS_FRACTION = np.array([1 / 3, 2 / 3, 2 / 3, 1 / 3])
+_PLACIDUS_ABOVE = np.array([True, True, False, False])
+
+
+def house_cusps(jd, latitude, longitude) -> np.ndarray:
+    """
+    Placidus 宮首黃經（度），形狀 (..., 12)
+    四個中間宮首一起以半弧比例迭代求解；Placidus 迭代無解時改用 Porphyry 等分（緯度已截斷在極圈外）
+    """
+    ramc, eps, phi = _local_frame(jd, latitude, longitude)
+    asc, mc = _angles(ramc, eps, phi)
+    return _cusps_from_frame(ramc, eps, phi, asc, mc)
+
+
+def _porphyry_cusps(asc: np.ndarray, mc: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Porphyry 中間宮首 (11, 12, 2, 3)：上升與天頂間三等分"""
+    arc_upper = np.mod(asc - mc, 360.0)
+    arc_lower = 180.0 - arc_upper
+    return (np.mod(mc + arc_upper / 3, 360.0), np.mod(mc + 2 * arc_upper / 3, 360.0),
+            np.mod(asc + arc_lower / 3, 360.0), np.mod(asc + 2 * arc_lower / 3, 360.0))
+
+
+def _quadrant_cusps(asc, mc, c11, c12, c2, c3) -> np.ndarray:
+    first = [asc, c2, c3, np.mod(mc + 180, 360.0), np.mod(c11 + 180, 360.0), np.mod(c12 + 180, 360.0)]
+    second = [np.mod(c + 180, 360.0) for c in first]
+    second[3] = mc
+    return np.stack(first + second, axis=-1)
+
+
+def _cusps_for_system(system: str, ramc, eps, phi, asc, mc, iterations: int = 10) -> np.ndarray:
+    """
+    依宮位制計算宮首
+    等宮制自上升點起每 30 度一宮；整宮制以上升所在星座為第一宮
+    """
+    if system == 'placidus':
+        return _cusps_from_frame(ramc, eps, phi, asc, mc, iterations)
+    if system == 'porphyry':
+        return _quadrant_cusps(asc, mc, *_porphyry_cusps(asc, mc))
+    if system == 'equal':
+        start = asc
+    elif system == 'whole_sign':
+        start = np.floor(asc / 30.0) * 30.0
+    else:
+        raise ValueError(f"未知的宮位制: {system}")
+    return np.mod(np.asarray(start)[..., None] + 30.0 * np.arange(12), 360.0)
+
+
+def _cusps_from_frame(ramc, eps, phi, asc, mc, iterations: int = 10) -> np.ndarray:
+    ramc4, eps4, tan_phi4 = ramc[..., None], eps[..., None], np.tan(phi)[..., None]
+    fraction, above = _PLACIDUS_FRACTION, _PLACIDUS_ABOVE
+
+    ra = ramc4 + np.where(above, fraction * np.pi / 2, np.pi - fraction * np.pi / 2)
+    failed = np.zeros(ra.shape, dtype=bool)
+    for _ in range(iterations):
+        dec = np.arcsin(np.sin(eps4) * np.sin(_ra_to_ecliptic(ra, eps4)))
+        x = -tan_phi4 * np.tan(dec)
+        failed |= np.abs(x) > 1
+        semi_arc = np.arccos(np.clip(x, -1, 1))
+        ra = ramc4 + np.where(above, fraction * semi_arc, np.pi - fraction * (np.pi - semi_arc))
+    middle = np.mod(_ra_to_ecliptic(ra, eps4) / DEG, 360.0)
+    c11, c12, c2, c3 = (middle[..., i] for i in range(4))
+
+    # Porphyry 備援：上升與天頂間三等分
+    failed = failed.any(axis=-1) | (np.abs(phi) >= (np.pi / 2 - eps))
+    if np.any(failed):
+        p11, p12, p2, p3 = _porphyry_cusps(asc, mc)
+        c11 = np.where(failed, p11, c11)
+        c12 = np.where(failed, p12, c12)
+        c2 = np.where(failed, p2, c2)
+        c3 = np.where(failed, p3, c3)
+
+    return _quadrant_cusps(asc, mc, c11, c12, c2, c3)
+
+
+def house_numbers(longitudes, cusps) -> np.ndarray:
+    """
+    黃經所在宮位（1-12）
+
+    Args:
+        longitudes: 形狀 (...)
+        cusps: 形狀 (..., 12)
+    """
+    longitudes = np.asarray(longitudes, dtype=np.float64)[..., None]
+    offset = np.mod(longitudes - cusps, 360.0)
+    width = np.mod(np.roll(cusps, -1, axis=-1) - cusps, 360.0)
+    inside = offset < width
+    return np.argmax(inside, axis=-1) + 1
+
+
+def sign_index(longitudes) -> np.ndarray:
+    """黃經所在星座索引（0 = 牡羊座）"""
+    return (np.mod(np.asarray(longitudes, dtype=np.float64), 360.0) // 30).astype(np.int64)
+
+
+# 分組計算的天體：太陽、月亮各自一組，八顆行星共用一次向量化 Kepler 求解
+# 增量計算（incremental_chart）以組為單位重用結果
+BODY_GROUPS = (
+    ('sun', ('sun',)),
+    ('moon', ('moon',)),
+    ('planets', tuple(PLANET_KEYS[2:])),
+)
+
+
+def body_group(group: str, jd: np.ndarray, precision: str = 'fast') -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    一組天體的地心視黃經
+
+    Args:
+        jd: 形狀 (N,)
+
+    Returns:
+        (黃經 (N, k), 前後半日的黃經差 (N, k))；太陽與月亮不會逆行，黃經差為 None
+    """
+    moon_terms, kepler_iterations, _ = PRECISION_LEVELS[precision]
+    if group == 'sun':
+        return sun_longitude(jd)[:, None], None
+    if group == 'moon':
+        return moon_longitude(jd, moon_terms)[:, None], None
+    planets = _planet_longitudes(np.stack([jd - 0.5, jd, jd + 0.5]), kepler_iterations)
+    longitudes = np.stack([planets[key][1] for key in PLANET_KEYS[2:]], axis=-1)
+    motion = np.stack([np.mod(planets[key][2] - planets[key][0] + 180.0, 360.0) - 180.0
+                       for key in PLANET_KEYS[2:]], axis=-1)
+    return longitudes, motion
+
+
+def house_frame(jd: np.ndarray, latitude, longitude, precision: str = 'fast',
+                house_system: str = 'placidus') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    上升、天頂與宮首
+
+    Returns:
+        (ascendant (N,), midheaven (N,), cusps (N, 12))
+    """
+    placidus_iterations = PRECISION_LEVELS[precision][2]
+    ramc, eps, phi = _local_frame(jd, latitude, longitude)
+    asc, mc = _angles(ramc, eps, phi)
+    cusps = _cusps_for_system(house_system, ramc, eps, phi, asc, mc, placidus_iterations)
+    return np.broadcast_to(asc, jd.shape), np.broadcast_to(mc, jd.shape), cusps
+
+
+def assemble_chart_arrays(groups: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]],
+                          frame: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Dict[str, np.ndarray]:
+    """由 body_group 與 house_frame 的結果組成 compute_chart_arrays 的輸出"""
+    longitudes = np.concatenate([groups[group][0] for group, _ in BODY_GROUPS], axis=-1)
+    retrograde = np.concatenate([
+        groups[group][1] < 0 if groups[group][1] is not None else np.zeros(groups[group][0].shape, dtype=bool)
+        for group, _ in BODY_GROUPS
+    ], axis=-1)
+    asc, mc, cusps = frame
+    return {
+        'longitudes': longitudes,
+        'retrograde': retrograde,
+        'houses': house_numbers(longitudes, cusps[:, None, :]),
+        'cusps': cusps,
+        'ascendant': asc,
+        'midheaven': mc,
+    }
+
+
+def compute_chart_arrays(jd, latitude, longitude, precision: str = 'fast',
+                         house_system: str = 'placidus') -> Dict[str, np.ndarray]:
+    """
+    向量化計算整批星盤
+    行星在出生時刻與前後半日（判斷逆行）三個時間點一次算完
+
+    Args:
+        precision: PRECISION_LEVELS 的層級
+        house_system: HOUSE_SYSTEMS 的宮位制
+
+    Returns:
+        longitudes: (N, 10) 天體黃經，順序同 PLANET_KEYS
+        retrograde: (N, 10)
+        houses: (N, 10) 天體所在宮位
+        cusps: (N, 12) 宮首黃經
+        ascendant, midheaven: (N,)
+    """
+    jd = np.atleast_1d(np.asarray(jd, dtype=np.float64))
+    groups = {group: body_group(group, jd, precision) for group, _ in BODY_GROUPS}
+    return assemble_chart_arrays(groups, house_frame(jd, latitude, longitude, precision, house_system))
+
+
+def _point(longitude: float) -> Dict:
+    code = SIGN_CODES[int(longitude // 30) % 12]
+    return {
+        'sign': SIGN_NAMES[code],
+        'sign_code': code,
+        'position': round(float(longitude % 30), 2),
+        'element': ELEMENTS[code],
+        'quality': QUALITIES[code]
+    }
+
+
+class AnalyticEphemeris:
+    """
+    解析星曆占星引擎
+    介面與輸出結構同 ProfessionalAstrologer.calculate_natal_chart，可直接交給 DnDCharacterGenerator
+    """
+
+    def __init__(self, precision: str = 'fast'):
+        if precision not in PRECISION_LEVELS:
+            raise ValueError(f"未知的精度層級: {precision}")
+        self.precision = precision
+
+    def calculate_natal_chart(self, name: str, year: int, month: int, day: int,
+                              hour: int, minute: int, city: str,
+                              longitude: float, latitude: float, timezone: str,
+                              timer=NULL_TIMER, house_system: str = 'placidus') -> Dict:
+        """計算本命星盤，參數同 ProfessionalAstrologer.calculate_natal_chart"""
+        if house_system not in HOUSE_SYSTEMS:
+            raise ValueError(f"未知的宮位制: {house_system}")
+        with timer.stage('tz'):
+            jd = local_julian_day(year, month, day, hour, minute, timezone)
+        with timer.stage('ephemeris'):
+            arrays = compute_chart_arrays(jd, latitude, longitude, self.precision, house_system)
+        return chart_from_arrays(arrays, 0, birth_info(name, year, month, day, hour, minute,
+                                                       city, longitude, latitude, timezone))
+
+
+def birth_info(name: str, year: int, month: int, day: int, hour: int, minute: int,
+               city: str, longitude: float, latitude: float, timezone: str) -> Dict:
+    """星盤的 birth_info 區塊，格式同 ProfessionalAstrologer"""
+    return {
+        'name': name,
+        'datetime': f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}",
+        'location': city,
+        'coordinates': f"{latitude:.3f}°N, {longitude:.3f}°E",
+        'timezone': timezone
+    }
+
+
+def chart_from_arrays(arrays: Dict[str, np.ndarray], row: int, birth_info: Optional[Dict] = None) -> Dict:
+    """將 compute_chart_arrays 的第 row 列轉為星盤字典"""
+    planets = {}
+    for i, key in enumerate(PLANET_KEYS):
+        lon = float(arrays['longitudes'][row, i])
+        point = _point(lon)
+        planets[key] = {
+            'name': PLANET_NAMES[key.capitalize()],
+            'sign': point['sign'],
+            'sign_code': point['sign_code'],
+            'house': int(arrays['houses'][row, i]),
+            'position': point['position'],
+            'retrograde': bool(arrays['retrograde'][row, i]),
+            'element': point['element'],
+            'quality': point['quality']
+        }
+
+    houses = {key: _point(float(arrays['cusps'][row, i])) for i, key in enumerate(HOUSE_KEYS)}
+
+    asc = _point(float(arrays['ascendant'][row]))
+    mc = _point(float(arrays['midheaven'][row]))
+    return {
+        'birth_info': birth_info or {},
+        'planets': planets,
+        'houses': houses,
+        'angles': {
+            'ascendant': {'sign': asc['sign'], 'position': asc['position']},
+            'midheaven': {'sign': mc['sign'], 'position': mc['position']}
+        }
+    }
@@ -7,8 +7,13 @@
 import kerykeion as kr
 import json
 import os
+import time
+import pytz
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
+from perf_timing import NULL_TIMER
+from concurrency import EPHEMERIS_LOCK
+from zodiac import ELEMENTS, HOUSE_SYSTEMS, PLANET_NAMES, QUALITIES, SIGN_NAMES
 
 class ProfessionalAstrologer:
     """
@@ -18,35 +23,17 @@ class ProfessionalAstrologer:
     
     def __init__(self):
         """初始化占星諮詢師"""
-        self.sign_names = {
-            'Ari': '牡羊座', 'Tau': '金牛座', 'Gem': '雙子座', 'Can': '巨蟹座',
-            'Leo': '獅子座', 'Vir': '處女座', 'Lib': '天秤座', 'Sco': '天蠍座',
-            'Sag': '射手座', 'Cap': '摩羯座', 'Aqu': '水瓶座', 'Pis': '雙魚座'
-        }
-        
-        self.planet_names = {
-            'Sun': '太陽', 'Moon': '月亮', 'Mercury': '水星', 'Venus': '金星',
-            'Mars': '火星', 'Jupiter': '木星', 'Saturn': '土星',
-            'Uranus': '天王星', 'Neptune': '海王星', 'Pluto': '冥王星'
-        }
+        self.sign_names = SIGN_NAMES
+        self.planet_names = PLANET_NAMES
         
         # 星座元素和性質
-        self.elements = {
-            'Ari': '火', 'Leo': '火', 'Sag': '火',
-            'Tau': '土', 'Vir': '土', 'Cap': '土',
-            'Gem': '風', 'Lib': '風', 'Aqu': '風',
-            'Can': '水', 'Sco': '水', 'Pis': '水'
-        }
-        
-        self.qualities = {
-            'Ari': '開創', 'Can': '開創', 'Lib': '開創', 'Cap': '開創',
-            'Tau': '固定', 'Leo': '固定', 'Sco': '固定', 'Aqu': '固定',
-            'Gem': '變動', 'Vir': '變動', 'Sag': '變動', 'Pis': '變動'
-        }
+        self.elements = ELEMENTS
+        self.qualities = QUALITIES
     
     def calculate_natal_chart(self, name: str, year: int, month: int, day: int, 
                             hour: int, minute: int, city: str, 
-                            longitude: float, latitude: float, timezone: str) -> Dict:
+                            longitude: float, latitude: float, timezone: str,
+                            timer=NULL_TIMER, house_system: str = 'placidus') -> Dict:
         """
         計算本命星盤
         
@@ -58,26 +45,36 @@ class ProfessionalAstrologer:
             longitude: 經度
             latitude: 緯度
             timezone: 時區
+            timer: 階段計時器（選填）
+            house_system: 宮位制，HOUSE_SYSTEMS 的鍵（預設 Placidus）
             
         Returns:
             完整的星盤數據字典
         """
         try:
+            # 預先解析時區，無效時區在此即失敗
+            with timer.stage('tz'):
+                pytz.timezone(timezone)
+
             # 使用AstrologicalSubject API創建占星主體
             # 直接使用經緯度和時區，避免網路查詢
-            chart = kr.AstrologicalSubject(
-                name=name, 
-                year=year, 
-                month=month, 
-                day=day, 
-                hour=hour, 
-                minute=minute,
-                lng=longitude,
-                lat=latitude,
-                tz_str=timezone,
-                city=city
-            )
-            
+            # swisseph 為程序全域狀態，多執行緒下須序列化
+            with timer.stage('ephemeris'), EPHEMERIS_LOCK:
+                chart = kr.AstrologicalSubject(
+                    name=name, 
+                    year=year, 
+                    month=month, 
+                    day=day, 
+                    hour=hour, 
+                    minute=minute,
+                    lng=longitude,
+                    lat=latitude,
+                    tz_str=timezone,
+                    city=city,
+                    houses_system_identifier=HOUSE_SYSTEMS[house_system]
+                )
+            extract_start = time.perf_counter()
+
             # 提取行星數據
             planets_data = {}
             planets = [
@@ -131,6 +128,8 @@ class ProfessionalAstrologer:
                 }
             }
             
+            timer.record('houses', time.perf_counter() - extract_start)
+
             return {
                 'birth_info': {
                     'name': name,
@@ -141,8 +140,7 @@ class ProfessionalAstrologer:
                 },
                 'planets': planets_data,
                 'houses': houses_data,
-                'angles': angles,
-                'chart_object': chart
+                'angles': angles
             }
             
         except Exception as e:
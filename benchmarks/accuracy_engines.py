@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+引擎精度評測
+以大量隨機出生時刻比較註冊表中每個引擎與 Swiss Ephemeris（exact 層級）的差異：
+- 各天體與上升 / 天頂的最大、平均黃經誤差
+- 星座判定與宮位判定不一致的比率
+- 每張星盤的平均計算時間
+- 極圈內（|緯度| > 66 度）另取一組樣本檢查：上升點誤差或宮位不一致率超過容許值時以結束碼 1 結束
+  （兩種引擎都把緯度截斷在 ±66 度，結果應與一般緯度同樣一致）
+
+所有引擎都經由 calculate_natal_chart 介面比較，輸出的位置已四捨五入到 0.01°，
+因此誤差下限約 0.005°。
+
+用法:
+    python benchmarks/accuracy_engines.py [--samples 3000] [--polar-samples 300] [--seed 1] [--json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from engine_registry import EngineUnavailable, create_default_registry
+from fixtures import random_utc_birth
+from zodiac import PLANET_KEYS, SIGN_CODES, SIGN_NAMES
+
+REFERENCE = 'exact'
+
+# 極圈內檢查的容許值：上升點最大誤差（度）與宮位不一致率
+POLAR_MAX_ASCENDANT_ERROR = 0.1
+POLAR_MAX_HOUSE_DISAGREEMENT = 0.1
+
+# 角度點只輸出中文星座名
+_SIGN_CODE_BY_NAME = {name: code for code, name in SIGN_NAMES.items()}
+
+
+def _absolute(sign_code: str, position: float) -> float:
+    return SIGN_CODES.index(sign_code) * 30 + position
+
+
+def _summarize(chart: dict) -> dict:
+    """星盤 → {天體: (黃經, 宮位)}，角度點宮位為 None"""
+    summary = {key: (_absolute(p['sign_code'], p['position']), p['house'])
+               for key, p in chart['planets'].items()}
+    for key in ('ascendant', 'midheaven'):
+        point = chart['angles'][key]
+        summary[key] = (_absolute(_SIGN_CODE_BY_NAME[point['sign']], point['position']), None)
+    return summary
+
+
+def compute(engine, births: list) -> tuple:
+    """回傳 (各筆摘要, 平均每張耗時毫秒)；引擎拒絕的輸入記為 None"""
+    results = []
+    start = time.perf_counter()
+    for b in births:
+        try:
+            chart = engine.calculate_natal_chart(
+                b['name'], b['year'], b['month'], b['day'], b['hour'], b['minute'],
+                b['city'], b['longitude'], b['latitude'], b['timezone'])
+            results.append(_summarize(chart))
+        except Exception:
+            results.append(None)
+    elapsed = time.perf_counter() - start
+    return results, elapsed / max(len(births), 1) * 1000
+
+
+def compare(reference: list, candidate: list) -> dict:
+    """彙整與參考結果的差異"""
+    keys = PLANET_KEYS + ['ascendant', 'midheaven']
+    max_error = {k: 0.0 for k in keys}
+    sum_error = {k: 0.0 for k in keys}
+    sign_mismatch = house_mismatch = planet_samples = compared = 0
+
+    for ref, cand in zip(reference, candidate):
+        if ref is None or cand is None:
+            continue
+        compared += 1
+        for key in keys:
+            ref_lon, ref_house = ref[key]
+            lon, house = cand[key]
+            error = abs((lon - ref_lon + 180) % 360 - 180)
+            max_error[key] = max(max_error[key], error)
+            sum_error[key] += error
+            sign_mismatch += int(ref_lon // 30) != int(lon // 30)
+            if ref_house is not None:
+                planet_samples += 1
+                house_mismatch += ref_house != house
+
+    return {
+        'compared': compared,
+        'max_error_deg': {k: round(v, 4) for k, v in max_error.items()},
+        'mean_error_deg': {k: round(v / max(compared, 1), 4) for k, v in sum_error.items()},
+        'max_planet_error_deg': round(max(max_error[k] for k in PLANET_KEYS), 4),
+        'sign_disagreement_rate': round(sign_mismatch / max(compared * len(keys), 1), 5),
+        'house_disagreement_rate': round(house_mismatch / max(planet_samples, 1), 5),
+    }
+
+
+def polar_failures(result: dict) -> list:
+    """極圈內比較結果超過容許值的項目"""
+    failures = []
+    if result['compared'] == 0:
+        failures.append('沒有可比較的樣本')
+    if result['max_error_deg']['ascendant'] > POLAR_MAX_ASCENDANT_ERROR:
+        failures.append(f"上升點最大誤差 {result['max_error_deg']['ascendant']}° > {POLAR_MAX_ASCENDANT_ERROR}°")
+    if result['house_disagreement_rate'] > POLAR_MAX_HOUSE_DISAGREEMENT:
+        failures.append(f"宮位不一致率 {result['house_disagreement_rate']:.3%} > {POLAR_MAX_HOUSE_DISAGREEMENT:.0%}")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='引擎精度評測')
+    parser.add_argument('--samples', type=int, default=3000)
+    parser.add_argument('--polar-samples', type=int, default=300, help='極圈內樣本數，0 表示不檢查')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='以 JSON 輸出結果')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    registry = create_default_registry()
+    try:
+        reference_engine = registry.get(REFERENCE)
+    except EngineUnavailable as e:
+        print(f"❌ 無法載入參考引擎: {e}")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    births = [random_utc_birth(rng) for _ in range(args.samples)]
+    reference, reference_ms = compute(reference_engine, births)
+    polar_births = [random_utc_birth(rng, polar=True) for _ in range(args.polar_samples)]
+    polar_reference, _ = compute(reference_engine, polar_births)
+
+    report = {'samples': args.samples, 'reference': registry.label(REFERENCE),
+              'reference_ms_per_chart': round(reference_ms, 3), 'engines': {}}
+    for precision in registry.tiers:
+        if precision == REFERENCE:
+            continue
+        try:
+            engine = registry.get(precision)
+        except EngineUnavailable as e:
+            report['engines'][precision] = {'error': str(e)}
+            continue
+        results, ms = compute(engine, births)
+        report['engines'][precision] = dict(compare(reference, results),
+                                            label=registry.label(precision),
+                                            ms_per_chart=round(ms, 3))
+        if polar_births:
+            polar = compare(polar_reference, compute(engine, polar_births)[0])
+            report['engines'][precision]['polar'] = dict(polar, failures=polar_failures(polar))
+    failed = any(result.get('polar', {}).get('failures') for result in report['engines'].values())
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        sys.exit(1 if failed else 0)
+
+    print("🎯 引擎精度評測")
+    print("=" * 60)
+    print(f"樣本數: {args.samples}，參考: {report['reference']} ({reference_ms:.3f} ms/盤)")
+    for precision, result in report['engines'].items():
+        print(f"\n[{precision}] {result.get('label', '')}")
+        if 'error' in result:
+            print(f"  ❌ {result['error']}")
+            continue
+        print(f"  耗時: {result['ms_per_chart']:.3f} ms/盤，比較 {result['compared']} 筆")
+        for key in PLANET_KEYS + ['ascendant', 'midheaven']:
+            print(f"  {key:<10} 最大 {result['max_error_deg'][key]:.4f}°  平均 {result['mean_error_deg'][key]:.4f}°")
+        print(f"  星座不一致率: {result['sign_disagreement_rate']:.3%}")
+        print(f"  宮位不一致率: {result['house_disagreement_rate']:.3%}")
+        polar = result.get('polar')
+        if polar:
+            print(f"  極圈內 ({polar['compared']} 筆): 上升點最大 {polar['max_error_deg']['ascendant']:.4f}°，"
+                  f"宮位不一致率 {polar['house_disagreement_rate']:.3%}")
+            for failure in polar['failures']:
+                print(f"  ❌ 極圈內 {failure}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
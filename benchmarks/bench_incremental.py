@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+增量星盤計算驗證與基準
+模擬網頁介面逐欄調整的編輯序列（多數只改分鐘或姓名），每一步同時做增量計算與完整重算：
+- 逐欄位比對兩者輸出，任何不一致即以結束碼 1 回報
+- 統計各階段的重用率與兩種計算方式的平均耗時
+
+用法:
+    python benchmarks/bench_incremental.py --steps 5000 --precision fast
+    python benchmarks/bench_incremental.py --precision exact --steps 500 --output incremental.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+
+import main
+from incremental_chart import IncrementalCharts
+
+TIMEZONES = ['Asia/Taipei', 'Asia/Tokyo', 'Europe/London', 'America/New_York']
+
+# 編輯類型與比例：(名稱, 權重)
+EDITS = (('minute', 40), ('name', 20), ('location', 15), ('hour', 10), ('timezone', 5), ('day', 5), ('reset', 5))
+
+
+def edit(rng: random.Random, data: Dict, kind: str, step: int) -> None:
+    """就地修改一個欄位"""
+    if kind == 'minute':
+        total = data['hour'] * 60 + data['minute'] + rng.choice((-5, -2, -1, 1, 1, 2, 3, 10))
+        data['hour'], data['minute'] = divmod(total % 1440, 60)
+    elif kind == 'name':
+        data['name'] = f"使用者{step}"
+    elif kind == 'location':
+        data['latitude'] = round(min(66.0, max(-66.0, data['latitude'] + rng.uniform(-2, 2))), 3)
+        data['longitude'] = round((data['longitude'] + rng.uniform(-2, 2) + 180) % 360 - 180, 3)
+    elif kind == 'hour':
+        data['hour'] = (data['hour'] + rng.choice((-1, 1))) % 24
+    elif kind == 'timezone':
+        data['timezone'] = rng.choice(TIMEZONES)
+    elif kind == 'day':
+        data['day'] = rng.randint(1, 28)
+    else:
+        data.update(year=rng.randint(1930, 2020), month=rng.randint(1, 12), day=rng.randint(1, 28),
+                    hour=rng.randint(0, 23), minute=rng.randint(0, 59))
+
+
+def run(precision: str, steps: int, seed: int) -> Dict:
+    _, engine = main.engine_registry.resolve(precision)
+    charts = IncrementalCharts(capacity=256)
+    rng = random.Random(seed)
+    kinds, weights = zip(*EDITS)
+    data = dict(main.SYSTEM_TEST_DATA)
+    main.calculate_with_engine(engine, dict(data))  # 預熱
+
+    incremental_seconds = full_seconds = 0.0
+    mismatches = []
+    for step in range(steps):
+        kind = rng.choices(kinds, weights)[0]
+        edit(rng, data, kind, step)
+
+        start = time.perf_counter()
+        chart, _, reused = charts.calculate(engine, data)
+        incremental_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        full = engine.calculate_natal_chart(data['name'], data['year'], data['month'], data['day'],
+                                            data['hour'], data['minute'], data['city'],
+                                            data['longitude'], data['latitude'], data['timezone'])
+        full_seconds += time.perf_counter() - start
+
+        if json.dumps(chart, sort_keys=True, ensure_ascii=False) != json.dumps(full, sort_keys=True, ensure_ascii=False):
+            mismatches.append({'step': step, 'edit': kind, 'reused': reused, 'input': dict(data)})
+
+    return {
+        'precision': precision,
+        'steps': steps,
+        'incremental_ms': round(incremental_seconds / steps * 1000, 3),
+        'full_ms': round(full_seconds / steps * 1000, 3),
+        'speedup': round(full_seconds / incremental_seconds, 2) if incremental_seconds else None,
+        'mismatches': len(mismatches),
+        'mismatch_samples': mismatches[:5],
+        'reuse': charts.status(),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='增量星盤計算驗證與基準')
+    parser.add_argument('--precision', default='fast', choices=main.engine_registry.tiers)
+    parser.add_argument('--steps', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args()
+
+    report = run(args.precision, args.steps, args.seed)
+    print(f"精度 {report['precision']}：{report['steps']} 步，增量 {report['incremental_ms']} ms，"
+          f"完整重算 {report['full_ms']} ms（{report['speedup']}x）")
+    print(f"{'階段':<10}{'重用':>8}{'重算':>8}{'重用率':>8}")
+    for stage, counts in report['reuse']['stages'].items():
+        print(f"{stage:<10}{counts['reused']:>8}{counts['computed']:>8}{counts['reuse_rate']:>8.1%}")
+    print(f"以日行速度證明不變而重用: {report['reuse']['proven_reuse']} 次")
+    print(f"與完整重算不一致: {report['mismatches']} 步")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if report['mismatches'] else 0)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+日誌管線效能比較
+模擬每個 API 請求的三次 logger.info 呼叫，比較同步 StreamHandler 與非阻塞佇列管線的單請求成本
+
+用法:
+    python benchmarks/bench_logging.py [--requests 20000] [--threads 8]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from log_pipeline import TEXT_FORMAT, setup_logging, shutdown_logging
+
+
+def _simulate_request(logger: logging.Logger, i: int) -> None:
+    """與 main.py 熱路徑相同的三次日誌呼叫"""
+    logger.info("API請求: %s %s - IP: %s", "POST", "/api/calculate_chart", "127.0.0.1")
+    logger.info("開始為用戶 %s 計算星盤和角色", f"user-{i}")
+    logger.info("角色生成完成，用時 %.3f秒", 0.012)
+
+
+def _setup_sync_eager(stream) -> None:
+    """原本的設定：basicConfig + StreamHandler，呼叫端同步寫出"""
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def _run(requests: int, threads: int) -> float:
+    """以多執行緒發出請求，回傳每請求平均微秒"""
+    logger = logging.getLogger('bench')
+    per_thread = requests // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            _simulate_request(logger, offset + i)
+
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed / (per_thread * threads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日誌管線效能比較')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryFile('w', encoding='utf-8') as sink:
+        _setup_sync_eager(sink)
+        results['sync text'] = _run(args.requests, args.threads)
+
+        setup_logging(fmt='text', sample_rate=1.0, async_enabled=True, stream=sink)
+        results['async text'] = _run(args.requests, args.threads)
+        shutdown_logging()
+
+        setup_logging(fmt='json', sample_rate=1.0, async_enabled=True, stream=sink)
+        results['async json'] = _run(args.requests, args.threads)
+        shutdown_logging()
+
+        setup_logging(fmt='json', sample_rate=0.1, async_enabled=True, stream=sink)
+        results['async json 10% sampled'] = _run(args.requests, args.threads)
+        shutdown_logging()
+
+    print(f"📝 日誌管線單請求成本（{args.requests} 請求，{args.threads} 執行緒，每請求 3 筆日誌）")
+    print("=" * 50)
+    baseline = results['sync text']
+    for name, micros in results.items():
+        print(f"  {name:<24} {micros:8.2f} µs/請求  ({baseline / micros:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+效能基準測試套件
+- 微基準：星盤計算（各精度層級）、屬性計算、職業判定、背景故事、心理分析
+- 端到端：透過 Flask 測試客戶端呼叫每個路由（含中介層、驗證與序列化）
+
+每項先自動校準每輪次數（單輪至少 --min-time 秒），再重複 --rounds 輪，
+以每次呼叫時間的中位數作為主要指標。結果可寫成 JSON，並可與先前的結果比較，
+中位數變慢超過 --threshold 的項目標記為退步，此時以狀態碼 1 結束。
+
+用法:
+    python benchmarks/bench_suite.py [--output results.json] [--filter micro.] [--rounds 7]
+    python benchmarks/bench_suite.py --baseline baseline.json [--threshold 0.10]
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('MAX_PENDING_CALCULATIONS', '0')
+# 端到端案例會建立工作與角色，資料庫寫到暫存目錄，不留在專案目錄中
+_STATE_DIR = tempfile.mkdtemp(prefix='bench-suite-')
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+os.environ.setdefault('JOB_DB_PATH', os.path.join(_STATE_DIR, 'jobs.sqlite3'))
+os.environ.setdefault('CHARACTER_STORE_ENABLED', 'true')
+os.environ.setdefault('CHARACTER_STORE_PATH', os.path.join(_STATE_DIR, 'characters.sqlite3'))
+
+import main
+from engine_registry import EngineUnavailable
+from fixtures import random_birth
+
+SCHEMA_VERSION = 1
+
+
+def sample_births(count: int = 64, seed: int = 2024) -> List[dict]:
+    """固定種子的出生資料；避開夏令時間切換時段，確保每次執行輸入相同"""
+    rng = random.Random(seed)
+    return [random_birth(rng, f"基準{i}", earliest_hour=4) for i in range(count)]
+
+
+class Cycle:
+    """依序循環取用輸入，避免每次都計算同一筆"""
+
+    def __init__(self, items: list):
+        self.items = items
+        self.index = 0
+
+    def next(self):
+        item = self.items[self.index]
+        self.index = (self.index + 1) % len(self.items)
+        return item
+
+
+def measure(fn: Callable[[], None], rounds: int, min_time: float) -> Dict:
+    """
+    量測單次呼叫時間（微秒）
+
+    Returns:
+        median_us, min_us, mean_us, stdev_us, iterations, rounds
+    """
+    fn()  # 預熱
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9)))
+
+    samples = [elapsed / iterations * 1e6]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations * 1e6)
+
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'mean_us': round(statistics.fmean(samples), 3),
+        'stdev_us': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'iterations': iterations,
+        'rounds': len(samples),
+    }
+
+
+def _chart_args(b: dict) -> tuple:
+    return (b['name'], b['year'], b['month'], b['day'], b['hour'], b['minute'],
+            b['city'], b['longitude'], b['latitude'], b['timezone'])
+
+
+def micro_benchmarks(births: List[dict]) -> Dict[str, Callable[[], None]]:
+    """微基準；無法載入的引擎層級略過"""
+    generator = main.dnd_generator
+    benches: Dict[str, Callable[[], None]] = {}
+
+    charts = None
+    for precision in main.engine_registry.tiers:
+        try:
+            engine = main.engine_registry.get(precision)
+        except EngineUnavailable:
+            continue
+        inputs = Cycle([_chart_args(b) for b in births])
+        benches[f"micro.calculate_natal_chart.{precision}"] = (
+            lambda engine=engine, inputs=inputs: engine.calculate_natal_chart(*inputs.next()))
+        if charts is None:
+            charts = [engine.calculate_natal_chart(*_chart_args(b)) for b in births]
+
+    if charts is None:
+        return benches
+
+    chart_cycle = Cycle(charts)
+    benches['micro.calculate_character_stats'] = lambda: generator.calculate_character_stats(chart_cycle.next())
+    benches['micro.determine_dnd_class'] = lambda: generator.determine_dnd_class(chart_cycle.next())
+
+    prepared = Cycle([(c, generator.determine_dnd_class(c)[0], generator.calculate_character_stats(c))
+                      for c in charts])
+    benches['micro.generate_character_background'] = (
+        lambda: generator.generate_character_background(*prepared.next()))
+    benches['micro.generate_complete_character'] = lambda: generator.generate_complete_character(chart_cycle.next())
+
+    try:
+        astrologer = main.engine_registry.get('exact')
+        benches['micro.analyze_chart_psychology'] = lambda: astrologer.analyze_chart_psychology(chart_cycle.next())
+    except EngineUnavailable:
+        pass
+    return benches
+
+
+# 端到端案例：(名稱, 方法, 路徑, 取得 JSON body 的函式, 預期狀態碼)
+def route_cases(births: List[dict]) -> list:
+    inputs = Cycle(births)
+    cases = [
+        ('e2e.GET /', 'GET', '/', None, 200),
+        ('e2e.GET /api/health', 'GET', '/api/health', None, 200),
+        ('e2e.GET /api/test', 'GET', '/api/test', None, 200),
+        ('e2e.GET /api/not-found', 'GET', '/api/not-found', None, 404),
+        ('e2e.GET /api/cities prefix', 'GET', '/api/cities?q=san', None, 200),
+        ('e2e.GET /api/cities fuzzy', 'GET', '/api/cities?q=Londn', None, 200),
+        ('e2e.GET /api/timezone', 'GET', '/api/timezone?latitude=36.16&longitude=-86.78', None, 200),
+        # 未附剖析密鑰：量測授權檢查路徑
+        ('e2e.GET /api/profiles', 'GET', '/api/profiles', None, 403),
+        ('e2e.GET /api/profiles/<id>', 'GET', '/api/profiles/missing', None, 403),
+        ('e2e.GET /api/memory', 'GET', '/api/memory', None, 403),
+        ('e2e.POST /api/memory', 'POST', '/api/memory', lambda: {'action': 'stop'}, 403),
+        ('e2e.POST /api/calculate_chart invalid', 'POST', '/api/calculate_chart',
+         lambda: dict(inputs.next(), month=13), 400),
+        ('e2e.POST /api/birth_time_sweep', 'POST', '/api/birth_time_sweep',
+         lambda: dict(inputs.next(), window_minutes=120, precision='fast'), 200),
+        ('e2e.POST /api/transits', 'POST', '/api/transits',
+         lambda: dict(inputs.next(), start='2026-01-01', days=365, precision='fast'), 200),
+        ('e2e.POST /api/calculate_chart stream', 'POST', '/api/calculate_chart?stream=ndjson',
+         lambda: dict(inputs.next(), precision='fast'), 200),
+        ('e2e.POST /api/sessions', 'POST', '/api/sessions', lambda: inputs.next(), 201),
+        ('e2e.GET /api/sessions/<id> missing', 'GET', '/api/sessions/missing', None, 404),
+        ('e2e.PATCH /api/sessions/<id> missing', 'PATCH', '/api/sessions/missing', lambda: {'minute': 1}, 404),
+        ('e2e.DELETE /api/sessions/<id> missing', 'DELETE', '/api/sessions/missing', None, 404),
+        ('e2e.GET /api/sessions/<id>/events missing', 'GET', '/api/sessions/missing/events', None, 404),
+        ('e2e.POST /api/jobs', 'POST', '/api/jobs', lambda: {'items': [inputs.next()]}, 202),
+        ('e2e.GET /api/jobs', 'GET', '/api/jobs?limit=5', None, 200),
+        ('e2e.GET /api/jobs/<id> missing', 'GET', '/api/jobs/missing', None, 404),
+        ('e2e.GET /api/jobs/<id>/results missing', 'GET', '/api/jobs/missing/results', None, 404),
+        ('e2e.POST /api/jobs/<id>/cancel missing', 'POST', '/api/jobs/missing/cancel', None, 404),
+        ('e2e.GET /api/jobs/<id>/events missing', 'GET', '/api/jobs/missing/events', None, 404),
+        ('e2e.POST /api/export npz', 'POST', '/api/export',
+         lambda: {'sample': {'count': 500}, 'seed': 1}, 200),
+        ('e2e.POST /api/export csv', 'POST', '/api/export',
+         lambda: {'items': [inputs.next() for _ in range(20)], 'format': 'csv', 'seed': 1}, 200),
+        ('e2e.GET /api/export/dictionaries', 'GET', '/api/export/dictionaries', None, 200),
+        # 格式正確的 ID：量測快取未命中後的資料庫主鍵查詢
+        ('e2e.GET /api/characters/<id> missing', 'GET', '/api/characters/AAAAAAAAAAAA', None, 404),
+        ('e2e.GET /api/chart/<id>.svg missing', 'GET', '/api/chart/AAAAAAAAAAAA.svg', None, 404),
+    ]
+    for precision in main.engine_registry.tiers:
+        cases.append((f"e2e.POST /api/calculate_chart {precision}", 'POST', '/api/calculate_chart',
+                      lambda precision=precision: dict(inputs.next(), precision=precision), 200))
+    return cases
+
+
+def e2e_benchmarks(births: List[dict]) -> Dict[str, Callable[[], None]]:
+    """端到端基準；回應狀態碼不符時中止，避免量到錯誤路徑"""
+    client = main.app.test_client()
+    benches = {}
+    for name, method, path, body, expected in route_cases(births):
+        def call(method=method, path=path, body=body, expected=expected, name=name):
+            resp = client.open(path, method=method, json=body() if body else None)
+            resp.get_data()  # 串流回應需讀完才會執行全部計算
+            if resp.status_code != expected:
+                raise RuntimeError(f"{name}: 預期 {expected}，實際 {resp.status_code}")
+        benches[name] = call
+    return benches
+
+
+def uncovered_routes(births: List[dict]) -> List[str]:
+    """應用中尚未被端到端案例涵蓋的路由"""
+    adapter = main.app.url_map.bind('localhost')
+    covered = set()
+    for _, method, path, _, _ in route_cases(births):
+        try:
+            covered.add(adapter.match(path.split('?', 1)[0], method=method)[0])
+        except Exception:
+            continue
+    return sorted(rule.rule for rule in main.app.url_map.iter_rules()
+                  if rule.endpoint not in covered and rule.endpoint not in ('static', 'favicon'))
+
+
+def environment_info() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=parent_dir,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, name_filter: str = '') -> List[Dict]:
+    """
+    與基準比較中位數；回傳每項的比較結果
+    變化須同時超過門檻比例與兩次量測中較大的標準差，才判定為退步或進步，避免雜訊誤報
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            rows.append({'name': name, 'status': 'new', 'current_us': current['median_us']})
+            continue
+        ratio = current['median_us'] / max(base['median_us'], 1e-9)
+        noise = max(current['stdev_us'], base['stdev_us'])
+        significant = abs(current['median_us'] - base['median_us']) > noise
+        if significant and ratio > 1 + threshold:
+            status = 'regression'
+        elif significant and ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        rows.append({'name': name, 'status': status, 'baseline_us': base['median_us'],
+                     'current_us': current['median_us'], 'change': round(ratio - 1, 4)})
+    for name in baseline.get('results', {}):
+        if name not in results and name_filter in name:
+            rows.append({'name': name, 'status': 'missing', 'baseline_us': baseline['results'][name]['median_us']})
+    return rows
+
+
+def _format_us(value: float) -> str:
+    if value >= 1000:
+        return f"{value / 1000:.3f}ms"
+    return f"{value:.2f}µs"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='效能基準測試套件')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.05, help='每輪最少秒數')
+    parser.add_argument('--filter', default='', help='只執行名稱包含此字串的項目')
+    parser.add_argument('--output', help='結果 JSON 輸出路徑')
+    parser.add_argument('--baseline', help='比較用的先前結果 JSON')
+    parser.add_argument('--threshold', type=float, default=0.10, help='中位數變慢超過此比例視為退步')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    births = sample_births()
+    benches = {**micro_benchmarks(births), **e2e_benchmarks(births)}
+    selected = {name: fn for name, fn in benches.items() if args.filter in name}
+
+    print("⏱️ 效能基準測試")
+    print("=" * 70)
+    results = {}
+    for name, fn in selected.items():
+        results[name] = measure(fn, args.rounds, args.min_time)
+        r = results[name]
+        print(f"  {name:<48} {_format_us(r['median_us']):>10}  ±{_format_us(r['stdev_us'])}")
+
+    missing = uncovered_routes(births)
+    if missing:
+        print(f"⚠️ 未涵蓋的路由: {', '.join(missing)}")
+
+    report = {'schema_version': SCHEMA_VERSION, 'environment': environment_info(),
+              'settings': {'rounds': args.rounds, 'min_time': args.min_time},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 結果已寫入 {args.output}")
+
+    if not args.baseline:
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold, args.filter)
+    print(f"\n📊 與基準比較 ({baseline.get('environment', {}).get('commit') or args.baseline}，門檻 {args.threshold:.0%})")
+    icons = {'regression': '🔴', 'improvement': '🟢', 'unchanged': '⚪', 'new': '🆕', 'missing': '❔'}
+    for row in rows:
+        if 'change' in row:
+            detail = f"{_format_us(row['baseline_us'])} → {_format_us(row['current_us'])} ({row['change']:+.1%})"
+        else:
+            detail = _format_us(row.get('current_us', row.get('baseline_us', 0)))
+        print(f"  {icons[row['status']]} {row['name']:<48} {detail}")
+
+    regressions = [row for row in rows if row['status'] == 'regression']
+    print("✅ 沒有效能退步" if not regressions else f"❌ {len(regressions)} 項效能退步")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Gunicorn worker 類型效能比較
+依序以 sync、gthread、gevent 啟動本機 gunicorn（使用 gunicorn.conf.py），
+以相同的請求組合（計算 80%、健康檢查 20%）施壓，比較吞吐量與延遲分佈
+
+用法:
+    python benchmarks/bench_workers.py [--duration 10] [--clients 16] [--workers 2]
+gevent 需另行安裝: pip install gevent
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from fixtures import free_port, percentile
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+CHART_PAYLOAD = {
+    "name": "壓測用戶", "year": 1990, "month": 6, "day": 15, "hour": 14, "minute": 30,
+    "city": "台北", "longitude": 121.55, "latitude": 25.017, "timezone": "Asia/Taipei"
+}
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/api/health', timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    return False
+
+
+def _request(base_url: str, rng: random.Random) -> bool:
+    if rng.random() < 0.8:
+        payload = dict(CHART_PAYLOAD, minute=rng.randint(0, 59), day=rng.randint(1, 28))
+        req = urllib.request.Request(base_url + '/api/calculate_chart',
+                                     data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    else:
+        req = urllib.request.Request(base_url + '/api/health')
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+
+def _drive(base_url: str, clients: int, duration: float):
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        local = []
+        fails = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            ok = _request(base_url, rng)
+            local.append(time.perf_counter() - start)
+            fails += not ok
+        with lock:
+            latencies.extend(local)
+            failures[0] += fails
+
+    pool = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, failures[0]
+
+
+def run_worker_class(worker_class: str, workers: int, threads: int, clients: int, duration: float):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+               GUNICORN_ACCESSLOG='', GUNICORN_LOGLEVEL='warning',
+               RATE_LIMIT_ENABLED='false', LOG_SAMPLE_RATE='0')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                            cwd=parent_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not _wait_ready(base_url):
+            return None
+        latencies, failures = _drive(base_url, clients, duration)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    latencies.sort()
+    return {
+        'worker_class': worker_class,
+        'requests': len(latencies),
+        'failures': failures,
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gunicorn worker 類型效能比較')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--classes', default='sync,gthread,gevent')
+    args = parser.parse_args()
+
+    print(f"⚙️ Worker 類型比較（{args.workers} workers，{args.clients} 併發客戶端，每項 {args.duration:.0f}秒）")
+    print("=" * 70)
+    for worker_class in args.classes.split(','):
+        if worker_class == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print(f"  {worker_class:<8} 略過（未安裝 gevent）")
+                continue
+        threads = args.threads if worker_class == 'gthread' else 1
+        result = run_worker_class(worker_class, args.workers, threads, args.clients, args.duration)
+        if result is None:
+            print(f"  {worker_class:<8} 啟動失敗")
+            continue
+        print(f"  {worker_class:<8} {result['throughput_rps']:8.1f} req/s  "
+              f"p50 {result['p50_ms']:7.2f}ms  p95 {result['p95_ms']:7.2f}ms  "
+              f"p99 {result['p99_ms']:7.2f}ms  失敗 {result['failures']}")
+
+
+if __name__ == "__main__":
+    main()
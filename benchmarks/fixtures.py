@@ -0,0 +1,89 @@
+"""
+基準與壓力測試共用的工具
+- 出生資料產生器：各腳本以固定種子產生可重現的輸入
+- 本機 gunicorn 用的空閒連接埠與延遲百分位數（所有報告使用同一個定義，數字才能互相比較）
+"""
+
+import math
+import random
+import socket
+from typing import List, Optional
+
+# 固定測試地點：(經度, 緯度, 時區)
+TIMEZONES = [
+    (121.55, 25.03, 'Asia/Taipei'), (139.69, 35.69, 'Asia/Tokyo'),
+    (-74.01, 40.71, 'America/New_York'), (-0.13, 51.51, 'Europe/London'),
+    (151.21, -33.87, 'Australia/Sydney'), (77.21, 28.61, 'Asia/Kolkata'),
+]
+
+# 常見出生地：(城市, 經度, 緯度, 時區, 權重)
+CITIES = [
+    ('台北', 121.56, 25.04, 'Asia/Taipei', 30), ('高雄', 120.31, 22.63, 'Asia/Taipei', 10),
+    ('台中', 120.68, 24.14, 'Asia/Taipei', 10), ('香港', 114.17, 22.32, 'Asia/Hong_Kong', 8),
+    ('東京', 139.69, 35.69, 'Asia/Tokyo', 6), ('上海', 121.47, 31.23, 'Asia/Shanghai', 8),
+    ('新加坡', 103.82, 1.35, 'Asia/Singapore', 5), ('洛杉磯', -118.24, 34.05, 'America/Los_Angeles', 5),
+    ('紐約', -74.01, 40.71, 'America/New_York', 5), ('倫敦', -0.13, 51.51, 'Europe/London', 4),
+    ('雪梨', 151.21, -33.87, 'Australia/Sydney', 3), ('溫哥華', -123.12, 49.28, 'America/Vancouver', 3),
+]
+
+
+def random_birth(rng: random.Random, name: str, earliest_hour: int = 0) -> dict:
+    """
+    從固定地點隨機產生出生資料
+
+    Args:
+        rng: 呼叫端的亂數產生器（固定種子即可重現）
+        name: 角色名稱
+        earliest_hour: 最早的出生小時；設為 4 可避開夏令時間切換的清晨時段
+    """
+    lng, lat, tz = rng.choice(TIMEZONES)
+    return {
+        'name': name, 'year': rng.randint(1930, 2020), 'month': rng.randint(1, 12),
+        'day': rng.randint(1, 28), 'hour': rng.randint(earliest_hour, 23), 'minute': rng.randint(0, 59),
+        'city': tz.split('/')[-1], 'longitude': lng, 'latitude': lat, 'timezone': tz
+    }
+
+
+def realistic_birth(rng: random.Random, precision: Optional[str] = None) -> dict:
+    """貼近實際分佈的出生資料：依城市權重抽樣，出生年集中在 1960-2005，避開夏令時間切換的清晨時段"""
+    city, lng, lat, tz, _ = rng.choices(CITIES, weights=[c[4] for c in CITIES])[0]
+    year = min(2020, max(1930, int(rng.gauss(1985, 14))))
+    birth = {
+        'name': f"負載{rng.randint(1, 10 ** 6)}", 'year': year, 'month': rng.randint(1, 12),
+        'day': rng.randint(1, 28), 'hour': rng.randint(4, 23), 'minute': rng.randint(0, 59),
+        'city': city, 'longitude': lng, 'latitude': lat, 'timezone': tz
+    }
+    if precision:
+        birth['precision'] = precision
+    return birth
+
+
+def random_utc_birth(rng: random.Random, polar: bool = False) -> dict:
+    """
+    任意地點的隨機出生時刻；以 UTC 表示避開夏令時間不存在的時刻
+
+    Args:
+        polar: False 時緯度限制在 Placidus 有定義的 ±60 度內；True 時取極圈內（|緯度| 66-90 度）
+    """
+    return {
+        'name': 'accuracy', 'year': rng.randint(1900, 2050), 'month': rng.randint(1, 12),
+        'day': rng.randint(1, 28), 'hour': rng.randint(0, 23), 'minute': rng.randint(0, 59),
+        'city': 'random', 'longitude': round(rng.uniform(-180, 180), 3),
+        'latitude': round(rng.choice((-1, 1)) * rng.uniform(66, 90) if polar else rng.uniform(-60, 60), 3),
+        'timezone': 'UTC'
+    }
+
+
+def free_port() -> int:
+    """向系統取得一個目前未使用的本機連接埠"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位數：已排序資料中至少 pct% 的值小於等於它的最小值"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values) - 1, max(0, rank - 1))]
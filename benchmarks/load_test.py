@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+本機負載測試
+以閉迴圈客戶端（每個客戶端收到回應後才送出下一個請求）對應用施壓，
+重播隨機但貼近實際的出生資料，回報吞吐量、p50/p95/p99 延遲與各路由分佈，
+並逐步提高併發找出飽和點：
+- 吞吐量增幅低於 --plateau（預設 10%）
+- p99 超過 --slo-p99 毫秒
+- 錯誤率（不含限流 429 / 削減 503）超過 1%，或被限流 / 削減的比例超過 5%
+
+目標:
+    inprocess  在同一程序內以 Flask 測試客戶端呼叫 WSGI 應用（不含網路與 worker 排程，受 GIL 限制）
+    gunicorn   以 gunicorn.conf.py 啟動本機 gunicorn 後經 HTTP 施壓
+    --url      對已在執行的服務施壓
+
+用法:
+    python benchmarks/load_test.py --target gunicorn --ramp 1,2,4,8,16,32 --duration 5
+    python benchmarks/load_test.py --target inprocess --concurrency 8 --duration 10 \\
+        --mix calculate=0.8,health=0.15,test=0.05 --output load.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from fixtures import free_port, percentile, realistic_birth
+
+# 路由：名稱 -> (方法, 路徑, 是否附出生資料)
+ROUTES = {
+    'calculate': ('POST', '/api/calculate_chart', True),
+    'health': ('GET', '/api/health', False),
+    'test': ('GET', '/api/test', False),
+    'index': ('GET', '/', False),
+}
+
+DEFAULT_MIX = 'calculate=0.8,health=0.15,test=0.03,index=0.02'
+
+# 應用主動拒絕（限流、負載削減）的狀態碼，與真正的錯誤分開統計
+SHED_STATUSES = (429, 503)
+
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"未知的路由: {name}（可用: {', '.join(ROUTES)}）")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+# ==================== 傳送端 ====================
+
+def inprocess_sender() -> Callable[[], Callable[[str, str, Optional[dict]], int]]:
+    """回傳每個客戶端執行緒各自建立傳送函式的工廠"""
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    import main
+
+    def factory():
+        client = main.app.test_client()
+
+        def send(method: str, path: str, body: Optional[dict]) -> int:
+            return client.open(path, method=method, json=body).status_code
+        return send
+    return factory
+
+
+def http_sender(base_url: str) -> Callable[[], Callable[[str, str, Optional[dict]], int]]:
+    """HTTP keep-alive 連線；連線中斷時重新建立"""
+    parsed = urllib.parse.urlparse(base_url)
+
+    def factory():
+        conn = [None]
+
+        def send(method: str, path: str, body: Optional[dict]) -> int:
+            payload = json.dumps(body).encode('utf-8') if body is not None else None
+            headers = {'Content-Type': 'application/json'} if payload is not None else {}
+            for attempt in range(2):
+                if conn[0] is None:
+                    conn[0] = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+                try:
+                    conn[0].request(method, path, body=payload, headers=headers)
+                    resp = conn[0].getresponse()
+                    resp.read()
+                    return resp.status
+                except (http.client.HTTPException, OSError):
+                    conn[0].close()
+                    conn[0] = None
+            return 0
+        return send
+    return factory
+
+
+def start_gunicorn(workers: Optional[int], threads: Optional[int], worker_class: Optional[str]):
+    """啟動本機 gunicorn，回傳 (程序, base_url)；限流預設關閉以量測真實容量"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_ACCESSLOG='', GUNICORN_LOGLEVEL='warning',
+               LOG_SAMPLE_RATE=os.environ.get('LOG_SAMPLE_RATE', '0'),
+               RATE_LIMIT_ENABLED=os.environ.get('RATE_LIMIT_ENABLED', 'false'))
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    if threads:
+        env['GUNICORN_THREADS'] = str(threads)
+    if worker_class:
+        env['GUNICORN_WORKER_CLASS'] = worker_class
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                            cwd=parent_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + 60
+    send = http_sender(base_url)()
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        if send('GET', '/api/health', None) == 200:
+            return proc, base_url
+        time.sleep(0.2)
+    stop_process(proc)
+    raise RuntimeError('gunicorn 啟動失敗')
+
+
+def stop_process(proc) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ==================== 施壓與統計 ====================
+
+def run_level(factory, concurrency: int, duration: float, mix: List[Tuple[str, float]],
+              precision: Optional[str], seed: int, warmup: float = 0.5) -> Dict:
+    """
+    以固定併發施壓 duration 秒；前 warmup 秒的請求不列入統計
+
+    Returns:
+        吞吐量、延遲百分位數、狀態碼分佈與各路由統計
+    """
+    names = [m[0] for m in mix]
+    weights = [m[1] for m in mix]
+    records: List[Tuple[str, float, int]] = []
+    lock = threading.Lock()
+    begin = time.perf_counter()
+    measure_from = begin + warmup
+    stop_at = measure_from + duration
+
+    def client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        send = factory()
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            route = rng.choices(names, weights=weights)[0]
+            method, path, with_body = ROUTES[route]
+            body = realistic_birth(rng, precision) if with_body else None
+            start = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except Exception:
+                status = 0
+            end = time.perf_counter()
+            if start >= measure_from and end <= stop_at:
+                local.append((route, end - start, status))
+        with lock:
+            records.extend(local)
+
+    cpu_start = time.process_time()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cpu_used = time.process_time() - cpu_start
+    wall = time.perf_counter() - begin
+    # 本程序的 CPU 使用率；HTTP 目標時若接近 1 核，瓶頸可能是負載產生器本身
+    return dict(summarize(records, concurrency, duration), client_cpu=round(cpu_used / wall, 2))
+
+
+def _latency_summary(latencies: List[float]) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def summarize(records: List[Tuple[str, float, int]], concurrency: int, duration: float) -> Dict:
+    ok = [r for r in records if 200 <= r[2] < 400]
+    shed = sum(1 for r in records if r[2] in SHED_STATUSES)
+    errors = len(records) - len(ok) - shed
+    statuses: Dict[str, int] = {}
+    for _, _, status in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    routes = {}
+    for route in sorted({r[0] for r in records}):
+        routes[route] = _latency_summary([r[1] for r in records if r[0] == route])
+
+    total = max(len(records), 1)
+    return dict(
+        _latency_summary([r[1] for r in ok]),
+        concurrency=concurrency,
+        requests=len(records),
+        throughput_rps=round(len(ok) / duration, 1),
+        error_rate=round(errors / total, 4),
+        shed_rate=round(shed / total, 4),
+        statuses=statuses,
+        routes=routes,
+    )
+
+
+def find_saturation(levels: List[Dict], plateau: float, slo_p99_ms: Optional[float]) -> Optional[Dict]:
+    """
+    找出第一個飽和的併發層級
+
+    Returns:
+        {'concurrency', 'reason', 'max_throughput_rps'}；未飽和時為 None
+    """
+    best = 0.0
+    for i, level in enumerate(levels):
+        reasons = []
+        if level['error_rate'] > 0.01:
+            reasons.append(f"錯誤率 {level['error_rate']:.1%}")
+        if level['shed_rate'] > 0.05:
+            reasons.append(f"限流/削減 {level['shed_rate']:.1%}")
+        if slo_p99_ms is not None and level['p99_ms'] > slo_p99_ms:
+            reasons.append(f"p99 {level['p99_ms']:.0f}ms 超過 {slo_p99_ms:.0f}ms")
+        if i > 0 and best > 0:
+            gain = level['throughput_rps'] / best - 1
+            added = level['concurrency'] / levels[i - 1]['concurrency'] - 1
+            if added > 0 and gain < plateau:
+                reasons.append(f"吞吐量僅增加 {gain:+.1%}（併發 +{added:.0%}）")
+        if reasons:
+            return {'concurrency': level['concurrency'], 'reason': '；'.join(reasons),
+                    'max_throughput_rps': max(best, level['throughput_rps']),
+                    'last_healthy_concurrency': levels[i - 1]['concurrency'] if i > 0 else None}
+        best = max(best, level['throughput_rps'])
+    return None
+
+
+def _print_level(level: Dict, remote: bool) -> None:
+    print(f"  併發 {level['concurrency']:>4}  {level['throughput_rps']:8.1f} req/s  "
+          f"p50 {level['p50_ms']:8.2f}ms  p95 {level['p95_ms']:8.2f}ms  p99 {level['p99_ms']:8.2f}ms  "
+          f"錯誤 {level['error_rate']:.1%}  限流/削減 {level['shed_rate']:.1%}")
+    if remote and level['client_cpu'] > 0.8:
+        print(f"    ⚠️ 負載產生器 CPU 使用率 {level['client_cpu']:.0%}，結果可能受產生器本身限制")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='本機負載測試')
+    parser.add_argument('--target', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--url', help='對已在執行的服務施壓，例如 http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8, help='固定併發（未指定 --ramp 時）')
+    parser.add_argument('--ramp', help='逐步提高的併發層級，例如 1,2,4,8,16,32')
+    parser.add_argument('--duration', type=float, default=5.0, help='每個層級的量測秒數')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='路由組合權重')
+    parser.add_argument('--precision', choices=['exact', 'fast', 'approx'], help='計算請求的精度層級')
+    parser.add_argument('--plateau', type=float, default=0.10, help='吞吐量增幅低於此比例視為飽和')
+    parser.add_argument('--slo-p99', type=float, help='p99 延遲上限（毫秒）')
+    parser.add_argument('--workers', type=int, help='gunicorn worker 數')
+    parser.add_argument('--threads', type=int, help='gunicorn 每個 worker 的執行緒數')
+    parser.add_argument('--worker-class', help='gunicorn worker 類型')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='結果 JSON 輸出路徑')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels_to_run = [int(c) for c in args.ramp.split(',')] if args.ramp else [args.concurrency]
+
+    proc = None
+    if args.url:
+        target = args.url
+        factory = http_sender(args.url)
+    elif args.target == 'gunicorn':
+        proc, target = start_gunicorn(args.workers, args.threads, args.worker_class)
+        factory = http_sender(target)
+    else:
+        target = 'inprocess'
+        factory = inprocess_sender()
+
+    print(f"🚦 負載測試 目標: {target}  組合: {args.mix}  每層 {args.duration:.0f}秒")
+    print("=" * 100)
+    levels = []
+    try:
+        for i, concurrency in enumerate(levels_to_run):
+            level = run_level(factory, concurrency, args.duration, mix, args.precision, args.seed + i)
+            levels.append(level)
+            _print_level(level, remote=target != 'inprocess')
+    finally:
+        if proc is not None:
+            stop_process(proc)
+
+    for route, stats in levels[-1]['routes'].items():
+        print(f"    {route:<10} {stats['count']:>6} 筆  p50 {stats['p50_ms']:8.2f}ms  "
+              f"p95 {stats['p95_ms']:8.2f}ms  p99 {stats['p99_ms']:8.2f}ms")
+
+    saturation = find_saturation(levels, args.plateau, args.slo_p99) if len(levels) > 1 or args.slo_p99 else None
+    if len(levels) > 1 or args.slo_p99:
+        if saturation:
+            print(f"\n📈 飽和點: 併發 {saturation['concurrency']}（{saturation['reason']}），"
+                  f"最高吞吐量 {saturation['max_throughput_rps']:.1f} req/s，"
+                  f"最後健康併發 {saturation['last_healthy_concurrency']}")
+        else:
+            print(f"\n📈 測試範圍內未達飽和，最高吞吐量 {max(l['throughput_rps'] for l in levels):.1f} req/s")
+
+    if args.output:
+        report = {'target': target, 'mix': dict(mix), 'precision': args.precision,
+                  'duration': args.duration, 'levels': levels, 'saturation': saturation}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+流量重播
+將 CAPTURE_ENABLED 擷取的 calculate_chart 流量依原始時間間隔（或加速）重播，比較延遲與輸出：
+- 流量輪廓：出生年代、時區、精度組合、重複率，以及不同容量的 LRU 快取命中率模擬
+- 延遲：擷取時與重播時的 p50/p95/p99（僅成功請求）
+- 輸出：同一精度層級下，與隨機無關的輸出摘要（星座、宮位、度數、職業）須一致
+
+目標:
+    inprocess  Flask 測試客戶端
+    engine     直接呼叫引擎（不含 Flask；驗證失敗的請求在本地判定為 400）
+    gunicorn   以 gunicorn.conf.py 啟動本機 gunicorn
+    --url      已在執行的服務
+
+--speed 1 為原始速度，10 為十倍速，0 為不等待、以 --concurrency 個執行緒盡快送出。
+
+用法:
+    CAPTURE_ENABLED=true python main.py   # 擷取到 captures/calculate_chart-<pid>.ndjson
+    python benchmarks/replay_capture.py captures/*.ndjson --analyze
+    python benchmarks/replay_capture.py captures/*.ndjson --target engine --speed 0
+    python benchmarks/replay_capture.py captures/*.ndjson --target gunicorn --speed 5 --output replay.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from fixtures import percentile
+from load_test import start_gunicorn, stop_process
+from traffic_capture import output_fingerprint, read_capture
+
+LRU_SIZES = (128, 1024, 8192)
+CHART_KEY_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'longitude', 'latitude', 'timezone', 'precision')
+
+# 傳送函式：payload -> (狀態碼, 回應 JSON)
+Sender = Callable[[dict], Tuple[int, Optional[dict]]]
+
+
+# ==================== 流量輪廓 ====================
+
+def chart_key(payload: dict) -> tuple:
+    """決定星盤結果的輸入欄位；姓名不影響星盤"""
+    return tuple(payload.get(k) for k in CHART_KEY_FIELDS)
+
+
+def lru_hit_rate(keys: List[tuple], capacity: int) -> float:
+    cache: OrderedDict = OrderedDict()
+    hits = 0
+    for key in keys:
+        if key in cache:
+            hits += 1
+            cache.move_to_end(key)
+        else:
+            cache[key] = None
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return hits / max(len(keys), 1)
+
+
+def traffic_profile(entries: List[Dict]) -> Dict:
+    """擷取流量的分佈與重複率"""
+    payloads = [e['payload'] for e in entries if e.get('payload')]
+    keys = [chart_key(p) for p in payloads]
+    seen = set()
+    repeats = 0
+    for key in keys:
+        if key in seen:
+            repeats += 1
+        seen.add(key)
+    decades = Counter(f"{p['year'] // 10 * 10}s" for p in payloads if isinstance(p.get('year'), int))
+    span = entries[-1]['ts'] - entries[0]['ts'] if len(entries) > 1 else 0.0
+    return {
+        'requests': len(entries),
+        'span_seconds': round(span, 1),
+        'mean_rate_rps': round(len(entries) / span, 2) if span > 0 else None,
+        'status': dict(Counter(str(e['status']) for e in entries).most_common()),
+        'precision': dict(Counter(str(p.get('precision', 'default')) for p in payloads).most_common()),
+        'timezones': dict(Counter(str(p.get('timezone', 'Asia/Taipei')) for p in payloads).most_common(10)),
+        'birth_decades': dict(sorted(decades.items())),
+        'distinct_charts': len(seen),
+        'repeat_rate': round(repeats / max(len(keys), 1), 4),
+        'lru_hit_rate': {str(size): round(lru_hit_rate(keys, size), 4) for size in LRU_SIZES},
+    }
+
+
+# ==================== 傳送端 ====================
+
+def inprocess_sender() -> Callable[[], Sender]:
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    import main
+
+    def factory():
+        client = main.app.test_client()
+
+        def send(payload: dict):
+            resp = client.post('/api/calculate_chart', json=payload)
+            return resp.status_code, resp.get_json(silent=True)
+        return send
+    return factory
+
+
+def engine_sender() -> Callable[[], Sender]:
+    """直接呼叫引擎；精度層級依擷取時實際使用的層級，輸出才可比對"""
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    import main
+    from request_schema import BIRTH_DATA_SCHEMA
+
+    def factory():
+        def send(payload: dict):
+            validation = BIRTH_DATA_SCHEMA.validate(payload)
+            if validation.missing_fields or validation.errors:
+                return 400, None
+            data = {**payload, **validation.values}
+            precision, engine = main.engine_registry.resolve(
+                payload.get('_replay_precision') or data.get('precision') or main.app.config['DEFAULT_PRECISION'])
+            result = main.calculate_with_engine(engine, data)
+            result['metadata'] = {'precision': precision}
+            return 200, result
+        return send
+    return factory
+
+
+def http_sender(base_url: str) -> Callable[[], Sender]:
+    parsed = urllib.parse.urlparse(base_url)
+
+    def factory():
+        conn = [None]
+
+        def send(payload: dict):
+            body = json.dumps(payload).encode('utf-8')
+            for attempt in range(2):
+                if conn[0] is None:
+                    conn[0] = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+                try:
+                    conn[0].request('POST', '/api/calculate_chart', body=body,
+                                    headers={'Content-Type': 'application/json'})
+                    resp = conn[0].getresponse()
+                    raw = resp.read()
+                    try:
+                        return resp.status, json.loads(raw)
+                    except ValueError:
+                        return resp.status, None
+                except (http.client.HTTPException, OSError):
+                    conn[0].close()
+                    conn[0] = None
+            return 0, None
+        return send
+    return factory
+
+
+# ==================== 重播 ====================
+
+def replay(entries: List[Dict], factory: Callable[[], Sender], speed: float,
+           concurrency: int, engine_target: bool) -> List[Dict]:
+    """
+    依擷取時間重播；speed <= 0 時不等待
+    每筆結果含延遲、排程落後時間與輸出摘要
+    """
+    local = threading.local()
+    results: List[Optional[Dict]] = [None] * len(entries)
+
+    def run(index: int, scheduled: float) -> None:
+        sender = getattr(local, 'send', None)
+        if sender is None:
+            sender = local.send = factory()
+        entry = entries[index]
+        payload = dict(entry['payload'])
+        if engine_target and entry.get('precision'):
+            payload['_replay_precision'] = entry['precision']
+        started = time.perf_counter()
+        try:
+            status, body = sender(payload)
+        except Exception as e:
+            status, body = 0, {'error': str(e)}
+        latency = (time.perf_counter() - started) * 1000
+        output = output_fingerprint(body) if status == 200 and body else None
+        results[index] = {
+            'status': status,
+            'latency_ms': latency,
+            'lag_ms': max(0.0, (started - scheduled) * 1000) if speed > 0 else 0.0,
+            'precision': (body or {}).get('metadata', {}).get('precision') if status == 200 else None,
+            'output': output,
+        }
+
+    # 預熱：每個精度層級先送一筆，引擎延遲載入的成本不計入重播延遲
+    warm = {}
+    for entry in entries:
+        if entry['status'] == 200:
+            warm.setdefault(entry.get('precision'), entry)
+    sender = factory()
+    for entry in warm.values():
+        payload = dict(entry['payload'])
+        if engine_target and entry.get('precision'):
+            payload['_replay_precision'] = entry['precision']
+        sender(payload)
+
+    ts0 = entries[0]['ts']
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        for i, entry in enumerate(entries):
+            scheduled = start
+            if speed > 0:
+                scheduled = start + (entry['ts'] - ts0) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, i, scheduled)
+    return results
+
+
+def _latency_summary(values: List[float]) -> Dict:
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+    }
+
+
+def compare_results(entries: List[Dict], results: List[Dict]) -> Dict:
+    """比較擷取與重播的狀態碼、延遲與輸出摘要"""
+    captured_ok = [e['duration_ms'] for e, r in zip(entries, results) if e['status'] == 200]
+    replayed_ok = [r['latency_ms'] for e, r in zip(entries, results) if e['status'] == 200 and r['status'] == 200]
+    captured = _latency_summary(captured_ok)
+    replayed = _latency_summary(replayed_ok)
+
+    status_mismatches = Counter()
+    compared = 0
+    mismatches = []
+    for i, (entry, result) in enumerate(zip(entries, results)):
+        if entry['status'] != result['status']:
+            status_mismatches[f"{entry['status']}->{result['status']}"] += 1
+        expected = entry.get('output')
+        actual = result['output']
+        # 精度層級不同（例如擷取時降級）的結果不可比
+        if not expected or not actual or entry.get('precision') != result['precision']:
+            continue
+        compared += 1
+        if expected['hash'] != actual['hash']:
+            differing = sorted(k for k, v in expected['signs'].items() if actual['signs'].get(k) != v)
+            mismatches.append({
+                'index': i,
+                'payload': entry['payload'],
+                'precision': entry.get('precision'),
+                'class': [expected['class'], actual['class']],
+                'differing_signs': differing,
+            })
+
+    lags = [r['lag_ms'] for r in results]
+    return {
+        'latency': {
+            'captured': captured,
+            'replayed': replayed,
+            'p50_ratio': round(replayed['p50_ms'] / captured['p50_ms'], 3) if captured['p50_ms'] else None,
+            'p99_ratio': round(replayed['p99_ms'] / captured['p99_ms'], 3) if captured['p99_ms'] else None,
+        },
+        'schedule_lag': _latency_summary(lags),
+        'status_mismatches': dict(status_mismatches),
+        'outputs_compared': compared,
+        'output_mismatches': len(mismatches),
+        'mismatch_samples': mismatches[:10],
+    }
+
+
+def _print_profile(profile: Dict) -> None:
+    print(f"📼 {profile['requests']} 筆請求，涵蓋 {profile['span_seconds']} 秒"
+          + (f"（平均 {profile['mean_rate_rps']} req/s）" if profile['mean_rate_rps'] else ''))
+    print(f"   狀態: {profile['status']}")
+    print(f"   精度: {profile['precision']}")
+    print(f"   時區: {profile['timezones']}")
+    print(f"   出生年代: {profile['birth_decades']}")
+    print(f"   不同星盤 {profile['distinct_charts']} 個，重複率 {profile['repeat_rate'] * 100:.1f}%")
+    print("   LRU 命中率: " + '  '.join(f"{size} 筆 {rate * 100:.1f}%"
+                                       for size, rate in profile['lru_hit_rate'].items()))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='流量重播')
+    parser.add_argument('files', nargs='+', help='擷取檔（輪替產生的 .1、.2 舊檔會一併讀取）')
+    parser.add_argument('--target', choices=['inprocess', 'engine', 'gunicorn'], default='inprocess')
+    parser.add_argument('--url', help='對已在執行的服務重播，例如 http://127.0.0.1:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help='重播速度倍率；0 為不等待')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時進行的請求上限')
+    parser.add_argument('--limit', type=int, help='只重播前 N 筆')
+    parser.add_argument('--analyze', action='store_true', help='只分析流量輪廓，不重播')
+    parser.add_argument('--output', help='結果 JSON 輸出路徑')
+    args = parser.parse_args()
+
+    entries = sorted((e for e in read_capture(args.files) if e.get('payload')), key=lambda e: e['ts'])
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("❌ 擷取檔中沒有可重播的請求")
+        sys.exit(1)
+
+    profile = traffic_profile(entries)
+    _print_profile(profile)
+    report = {'files': args.files, 'profile': profile}
+
+    if not args.analyze:
+        proc = None
+        if args.url:
+            target, factory = args.url, http_sender(args.url)
+        elif args.target == 'gunicorn':
+            proc, target = start_gunicorn(None, None, None)
+            factory = http_sender(target)
+        elif args.target == 'engine':
+            target, factory = 'engine', engine_sender()
+        else:
+            target, factory = 'inprocess', inprocess_sender()
+
+        print(f"\n▶️  重播至 {target}，速度 {'不等待' if args.speed <= 0 else f'{args.speed:g}x'}")
+        started = time.perf_counter()
+        try:
+            results = replay(entries, factory, args.speed, args.concurrency, target == 'engine')
+        finally:
+            if proc is not None:
+                stop_process(proc)
+        elapsed = time.perf_counter() - started
+
+        comparison = compare_results(entries, results)
+        report.update({'target': target, 'speed': args.speed, 'elapsed_seconds': round(elapsed, 2),
+                       'comparison': comparison})
+        latency = comparison['latency']
+        print(f"   完成 {len(results)} 筆，用時 {elapsed:.1f} 秒")
+        for label in ('captured', 'replayed'):
+            s = latency[label]
+            print(f"   {'擷取' if label == 'captured' else '重播'}  p50 {s['p50_ms']:8.2f}ms  "
+                  f"p95 {s['p95_ms']:8.2f}ms  p99 {s['p99_ms']:8.2f}ms  ({s['count']} 筆成功)")
+        if args.speed > 0:
+            print(f"   排程落後 p99 {comparison['schedule_lag']['p99_ms']:.1f}ms")
+        if comparison['status_mismatches']:
+            print(f"   ⚠️ 狀態碼不同: {comparison['status_mismatches']}")
+        print(f"   輸出比對 {comparison['outputs_compared']} 筆，不一致 {comparison['output_mismatches']} 筆")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 結果已寫入 {args.output}")
+
+    mismatched = report.get('comparison', {}).get('output_mismatches', 0)
+    if 'comparison' in report:
+        print("✅ 輸出一致" if not mismatched else "❌ 重播輸出與擷取不一致")
+    sys.exit(0 if not mismatched else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+記憶體浸泡測試
+連續執行大量計算，定期取樣常駐記憶體 (RSS)，檢查長時間執行下記憶體是否持平：
+- 預熱階段（--warmup，預設前 5%）不列入判定，讓快取、延遲載入與配置器池穩定
+- 預熱後 RSS 增長不得超過 --tolerance-mb
+- 後半段取樣的線性迴歸斜率不得超過 --max-slope-kb（每千次計算的 KB 數），
+  避免緩慢洩漏在容許值內被掩蓋（後半段不足一萬次時只檢查總增長）
+
+模式:
+    engine  直接呼叫引擎 calculate_natal_chart 並產生角色（不含 Flask）
+    app     透過 Flask 測試客戶端呼叫 /api/calculate_chart（含請求上下文、日誌與回應序列化）
+
+用法:
+    python benchmarks/soak_memory.py --calculations 200000 --precision fast
+    python benchmarks/soak_memory.py --mode app --calculations 20000 --precision exact --output soak.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('MAX_PENDING_CALCULATIONS', '0')
+# app 模式只量測計算流程；角色永久連結的寫入緩衝不列入
+os.environ.setdefault('CHARACTER_STORE_ENABLED', 'false')
+
+import main
+from fixtures import random_birth
+from memory_diagnostics import current_rss_mb
+
+MIN_SLOPE_SPAN = 10000  # 後半段至少涵蓋的計算次數，才檢查斜率
+
+
+def engine_runner(precision: str) -> Callable[[dict], None]:
+    _, engine = main.engine_registry.resolve(precision)
+
+    def run(birth: dict) -> None:
+        main.calculate_with_engine(engine, birth)
+    return run
+
+
+def app_runner(precision: str) -> Callable[[dict], None]:
+    client = main.app.test_client()
+
+    def run(birth: dict) -> None:
+        resp = client.post('/api/calculate_chart', json=dict(birth, precision=precision))
+        if resp.status_code != 200:
+            raise RuntimeError(f"計算失敗: {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+    return run
+
+
+def slope_kb_per_thousand(samples: List[Tuple[int, float]]) -> float:
+    """(計算次數, RSS MB) 的最小平方斜率，換算為每千次計算的 KB"""
+    n = len(samples)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+    if var_x == 0:
+        return 0.0
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in samples)
+    return cov / var_x * 1024 * 1000
+
+
+def soak(run: Callable[[dict], None], calculations: int, sample_every: int,
+         warmup_fraction: float, seed: int) -> Dict:
+    rng = random.Random(seed)
+    births = [random_birth(rng, f"浸泡{i}") for i in range(512)]
+    warmup = int(calculations * warmup_fraction)
+    samples: List[Tuple[int, float]] = []
+    started = time.perf_counter()
+
+    for i in range(calculations):
+        run(births[i % len(births)])
+        done = i + 1
+        if done == warmup or (done > warmup and (done - warmup) % sample_every == 0) or done == calculations:
+            gc.collect()
+            rss = current_rss_mb()
+            samples.append((done, rss))
+            elapsed = time.perf_counter() - started
+            print(f"  {done:>9,} 次  RSS {rss:8.2f} MB  {done / elapsed:8.0f} 次/秒", flush=True)
+
+    measured = [s for s in samples if s[0] >= warmup]
+    second_half = [s for s in measured if s[0] >= warmup + (calculations - warmup) / 2]
+    baseline_rss = measured[0][1]
+    return {
+        'calculations': calculations,
+        'warmup_calculations': warmup,
+        'duration_seconds': round(time.perf_counter() - started, 1),
+        'baseline_rss_mb': round(baseline_rss, 2),
+        'final_rss_mb': round(measured[-1][1], 2),
+        'max_rss_mb': round(max(rss for _, rss in measured), 2),
+        'growth_mb': round(max(rss for _, rss in measured) - baseline_rss, 2),
+        'second_half_slope_kb_per_1k': round(slope_kb_per_thousand(second_half), 2),
+        'samples': [{'calculations': n, 'rss_mb': round(rss, 2)} for n, rss in samples],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='記憶體浸泡測試')
+    parser.add_argument('--calculations', type=int, default=200000)
+    parser.add_argument('--mode', choices=('engine', 'app'), default='engine')
+    parser.add_argument('--precision', default='fast', choices=main.engine_registry.tiers)
+    parser.add_argument('--warmup', type=float, default=0.05, help='預熱比例（不列入判定）')
+    parser.add_argument('--samples', type=int, default=40, help='預熱後的 RSS 取樣次數')
+    parser.add_argument('--tolerance-mb', type=float, default=16.0)
+    parser.add_argument('--max-slope-kb', type=float, default=8.0, help='後半段每千次計算的 RSS 增長上限（KB）')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    args = parser.parse_args()
+
+    runner = engine_runner(args.precision) if args.mode == 'engine' else app_runner(args.precision)
+    sample_every = max((args.calculations - int(args.calculations * args.warmup)) // max(args.samples, 1), 1)
+
+    print(f"🧠 記憶體浸泡測試（{args.mode}，{args.precision}，{args.calculations:,} 次）")
+    print("=" * 50)
+    result = soak(runner, args.calculations, sample_every, args.warmup, args.seed)
+    result.update({'mode': args.mode, 'precision': args.precision,
+                   'tolerance_mb': args.tolerance_mb, 'max_slope_kb_per_1k': args.max_slope_kb})
+
+    print("=" * 50)
+    print(f"RSS：預熱後 {result['baseline_rss_mb']} MB → 最終 {result['final_rss_mb']} MB"
+          f"（最高增長 {result['growth_mb']} MB，容許 {args.tolerance_mb} MB）")
+    print(f"後半段斜率：{result['second_half_slope_kb_per_1k']} KB / 千次（上限 {args.max_slope_kb}）")
+
+    failures = []
+    if result['growth_mb'] > args.tolerance_mb:
+        failures.append('RSS 增長超過容許值')
+    # RSS 以分頁為單位變動，次數太少時斜率受單次跳動主導，不納入判定
+    span = result['calculations'] - result['warmup_calculations']
+    if span >= 2 * MIN_SLOPE_SPAN and result['second_half_slope_kb_per_1k'] > args.max_slope_kb:
+        failures.append('後半段 RSS 持續上升')
+    result['passed'] = not failures
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果已寫入 {args.output}")
+
+    print("✅ 記憶體持平" if not failures else f"❌ {'；'.join(failures)}")
+    sys.exit(0 if not failures else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+多執行緒壓力測試
+以大量平行計算驗證星盤與角色流程在 gthread worker 下的正確性：
+1. 直接呼叫引擎：平行結果須與單執行緒參考結果一致（行星、宮位、職業），屬性須落在隨機範圍內
+2. 透過 Flask 測試客戶端：全部請求成功，且請求計數器不遺失更新
+
+用法:
+    python benchmarks/stress_concurrency.py [--calculations 4000] [--threads 32]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('MAX_PENDING_CALCULATIONS', '0')
+
+import main
+from astro_consultant import ProfessionalAstrologer
+from dnd_character_generator import DnDCharacterGenerator
+from fixtures import random_birth
+
+
+def _fingerprint(chart: dict, generator: DnDCharacterGenerator) -> tuple:
+    """與隨機無關的輸出摘要"""
+    planets = tuple((k, p['sign_code'], p['house'], p['position']) for k, p in chart['planets'].items())
+    houses = tuple((k, h['position']) for k, h in chart['houses'].items())
+    dnd_class = generator.determine_dnd_class(chart)
+    return planets, houses, chart['angles']['ascendant']['position'], dnd_class
+
+
+def _stats_within_bounds(chart: dict, stats: dict, generator: DnDCharacterGenerator) -> bool:
+    """屬性須等於確定性基礎值 ±2（並截斷於 8-18）"""
+    base = {k: 10 for k in stats}
+    weights = {'sun': 1.0, 'moon': 0.7}
+    for key in ['sun', 'moon', 'mars', 'mercury', 'venus']:
+        sign = chart['planets'][key]['sign_code']
+        for stat, modifier in generator.sign_stat_modifiers.get(sign, {}).items():
+            base[stat] += int(modifier * weights.get(key, 0.5))
+    return all(max(8, min(18, base[k] - 2)) <= v <= max(8, min(18, base[k] + 2)) for k, v in stats.items())
+
+
+def stress_engine(calculations: int, threads: int, seed: int = 42) -> int:
+    """平行引擎計算，回傳不一致的數量"""
+    astrologer = ProfessionalAstrologer()
+    generator = DnDCharacterGenerator()
+    rng = random.Random(seed)
+    births = [random_birth(rng, f"壓測{i}") for i in range(calculations)]
+
+    def compute(b):
+        chart = astrologer.calculate_natal_chart(
+            b['name'], b['year'], b['month'], b['day'], b['hour'], b['minute'],
+            b['city'], b['longitude'], b['latitude'], b['timezone'])
+        character = generator.generate_complete_character(chart)
+        return chart, character
+
+    # 參考結果（單執行緒）；夏令時間跳過的不存在時刻會被引擎拒絕，不列入比較
+    reference, valid_births = [], []
+    for b in births:
+        try:
+            reference.append(_fingerprint(compute(b)[0], generator))
+            valid_births.append(b)
+        except Exception:
+            continue
+    births = valid_births
+    calculations = len(births)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(compute, births))
+    elapsed = time.perf_counter() - start
+
+    mismatches = 0
+    for ref, (chart, character) in zip(reference, results):
+        if _fingerprint(chart, generator) != ref or not _stats_within_bounds(chart, character['stats'], generator):
+            mismatches += 1
+    print(f"  引擎: {calculations} 次計算，{threads} 執行緒，{elapsed:.2f}秒，不一致 {mismatches}")
+    return mismatches
+
+
+def stress_app(requests: int, threads: int, seed: int = 7) -> int:
+    """平行 API 請求，回傳問題數量"""
+    rng = random.Random(seed)
+    births = [random_birth(rng, f"壓測{i}") for i in range(requests)]
+    # 避開夏令時間跳過的時段
+    births = [dict(b, hour=12) if b['hour'] in (0, 1, 2, 3) else b for b in births]
+    before = main.request_counter.value
+
+    def call(b):
+        client = main.app.test_client()
+        resp = client.post('/api/calculate_chart', json=b)
+        body = resp.get_json()
+        return resp.status_code == 200 and body['success'] and body['character']['name'] == b['name']
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(call, births))
+    elapsed = time.perf_counter() - start
+
+    failures = results.count(False)
+    lost_counts = requests - (main.request_counter.value - before)
+    print(f"  API: {requests} 次請求，{threads} 執行緒，{elapsed:.2f}秒，失敗 {failures}，計數遺失 {lost_counts}")
+    return failures + abs(lost_counts)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='多執行緒壓力測試')
+    parser.add_argument('--calculations', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    print("🧵 多執行緒壓力測試")
+    print("=" * 50)
+    problems = stress_engine(args.calculations, args.threads)
+    problems += stress_app(args.calculations // 2, args.threads)
+    print("✅ 通過" if problems == 0 else f"❌ 發現 {problems} 個問題")
+    sys.exit(0 if problems == 0 else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+角色永久儲存
+生成的角色與星盤以內容雜湊為 ID 存入本機 SQLite，分享連結只需一次主鍵查詢即可取回同一個角色：
+- ID 為正規化 JSON 的 SHA-256 前 9 位元組（base64url 12 字元）；相同內容得到相同 ID，重複寫入自動略過
+- 以 zlib 預設字典壓縮：字典取自代表性的角色樣本（職業描述、星座名稱等重複字串），單筆約 4KB 壓到數百位元組
+  字典存於資料庫中並記錄版本，之後程式調整也不影響舊資料解碼
+- 寫入先進入記憶體緩衝，由背景執行緒每 flush_seconds 以單一交易批次寫入，降低每筆請求的 fsync 與寫入放大
+- 讀取依序查詢近期快取、尚未寫入的緩衝與資料庫
+- 資料筆數超過 max_rows 時刪除最舊的角色，磁碟用量有上限
+
+緩衝只存在於各 worker 記憶體中：另一個 worker 在批次寫入前（預設 0.25 秒內）查詢會找不到。
+緩衝有筆數上限；連續寫入失敗（例如唯讀檔案系統）達 max_failures 次後捨棄緩衝並暫停接受新角色，
+save 回傳 None（不提供分享連結，避免產生失效的連結），背景執行緒確認資料庫可寫入後恢復。
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from concurrency import AtomicCounter
+
+logger = logging.getLogger(__name__)
+
+ID_BYTES = 9
+MAX_DICTIONARY_BYTES = 32 * 1024  # zlib 字典上限
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    dictionary INTEGER NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS characters_created ON characters (created);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    version INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+
+def canonical_json(payload: Dict) -> bytes:
+    """正規化 JSON：鍵排序、無多餘空白，內容相同則位元組相同"""
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def content_id(encoded: bytes) -> str:
+    """內容雜湊 ID"""
+    return base64.urlsafe_b64encode(hashlib.sha256(encoded).digest()[:ID_BYTES]).decode('ascii')
+
+
+def valid_id(character_id: str) -> bool:
+    return len(character_id) == ID_BYTES * 4 // 3 and all(c.isalnum() or c in '-_' for c in character_id)
+
+
+def build_dictionary(samples: List[bytes]) -> bytes:
+    """
+    由樣本建立 zlib 字典
+    zlib 優先比對字典尾端，因此把最常見的內容放在後面：樣本依序串接後取最後 32KB
+    """
+    return b''.join(samples)[-MAX_DICTIONARY_BYTES:]
+
+
+class CharacterStore:
+    """
+    內容定址的角色儲存
+
+    Args:
+        path: SQLite 檔案路徑
+        dictionary_source: 回傳樣本（正規化 JSON 位元組清單）的函式，資料庫尚無字典時用來建立；None 表示不使用字典
+        flush_seconds: 批次寫入間隔
+        max_batch: 緩衝達到此筆數時立即寫入
+        cache_size: 近期讀寫的角色快取筆數
+        max_pending: 緩衝筆數上限，已滿時新角色不保存
+        max_failures: 連續寫入失敗幾次後捨棄緩衝並暫停接受新角色
+        max_rows: 資料庫保留的角色筆數上限，超過時刪除最舊者；0 表示不限
+        prune_every: 每幾次批次寫入檢查一次筆數上限
+    """
+
+    def __init__(self, path: str, dictionary_source: Optional[Callable[[], List[bytes]]] = None,
+                 flush_seconds: float = 0.25, max_batch: int = 256, cache_size: int = 1024,
+                 max_pending: int = 4096, max_failures: int = 5, max_rows: int = 0, prune_every: int = 64):
+        self.path = path
+        self.dictionary_source = dictionary_source
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.max_pending = max_pending
+        self.max_failures = max_failures
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._failures = 0
+        self._local = threading.local()
+        self._pending: Dict[str, bytes] = {}
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+        self._dictionaries: Dict[int, bytes] = {}
+        self._closed = False
+        self.saved = AtomicCounter()
+        self.written = AtomicCounter()
+        self.batches = AtomicCounter()
+        self.flush_errors = AtomicCounter()
+        self.dropped = AtomicCounter()
+        self.pruned = AtomicCounter()
+        self.cache_hits = AtomicCounter()
+        self.reads = AtomicCounter()
+        self.raw_bytes = AtomicCounter()
+        self.stored_bytes = AtomicCounter()
+
+    def _connection(self) -> sqlite3.Connection:
+        """本執行緒的連線；首次連線時才建立目錄與資料表"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @property
+    def healthy(self) -> bool:
+        """最近的寫入是否成功；連續失敗達 max_failures 次後為 False，直到資料庫恢復可寫入"""
+        return self._failures < self.max_failures
+
+    def save(self, payload: Dict) -> Optional[str]:
+        """
+        存入角色並回傳 ID；只寫入記憶體緩衝，不做 I/O
+        資料庫無法寫入或緩衝已滿時不保存，回傳 None
+        """
+        if not self.healthy:
+            self.dropped.increment()
+            self._ensure_flusher()
+            return None
+        encoded = canonical_json(payload)
+        character_id = content_id(encoded)
+        with self._lock:
+            if character_id not in self._pending and len(self._pending) >= self.max_pending:
+                self.dropped.increment()
+                self._wake.set()
+                return None
+            self._remember(character_id, payload)
+            self._pending[character_id] = encoded
+            pending = len(self._pending)
+        self.saved.increment()
+        self._ensure_flusher()
+        if pending >= self.max_batch:
+            self._wake.set()
+        return character_id
+
+    def get(self, character_id: str) -> Optional[Dict]:
+        """依 ID 取得角色；不存在時回傳 None"""
+        self.reads.increment()
+        with self._lock:
+            payload = self._cache.get(character_id)
+            if payload is not None:
+                self._cache.move_to_end(character_id)
+                self.cache_hits.increment()
+                return payload
+            encoded = self._pending.get(character_id)
+        if encoded is None:
+            row = self._connection().execute(
+                'SELECT dictionary, data FROM characters WHERE id = ?', (character_id,)).fetchone()
+            if row is None:
+                return None
+            encoded = self._decompress(row[0], row[1])
+        payload = json.loads(encoded)
+        with self._lock:
+            self._remember(character_id, payload)
+        return payload
+
+    def exists(self, character_id: str) -> bool:
+        """角色是否存在；不解壓內容，供條件請求回應 304 前確認"""
+        with self._lock:
+            if character_id in self._cache or character_id in self._pending:
+                return True
+        return self._connection().execute(
+            'SELECT 1 FROM characters WHERE id = ?', (character_id,)).fetchone() is not None
+
+    def _remember(self, character_id: str, payload: Dict) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[character_id] = payload
+        self._cache.move_to_end(character_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _ensure_flusher(self) -> None:
+        """背景寫入執行緒在首次存入時啟動；fork 後的子程序需重新啟動"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher = threading.Thread(target=self._run, name='character-store-flush', daemon=True)
+            self._flusher.start()
+            self._flusher_pid = os.getpid()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                if self.healthy:
+                    self.flush()
+                else:
+                    self._probe()
+                self._failures = 0
+            except (sqlite3.Error, OSError) as e:
+                self.flush_errors.increment()
+                self._failures += 1
+                logger.error("角色儲存寫入失敗（連續 %d 次）: %s", self._failures, e)
+                if self._failures == self.max_failures:
+                    self._drop_pending()
+                time.sleep(min(5.0, self.flush_seconds * 10))
+
+    def _probe(self) -> None:
+        """確認資料庫可寫入：取得寫入鎖後立即釋放"""
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        db.execute('ROLLBACK')
+
+    def _drop_pending(self) -> None:
+        """捨棄無法寫入的緩衝，避免記憶體無限增長；這些角色的連結將無法取回"""
+        with self._lock:
+            dropped = len(self._pending)
+            for character_id in self._pending:
+                self._cache.pop(character_id, None)
+            self._pending.clear()
+        self.dropped.increment(dropped)
+        logger.error("角色儲存無法寫入，捨棄 %d 筆待寫入的角色並暫停保存", dropped)
+
+    def flush(self) -> int:
+        """將緩衝以單一交易寫入資料庫，回傳寫入筆數；失敗時緩衝保留待下次重試"""
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return 0
+            version, compressor = self._compressor()
+            rows = []
+            for character_id, encoded in batch.items():
+                data = compressor(encoded)
+                rows.append((character_id, time.time(), version, data))
+                self.raw_bytes.increment(len(encoded))
+                self.stored_bytes.increment(len(data))
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany('INSERT OR IGNORE INTO characters (id, created, dictionary, data) VALUES (?, ?, ?, ?)',
+                               rows)
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            with self._lock:
+                for character_id in batch:
+                    if self._pending.get(character_id) is batch[character_id]:
+                        del self._pending[character_id]
+            self.written.increment(len(rows))
+            batches = self.batches.increment()
+            if self.max_rows > 0 and (batches - 1) % self.prune_every == 0:
+                self._prune(db)
+            return len(rows)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """筆數超過 max_rows 時刪除最舊的角色（由建立時間索引計數，不掃描資料）"""
+        excess = db.execute('SELECT COUNT(*) FROM characters').fetchone()[0] - self.max_rows
+        if excess <= 0:
+            return
+        deleted = db.execute(
+            'DELETE FROM characters WHERE created <= '
+            '(SELECT created FROM characters ORDER BY created LIMIT 1 OFFSET ?)', (excess - 1,)).rowcount
+        self.pruned.increment(deleted)
+        logger.info("角色儲存超過上限 %d 筆，刪除最舊的 %d 筆", self.max_rows, deleted)
+
+    def _compressor(self):
+        """目前使用的字典版本與壓縮函式；資料庫尚無字典時由樣本建立（多個 worker 同時建立時以先寫入者為準）"""
+        db = self._connection()
+        row = db.execute('SELECT version, data FROM dictionaries ORDER BY version DESC LIMIT 1').fetchone()
+        if row is None and self.dictionary_source is not None:
+            dictionary = build_dictionary(self.dictionary_source())
+            db.execute('INSERT OR IGNORE INTO dictionaries (version, data) VALUES (1, ?)', (dictionary,))
+            row = db.execute('SELECT version, data FROM dictionaries ORDER BY version DESC LIMIT 1').fetchone()
+        if row is None:
+            return 0, lambda encoded: zlib.compress(encoded, 9)
+        version, dictionary = row[0], bytes(row[1])
+        self._dictionaries[version] = dictionary
+
+        def compress(encoded: bytes) -> bytes:
+            compressor = zlib.compressobj(9, zdict=dictionary)
+            return compressor.compress(encoded) + compressor.flush()
+        return version, compress
+
+    def _decompress(self, version: int, data: bytes) -> bytes:
+        if version == 0:
+            return zlib.decompress(data)
+        dictionary = self._dictionaries.get(version)
+        if dictionary is None:
+            row = self._connection().execute('SELECT data FROM dictionaries WHERE version = ?', (version,)).fetchone()
+            dictionary = self._dictionaries[version] = bytes(row[0])
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def close(self) -> None:
+        """停止背景寫入並寫出剩餘的緩衝"""
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except (sqlite3.Error, OSError) as e:
+            logger.error("角色儲存關閉時寫入失敗: %s", e)
+
+    def status(self) -> Dict:
+        with self._lock:
+            pending, cached = len(self._pending), len(self._cache)
+        raw, stored = self.raw_bytes.value, self.stored_bytes.value
+        reads = self.reads.value
+        return {
+            'path': self.path,
+            'saved': self.saved.value,
+            'written': self.written.value,
+            'pending': pending,
+            'batches': self.batches.value,
+            'rows_per_batch': round(self.written.value / self.batches.value, 1) if self.batches.value else None,
+            'flush_errors': self.flush_errors.value,
+            'healthy': self.healthy,
+            'dropped': self.dropped.value,
+            'max_rows': self.max_rows,
+            'pruned': self.pruned.value,
+            'cached': cached,
+            'cache_hit_rate': round(self.cache_hits.value / reads, 3) if reads else None,
+            'compression_ratio': round(stored / raw, 3) if raw else None,
+        }
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+星盤圓盤 SVG
+以範本組字串產生星盤圖，不經過繪圖函式庫：
+- 與星盤無關的幾何（外圈、星座環、360 條刻度）在載入時產生一次，每張圖只以 rotate() 轉到上升點的位置
+- 每張圖只放置各自的符號與線段：12 個星座符號、宮首線、上升/天頂軸、行星（位置相近時錯開）與主要相位線
+- 產生的 SVG 依星盤內容雜湊快取（不含角色屬性，同一星盤的不同角色共用），可同時保存 gzip 壓縮版本直接送出
+
+星盤以上升點在左方（9 點鐘方向）、黃經逆時針增加的慣例繪製。
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from concurrency import AtomicCounter
+from zodiac import ASPECTS, HOUSE_KEYS, PLANET_GLYPHS, PLANET_KEYS, SIGN_CODES, SIGN_GLYPHS, SIGN_NAMES
+
+# 範本或幾何改變時遞增，使舊快取與瀏覽器快取失效
+RENDERER_VERSION = 1
+
+SIZE = 600
+CENTER = SIZE / 2
+R_OUTER = 290      # 星座環外緣
+R_SIGNS = 250      # 星座環內緣
+R_PLANETS = 220    # 行星符號
+R_HOUSES = 160     # 宮位數字環外緣
+R_INNER = 130      # 相位線所在的內圈
+MIN_SEPARATION = 7.0  # 行星符號之間的最小間隔（度）
+
+_SIGN_INDEX = {name: i for i, name in enumerate(SIGN_NAMES[code] for code in SIGN_CODES)}
+
+_STYLE = (
+    "text{font-family:'Segoe UI Symbol','Noto Sans Symbols','DejaVu Sans',sans-serif;"
+    "text-anchor:middle;dominant-baseline:central}"
+    ".ring{fill:none;stroke:#333;stroke-width:1}"
+    ".tick{stroke:#666;stroke-width:.6}"
+    ".cusp{stroke:#999;stroke-width:.8}"
+    ".axis{stroke:#222;stroke-width:1.6}"
+    ".sign{font-size:20px;fill:#444}"
+    ".house{font-size:11px;fill:#888}"
+    ".planet{font-size:18px;fill:#111}"
+    ".deg{font-size:9px;fill:#555}"
+    ".label{font-size:11px;font-weight:bold;fill:#222}"
+    ".pointer{stroke:#aaa;stroke-width:.6}"
+    ".conjunction{stroke:#c9a227}.sextile{stroke:#3a7bd5}.square{stroke:#d9534f}"
+    ".trine{stroke:#5cb85c}.opposition{stroke:#a94442}"
+    ".aspect{stroke-width:.9;opacity:.8}"
+)
+
+
+def _polar(longitude: float, radius: float, ascendant: float) -> Tuple[float, float]:
+    """黃經轉畫布座標：上升點在左方，黃經逆時針增加"""
+    angle = math.radians(180.0 + longitude - ascendant)
+    return CENTER + radius * math.cos(angle), CENTER - radius * math.sin(angle)
+
+
+def _static_ring() -> str:
+    """上升點為 0 度時的星座環：圓圈、星座分界與每度刻度；每張圖只旋轉這一組"""
+    ticks = []
+    for degree in range(360):
+        inner = R_SIGNS if degree % 30 == 0 else R_OUTER - (10 if degree % 5 == 0 else 5)
+        x1, y1 = _polar(degree, inner, 0.0)
+        x2, y2 = _polar(degree, R_OUTER, 0.0)
+        ticks.append(f"M{x1:.1f} {y1:.1f}L{x2:.1f} {y2:.1f}")
+    circles = ''.join(f'<circle class="ring" cx="{CENTER:g}" cy="{CENTER:g}" r="{radius}"/>'
+                      for radius in (R_OUTER, R_SIGNS))
+    return f'{circles}<path class="tick" d="{"".join(ticks)}"/>'
+
+
+_HEADER = (
+    f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {SIZE} {SIZE}" width="{SIZE}" height="{SIZE}">'
+    f'<style>{_STYLE}</style>'
+    f'<rect width="{SIZE}" height="{SIZE}" fill="#fff"/>'
+    f'<circle class="ring" cx="{CENTER:g}" cy="{CENTER:g}" r="{R_HOUSES}"/>'
+    f'<circle class="ring" cx="{CENTER:g}" cy="{CENTER:g}" r="{R_INNER}"/>'
+)
+_RING = _static_ring()
+_ROTATED_RING = '<g transform="rotate({rotation:.3f} %g %g)">%s</g>' % (CENTER, CENTER, _RING)
+_LINE = '<line class="{cls}" x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"/>'
+_TEXT = '<text class="{cls}" x="{x:.1f}" y="{y:.1f}">{text}</text>'
+_FOOTER = '</svg>'
+
+
+def _longitude(point: Dict) -> float:
+    """星盤中的點（sign_code 或中文星座名 + 星座內度數）轉黃經"""
+    code = point.get('sign_code')
+    index = SIGN_CODES.index(code) if code else _SIGN_INDEX[point['sign']]
+    return index * 30.0 + float(point['position'])
+
+
+def wheel_points(astro_data: Dict) -> Dict:
+    """由 astro_data（calculate_chart 回應的格式）取出繪圖所需的黃經"""
+    planets = astro_data['planets']
+    return {
+        'planets': [(key, _longitude(planets[key]), bool(planets[key].get('retrograde')))
+                    for key in PLANET_KEYS if key in planets],
+        'cusps': [_longitude(astro_data['houses'][key]) for key in HOUSE_KEYS if key in astro_data['houses']],
+        'ascendant': _longitude(astro_data['angles']['ascendant']),
+        'midheaven': _longitude(astro_data['angles']['midheaven']),
+    }
+
+
+def _spread(longitudes: List[float]) -> List[float]:
+    """符號的顯示位置：依黃經排序後把間隔不足 MIN_SEPARATION 的向後推開（回傳順序同輸入）"""
+    order = sorted(range(len(longitudes)), key=lambda i: longitudes[i])
+    shown = [longitudes[i] for i in order]
+    for _ in range(3):
+        for k in range(1, len(shown)):
+            shown[k] = max(shown[k], shown[k - 1] + MIN_SEPARATION)
+        # 繞回起點時與第一個符號的間隔
+        if len(shown) > 1 and shown[-1] - 360.0 > shown[0] - MIN_SEPARATION:
+            shown[0] = shown[-1] - 360.0 + MIN_SEPARATION
+    result = [0.0] * len(longitudes)
+    for k, i in enumerate(order):
+        result[i] = shown[k]
+    return result
+
+
+def aspect_pairs(longitudes: List[float]) -> List[Tuple[int, int, str]]:
+    """兩兩之間在容許度內的主要相位"""
+    pairs = []
+    for i in range(len(longitudes)):
+        for j in range(i + 1, len(longitudes)):
+            separation = abs(longitudes[i] - longitudes[j]) % 360.0
+            separation = min(separation, 360.0 - separation)
+            for name, (angle, orb) in ASPECTS.items():
+                if abs(separation - angle) <= orb:
+                    pairs.append((i, j, name))
+                    break
+    return pairs
+
+
+def render_wheel(astro_data: Dict) -> str:
+    """產生星盤圓盤 SVG"""
+    points = wheel_points(astro_data)
+    asc = points['ascendant']
+    parts = [_HEADER, _ROTATED_RING.format(rotation=asc)]
+
+    for i, code in enumerate(SIGN_CODES):
+        x, y = _polar(i * 30.0 + 15.0, (R_OUTER + R_SIGNS) / 2, asc)
+        parts.append(_TEXT.format(cls='sign', x=x, y=y, text=SIGN_GLYPHS[code]))
+
+    cusps = points['cusps']
+    for i, cusp in enumerate(cusps):
+        x1, y1 = _polar(cusp, R_INNER, asc)
+        x2, y2 = _polar(cusp, R_SIGNS, asc)
+        parts.append(_LINE.format(cls='cusp', x1=x1, y1=y1, x2=x2, y2=y2))
+        following = cusps[(i + 1) % len(cusps)]
+        middle = cusp + ((following - cusp) % 360.0) / 2
+        x, y = _polar(middle, (R_HOUSES + R_INNER) / 2, asc)
+        parts.append(_TEXT.format(cls='house', x=x, y=y, text=i + 1))
+
+    for longitude, label in ((asc, 'ASC'), (points['midheaven'], 'MC')):
+        x1, y1 = _polar(longitude, R_INNER, asc)
+        x2, y2 = _polar(longitude, R_OUTER + 4, asc)
+        parts.append(_LINE.format(cls='axis', x1=x1, y1=y1, x2=x2, y2=y2))
+        x, y = _polar(longitude, R_OUTER - 52, asc)
+        parts.append(_TEXT.format(cls='label', x=x, y=y, text=label))
+
+    planets = points['planets']
+    longitudes = [longitude for _, longitude, _ in planets]
+    for (key, longitude, retrograde), shown in zip(planets, _spread(longitudes)):
+        x1, y1 = _polar(longitude, R_SIGNS, asc)
+        x2, y2 = _polar(shown, R_PLANETS + 14, asc)
+        parts.append(_LINE.format(cls='pointer', x1=x1, y1=y1, x2=x2, y2=y2))
+        x, y = _polar(shown, R_PLANETS, asc)
+        parts.append(_TEXT.format(cls='planet', x=x, y=y, text=PLANET_GLYPHS[key]))
+        x, y = _polar(shown, R_PLANETS - 22, asc)
+        degree = f"{int(longitude % 30)}°" + ('℞' if retrograde else '')
+        parts.append(_TEXT.format(cls='deg', x=x, y=y, text=degree))
+
+    for i, j, name in aspect_pairs(longitudes):
+        x1, y1 = _polar(longitudes[i], R_INNER, asc)
+        x2, y2 = _polar(longitudes[j], R_INNER, asc)
+        parts.append(_LINE.format(cls=f'aspect {name}', x1=x1, y1=y1, x2=x2, y2=y2))
+
+    parts.append(_FOOTER)
+    return ''.join(parts)
+
+
+def chart_key(astro_data: Dict) -> str:
+    """星盤內容雜湊（含繪圖版本），作為快取鍵與 ETag"""
+    encoded = json.dumps(astro_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return f"w{RENDERER_VERSION}-" + hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:20]
+
+
+class WheelCache:
+    """
+    以星盤內容雜湊為鍵的 SVG 快取（LRU，依位元組數淘汰）
+
+    Args:
+        max_bytes: 快取總大小上限
+        gzip_level: 同時保存的 gzip 壓縮等級；0 表示不保存壓縮版本
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, gzip_level: int = 9):
+        self.max_bytes = max_bytes
+        self.gzip_level = gzip_level
+        self._entries: 'OrderedDict[str, Tuple[bytes, Optional[bytes]]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = AtomicCounter()
+        self.renders = AtomicCounter()
+        self.render_micros = AtomicCounter()
+
+    def get(self, astro_data: Dict) -> Tuple[str, bytes, Optional[bytes]]:
+        """
+        取得星盤圖；未快取時繪製
+
+        Returns:
+            (快取鍵, SVG, gzip 壓縮的 SVG 或 None)
+        """
+        key = chart_key(astro_data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self.hits.increment()
+            return key, entry[0], entry[1]
+
+        start = time.perf_counter()
+        svg = render_wheel(astro_data).encode('utf-8')
+        compressed = gzip.compress(svg, self.gzip_level, mtime=0) if self.gzip_level else None
+        self.render_micros.increment(int((time.perf_counter() - start) * 1e6))
+        self.renders.increment()
+        size = len(svg) + len(compressed or b'')
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (svg, compressed)
+                self._bytes += size
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (old_svg, old_gzip) = self._entries.popitem(last=False)
+                    self._bytes -= len(old_svg) + len(old_gzip or b'')
+        return key, svg, compressed
+
+    def status(self) -> Dict:
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        renders = self.renders.value
+        return {
+            'renderer_version': RENDERER_VERSION,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'gzip': bool(self.gzip_level),
+            'hits': self.hits.value,
+            'renders': renders,
+            'avg_render_ms': round(self.render_micros.value / renders / 1000, 3) if renders else None,
+        }
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+角色欄式匯出
+大量角色與星盤以 NumPy 結構化陣列逐區塊產生，輸出為 .npz 或 CSV，不建立每個角色的巢狀字典：
+- 星盤以 compute_chart_arrays 整批向量化計算，星座、宮位、職業、屬性與評級都是整數代碼
+- 職業判定與屬性加成預先展開為 (天體, 星座/宮位, 職業/屬性) 查表陣列；職業分數的加總順序與
+  DnDCharacterGenerator.determine_dnd_class 相同，浮點結果與平手時的選擇完全一致
+- 屬性的隨機變化改用 NumPy 產生器，每個區塊以 (seed, 區塊序號) 建立；區塊大小相同時結果與處理程序數無關
+- 字串對照表（星座、行星、職業、屬性、評級）與資料一起存入 .npz；CSV 的對照表另以 JSON 提供
+- .npz 以不壓縮的 zip 串流寫出，不需可 seek 的輸出（可直接作為 HTTP 回應），讀取時 np.load 直接得到結構化陣列
+
+讀取範例:
+    archive = np.load('characters.npz')
+    rows = archive['characters']
+    classes = archive['classes'][rows['class']]
+"""
+
+import io
+import json
+import zipfile
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from analytic_ephemeris import (PRECISION_LEVELS, compute_chart_arrays, julian_day, sign_index,
+                                utc_offset_hours)
+from zodiac import HOUSE_SYSTEMS, PLANET_KEYS, SIGN_CODES, SIGN_NAMES
+
+EXPORT_FORMATS = ('npz', 'csv')
+
+# 屬性順序同 DnDCharacterGenerator.calculate_character_stats
+STAT_KEYS = ('strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma')
+
+# 評級代碼依序為 S、A、B、C、D；門檻同 iter_character_parts
+RATINGS = ('S', 'A', 'B', 'C', 'D')
+_RATING_THRESHOLDS = np.array([60, 65, 70, 75])
+
+CHARACTER_DTYPE = np.dtype([
+    ('jd', '<f8'),                                   # 出生時刻（UT 儒略日）
+    ('utc_offset', '<f4'),                           # 當地時間相對 UTC 的時差（小時）
+    ('year', '<i2'), ('month', 'u1'), ('day', 'u1'),  # 當地出生日期與時間
+    ('hour', 'u1'), ('minute', 'u1'),
+    ('latitude', '<f4'), ('longitude', '<f4'),
+    ('longitudes', '<f4', (len(PLANET_KEYS),)),     # 天體黃經，順序同 planets 對照表
+    ('signs', 'u1', (len(PLANET_KEYS),)),          # 天體星座代碼（sign_codes 的索引）
+    ('houses', 'u1', (len(PLANET_KEYS),)),         # 天體宮位 1-12
+    ('retrograde', '?', (len(PLANET_KEYS),)),
+    ('ascendant', '<f4'), ('midheaven', '<f4'),
+    ('ascendant_sign', 'u1'), ('midheaven_sign', 'u1'),
+    ('class', 'u1'),                                 # classes 的索引
+    ('class_score', '<f4'),
+    ('stats', 'u1', (len(STAT_KEYS),)),              # 屬性值，順序同 stats 對照表
+    ('total_stats', 'u1'),
+    ('rating', 'u1'),                                # ratings 的索引
+])
+
+# 出生資料欄位（每個區塊的輸入）
+BIRTH_COLUMNS = ('year', 'month', 'day', 'hour', 'minute', 'utc_offset', 'latitude', 'longitude')
+
+
+@lru_cache(maxsize=65536)
+def _utc_offset(year: int, month: int, day: int, hour: int, minute: int, timezone: str) -> float:
+    return utc_offset_hours(year, month, day, hour, minute, timezone)
+
+
+def birth_columns(items: List[Dict]) -> Dict[str, np.ndarray]:
+    """已驗證的出生資料清單轉為欄位陣列；時差依時區與當地時間逐筆計算（相同時刻與時區共用快取）"""
+    columns = {name: np.array([item[name] for item in items], dtype=np.float64)
+               for name in ('year', 'month', 'day', 'hour', 'minute', 'latitude', 'longitude')}
+    columns['utc_offset'] = np.array([
+        _utc_offset(int(item['year']), int(item['month']), int(item['day']),
+                    int(item['hour']), int(item['minute']), item.get('timezone', 'Asia/Taipei'))
+        for item in items
+    ])
+    return columns
+
+
+def sample_births(count: int, rng: np.random.Generator, start_year: int = 1950,
+                  end_year: int = 2010) -> Dict[str, np.ndarray]:
+    """
+    合成的出生資料：start_year 到 end_year（含）之間均勻分布的時刻，緯度 ±60 度內依面積均勻、經度均勻
+    時間以 UTC 記錄（utc_offset 為 0），供分布統計使用
+    """
+    start = np.datetime64(f'{start_year:04d}-01-01T00:00', 'm')
+    span = int((np.datetime64(f'{end_year + 1:04d}-01-01T00:00', 'm') - start).astype(np.int64))
+    moments = start + rng.integers(0, span, count).astype('m8[m]')
+    days = moments.astype('M8[D]')
+    months = moments.astype('M8[M]')
+    minutes = (moments - days).astype(np.int64)
+    limit = np.sin(np.radians(60.0))
+    return {
+        'year': moments.astype('M8[Y]').astype(np.int64) + 1970.0,
+        'month': months.astype(np.int64) % 12 + 1.0,
+        'day': (days - months.astype('M8[D]')).astype(np.int64) + 1.0,
+        'hour': minutes // 60 * 1.0,
+        'minute': minutes % 60 * 1.0,
+        'utc_offset': np.zeros(count),
+        'latitude': np.degrees(np.arcsin(rng.uniform(-limit, limit, count))),
+        'longitude': rng.uniform(-180.0, 180.0, count),
+    }
+
+
+class ColumnarCharacters:
+    """
+    向量化角色產生器
+
+    Args:
+        generator: DnDCharacterGenerator，職業定義與加成表的來源
+        precision: 解析星曆的精度層級（PRECISION_LEVELS）
+        house_system: 宮位制
+    """
+
+    def __init__(self, generator, precision: str = 'fast', house_system: str = 'placidus'):
+        if precision not in PRECISION_LEVELS:
+            raise ValueError(f"未知的精度層級: {precision}")
+        if house_system not in HOUSE_SYSTEMS:
+            raise ValueError(f"未知的宮位制: {house_system}")
+        self.generator = generator
+        self.precision = precision
+        self.house_system = house_system
+        self.class_keys = list(generator.dnd_classes)
+        class_index = {key: i for i, key in enumerate(self.class_keys)}
+        stat_index = {key: i for i, key in enumerate(STAT_KEYS)}
+
+        # 屬性加成：(天體, 星座, 屬性)；權重同 calculate_character_stats
+        self._stat_bonus = np.zeros((len(PLANET_KEYS), len(SIGN_CODES), len(STAT_KEYS)), dtype=np.int64)
+        for planet, weight in (('sun', 1.0), ('moon', 0.7), ('mars', 0.5), ('mercury', 0.5), ('venus', 0.5)):
+            for s, sign in enumerate(SIGN_CODES):
+                for stat, modifier in generator.sign_stat_modifiers.get(sign, {}).items():
+                    self._stat_bonus[PLANET_KEYS.index(planet), s, stat_index[stat]] = int(modifier * weight)
+
+        # 職業分數：(天體, 星座, 職業) 與 (天體, 宮位, 職業)；宮位權重同 determine_dnd_class
+        self._sign_weights = np.zeros((len(PLANET_KEYS), len(SIGN_CODES), len(self.class_keys)))
+        for p, planet in enumerate(PLANET_KEYS):
+            for s, sign in enumerate(SIGN_CODES):
+                for key, weight in generator.planet_class_weights.get(planet, {}).get(sign, {}).items():
+                    self._sign_weights[p, s, class_index[key]] = weight
+        self._house_weights = np.zeros((len(PLANET_KEYS), 13, len(self.class_keys)))
+        for p, planet in enumerate(PLANET_KEYS):
+            weight = 1.0 if planet in ('sun', 'mars') else 0.5
+            for house, modifiers in generator.house_class_modifiers.items():
+                for key, modifier in modifiers.items():
+                    self._house_weights[p, house, class_index[key]] = modifier * weight
+
+    def dictionaries(self) -> Dict[str, List[str]]:
+        """整數代碼對應的字串"""
+        classes = self.generator.dnd_classes
+        return {
+            'sign_codes': list(SIGN_CODES),
+            'sign_names': [SIGN_NAMES[code] for code in SIGN_CODES],
+            'planets': list(PLANET_KEYS),
+            'classes': self.class_keys,
+            'class_names': [classes[key]['name'] for key in self.class_keys],
+            'stats': list(STAT_KEYS),
+            'ratings': list(RATINGS),
+        }
+
+    def build(self, births: Dict[str, np.ndarray], rng: np.random.Generator) -> np.ndarray:
+        """由出生資料欄位產生一個區塊的角色列"""
+        count = len(births['year'])
+        jd = julian_day(births['year'], births['month'], births['day'],
+                        births['hour'] + births['minute'] / 60.0 - births['utc_offset'])
+        jd = np.atleast_1d(jd)
+        arrays = compute_chart_arrays(jd, births['latitude'], births['longitude'],
+                                      self.precision, self.house_system)
+        signs = sign_index(arrays['longitudes'])
+        houses = arrays['houses']
+        planets = np.arange(len(PLANET_KEYS))
+
+        # 職業：依天體順序先加星座權重、再加宮位權重，與逐筆判定的浮點加總順序相同
+        scores = np.zeros((count, len(self.class_keys)))
+        for p in planets:
+            scores += self._sign_weights[p][signs[:, p]]
+        for p in planets:
+            scores += self._house_weights[p][houses[:, p]]
+        best = scores.argmax(axis=1)
+
+        stats = 10 + self._stat_bonus[planets, signs].sum(axis=1)
+        stats = np.clip(stats + rng.integers(-2, 3, stats.shape), 8, 18)
+        total = stats.sum(axis=1)
+
+        rows = np.empty(count, dtype=CHARACTER_DTYPE)
+        rows['jd'] = jd
+        for name in BIRTH_COLUMNS:
+            rows[name] = births[name]
+        rows['longitudes'] = arrays['longitudes']
+        rows['signs'] = signs
+        rows['houses'] = houses
+        rows['retrograde'] = arrays['retrograde']
+        rows['ascendant'] = arrays['ascendant']
+        rows['midheaven'] = arrays['midheaven']
+        rows['ascendant_sign'] = sign_index(arrays['ascendant'])
+        rows['midheaven_sign'] = sign_index(arrays['midheaven'])
+        rows['class'] = best
+        rows['class_score'] = scores[np.arange(count), best]
+        rows['stats'] = stats
+        rows['total_stats'] = total
+        rows['rating'] = len(RATINGS) - 1 - np.searchsorted(_RATING_THRESHOLDS, total, side='right')
+        return rows
+
+
+def chunk_rng(seed: int, index: int) -> np.random.Generator:
+    """第 index 個區塊的亂數產生器"""
+    return np.random.default_rng([seed, index])
+
+
+def _npy_header(dtype: np.dtype, rows: int) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {
+        'descr': np.lib.format.dtype_to_descr(dtype),
+        'fortran_order': False,
+        'shape': (rows,),
+    })
+    return buffer.getvalue()
+
+
+class _Sink:
+    """收集 zipfile 寫出的位元組；沒有 tell/seek，zipfile 會改用資料描述區塊串流寫出"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def iter_npz(chunks: Iterable[np.ndarray], rows: int, dictionaries: Dict[str, List[str]],
+             metadata: Optional[Dict] = None) -> Iterator[bytes]:
+    """
+    串流產生 .npz：characters 為 rows 列的結構化陣列，另含各字串對照表與 metadata（JSON 字串）
+    chunks 的總列數必須等於 rows
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, values in dictionaries.items():
+            with archive.open(f'{name}.npy', 'w') as member:
+                np.lib.format.write_array(member, np.array(values))
+        with archive.open('metadata.npy', 'w') as member:
+            np.lib.format.write_array(member, np.array(json.dumps(metadata or {}, ensure_ascii=False)))
+        yield sink.drain()
+
+        written = 0
+        with archive.open('characters.npy', 'w', force_zip64=True) as member:
+            member.write(_npy_header(CHARACTER_DTYPE, rows))
+            for chunk in chunks:
+                written += len(chunk)
+                if written > rows:
+                    raise ValueError(f"區塊總列數超過宣告的 {rows} 列")
+                member.write(chunk.tobytes())
+                yield sink.drain()
+        if written != rows:
+            raise ValueError(f"區塊總列數 {written} 與宣告的 {rows} 列不符")
+    yield sink.drain()
+
+
+def csv_columns() -> List[str]:
+    """CSV 欄位：多值欄位依天體或屬性展開"""
+    columns = ['jd', *BIRTH_COLUMNS]
+    for planet in PLANET_KEYS:
+        columns += [f'{planet}_longitude', f'{planet}_sign', f'{planet}_house', f'{planet}_retrograde']
+    columns += ['ascendant', 'midheaven', 'ascendant_sign', 'midheaven_sign', 'class', 'class_score',
+                *STAT_KEYS, 'total_stats', 'rating']
+    return columns
+
+
+# 各欄位的輸出格式；未列出者為整數
+_CSV_FORMATS = {
+    'jd': '%.6f', 'utc_offset': '%g', 'latitude': '%.4f', 'longitude': '%.4f', 'longitudes': '%.4f',
+    'ascendant': '%.4f', 'midheaven': '%.4f', 'class_score': '%.2f',
+}
+
+
+def iter_csv(chunks: Iterable[np.ndarray]) -> Iterator[str]:
+    """串流產生 CSV（首列為欄位名稱），整數代碼的對照表見 ColumnarCharacters.dictionaries"""
+    yield ','.join(csv_columns()) + '\n'
+    formats = []
+    planet_fields = ('longitudes', 'signs', 'houses', 'retrograde')
+    for name in ('jd', *BIRTH_COLUMNS):
+        formats.append(_CSV_FORMATS.get(name, '%d'))
+    formats += [_CSV_FORMATS.get(name, '%d') for name in planet_fields] * len(PLANET_KEYS)
+    for name in ('ascendant', 'midheaven', 'ascendant_sign', 'midheaven_sign', 'class', 'class_score'):
+        formats.append(_CSV_FORMATS.get(name, '%d'))
+    formats += ['%d'] * (len(STAT_KEYS) + 2)
+    line = ','.join(formats) + '\n'
+
+    for chunk in chunks:
+        planets = np.stack([chunk[name].astype(np.float64) for name in planet_fields], axis=-1)
+        table = np.column_stack([
+            *(chunk[name].astype(np.float64) for name in ('jd', *BIRTH_COLUMNS)),
+            planets.reshape(len(chunk), -1),
+            *(chunk[name].astype(np.float64) for name in ('ascendant', 'midheaven', 'ascendant_sign',
+                                                          'midheaven_sign', 'class', 'class_score')),
+            chunk['stats'].astype(np.float64),
+            chunk['total_stats'].astype(np.float64),
+            chunk['rating'].astype(np.float64),
+        ])
+        yield ''.join(line % tuple(row) for row in table.tolist())
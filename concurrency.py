@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+多執行緒共用狀態工具
+gthread worker 下同一程序內的多個請求執行緒會同時存取這些物件
+"""
+
+import os
+import random
+import threading
+
+
+class AtomicCounter:
+    """執行緒安全的計數器"""
+
+    def __init__(self, value: int = 0):
+        self._value = value
+        self._lock = threading.Lock()
+
+    def increment(self, amount: int = 1) -> int:
+        """增加計數並回傳新值"""
+        with self._lock:
+            self._value += amount
+            return self._value
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+class ThreadLocalRandom:
+    """
+    每個執行緒各自持有的亂數產生器
+    避免多執行緒共用 random 模組的全域狀態，各執行緒以獨立種子初始化
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self) -> random.Random:
+        """取得目前執行緒的亂數產生器"""
+        rng = getattr(self._local, 'rng', None)
+        if rng is None:
+            rng = random.Random(int.from_bytes(os.urandom(8), 'little'))
+            self._local.rng = rng
+        return rng
+
+
+# Swiss Ephemeris 的星曆路徑、觀測點與恆星時模式皆為 C 層級的程序全域狀態，
+# 無法以執行緒區分，所有呼叫 swisseph 的計算須持有此鎖
+EPHEMERIS_LOCK = threading.RLock()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+請求時限與熔斷器
+- 在時限內執行計算，逾時即放棄等待並交由呼叫端降級
+- 連續逾時後熔斷，一段時間內直接走備用路徑
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable
+
+
+class DeadlineExceeded(Exception):
+    """計算超過時限"""
+
+
+class DeadlineRunner:
+    """
+    時限執行器
+    以固定大小的執行緒池執行計算；逾時的計算無法中斷，會在背景執行完畢後釋放執行緒，
+    因此池大小同時也是「卡住的計算」的上限。
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='deadline')
+
+    def run(self, timeout: float, fn: Callable, *args, **kwargs):
+        """
+        在時限內執行 fn
+
+        Args:
+            timeout: 秒數，0 或負數表示不設時限（在呼叫端執行緒直接執行）
+
+        Raises:
+            DeadlineExceeded: 超過時限
+        """
+        if timeout <= 0:
+            return fn(*args, **kwargs)
+        future = self._executor.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceeded(f"計算超過時限 {timeout:.2f}秒")
+
+
+class CircuitBreaker:
+    """
+    熔斷器
+    closed: 正常；連續失敗達 failure_threshold 次後轉為 open
+    open: 直接拒絕，reset_timeout 秒後轉為 half_open
+    half_open: 放行一個試探請求，成功則 closed，失敗則重新 open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允許執行主要路徑"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # 試探請求若未回報結果（例如拋出其他例外），逾 reset_timeout 後再放行一個
+            now = time.monotonic()
+            if self._probe_in_flight and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        """主要路徑成功"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """主要路徑失敗（逾時或例外）"""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """熔斷器狀態摘要"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout': self.reset_timeout
+        }
@@ -5,9 +5,9 @@ D&D職業角色生成系統
 """
 
 import json
-import random
-from typing import Dict, List, Tuple
-from astro_consultant import ProfessionalAstrologer
+from typing import Dict, Iterator, List, Tuple
+from perf_timing import NULL_TIMER
+from concurrency import ThreadLocalRandom
 
 class DnDCharacterGenerator:
     """
@@ -18,6 +18,9 @@ class DnDCharacterGenerator:
     def __init__(self):
         """初始化D&D角色生成器"""
         
+        # 每個執行緒獨立的亂數產生器，多執行緒 worker 下不共用 random 全域狀態
+        self._random = ThreadLocalRandom()
+        
         # D&D職業定義
         self.dnd_classes = {
             'barbarian': {
@@ -172,12 +175,13 @@ class DnDCharacterGenerator:
             12: {'monk': 0.1, 'cleric': 0.1, 'druid': 0.05}        # 靈性和潛意識
         }
     
-    def calculate_character_stats(self, chart_data: Dict) -> Dict:
+    def calculate_character_stats(self, chart_data: Dict, rng=None) -> Dict:
         """
         根據星盤計算D&D角色屬性
         
         Args:
             chart_data: 星盤數據
+            rng: 屬性隨機變化使用的 random.Random（選填，預設為執行緒各自的產生器）
             
         Returns:
             包含六大屬性的字典
@@ -210,8 +214,9 @@ class DnDCharacterGenerator:
                         base_stats[stat] += int(modifier * weight)
         
         # 添加隨機變化 (-2 到 +2)
+        rng = rng or self._random.get()
         for stat in base_stats:
-            base_stats[stat] += random.randint(-2, 2)
+            base_stats[stat] += rng.randint(-2, 2)
             # 確保屬性在合理範圍內 (8-18)
             base_stats[stat] = max(8, min(18, base_stats[stat]))
         
@@ -371,26 +376,57 @@ class DnDCharacterGenerator:
             'motivation': f"懷著{moon_info['calling']}的信念，"
         }
     
-    def generate_complete_character(self, chart_data: Dict) -> Dict:
+    def generate_complete_character(self, chart_data: Dict, timer=NULL_TIMER, rng=None) -> Dict:
         """
         生成完整的D&D角色
         
         Args:
             chart_data: 星盤數據
+            timer: 階段計時器（選填）
+            rng: 屬性隨機變化使用的 random.Random（選填）；以固定種子重建可讓同一星盤得到相同屬性
             
         Returns:
             完整的角色數據
         """
+        return self.merge_character_parts(dict(self.iter_character_parts(chart_data, timer, rng)))
+
+    @staticmethod
+    def merge_character_parts(parts: Dict[str, Dict]) -> Dict:
+        """將 iter_character_parts 的各部分合併為完整角色（鍵順序與 generate_complete_character 相同）"""
+        summary, profile, story = parts['chart'], parts['profile'], parts['story']
+        return {
+            'name': summary['name'],
+            **profile,
+            **story,
+            'birth_chart': summary['birth_chart']
+        }
+
+    def iter_character_parts(self, chart_data: Dict, timer=NULL_TIMER,
+                             rng=None) -> Iterator[Tuple[str, Dict]]:
+        """
+        依序產生角色的各部分，供串流回應在每一部分完成時立即送出：
+        - chart: 姓名與星盤摘要（不需額外計算）
+        - profile: 屬性、職業與評級
+        - story: 背景故事與職業特質
+        """
+        yield 'chart', {
+            'name': chart_data['birth_info']['name'],
+            'birth_chart': {
+                'sun': f"{chart_data['planets']['sun']['sign']} 第{chart_data['planets']['sun']['house']}宮",
+                'moon': f"{chart_data['planets']['moon']['sign']} 第{chart_data['planets']['moon']['house']}宮",
+                'ascendant': chart_data['angles']['ascendant']['sign']
+            }
+        }
+
         # 計算屬性
-        stats = self.calculate_character_stats(chart_data)
+        with timer.stage('stats'):
+            stats = self.calculate_character_stats(chart_data, rng)
         
         # 確定職業
-        dnd_class, class_score = self.determine_dnd_class(chart_data)
+        with timer.stage('class'):
+            dnd_class, class_score = self.determine_dnd_class(chart_data)
         class_info = self.dnd_classes[dnd_class]
         
-        # 生成背景故事
-        background = self.generate_character_background(chart_data, dnd_class, stats)
-        
         # 計算總屬性分數和評級
         total_stats = sum(stats.values())
         if total_stats >= 75:
@@ -403,9 +439,8 @@ class DnDCharacterGenerator:
             rating = 'C'
         else:
             rating = 'D'
-        
-        return {
-            'name': chart_data['birth_info']['name'],
+
+        yield 'profile', {
             'class': {
                 'key': dnd_class,
                 'name': class_info['name'],
@@ -414,20 +449,24 @@ class DnDCharacterGenerator:
             },
             'stats': stats,
             'total_stats': total_stats,
-            'rating': rating,
+            'rating': rating
+        }
+        
+        # 生成背景故事
+        with timer.stage('background'):
+            background = self.generate_character_background(chart_data, dnd_class, stats)
+
+        yield 'story', {
             'background': background,
             'personality_traits': class_info['personality_traits'],
-            'primary_stats': class_info['primary_stats'],
-            'birth_chart': {
-                'sun': f"{chart_data['planets']['sun']['sign']} 第{chart_data['planets']['sun']['house']}宮",
-                'moon': f"{chart_data['planets']['moon']['sign']} 第{chart_data['planets']['moon']['house']}宮",
-                'ascendant': chart_data['angles']['ascendant']['sign']
-            }
+            'primary_stats': class_info['primary_stats']
         }
 
 # 測試函數
 def test_dnd_generator():
     """測試D&D角色生成器"""
+    from astro_consultant import ProfessionalAstrologer
+
     astrologer = ProfessionalAstrologer()
     generator = DnDCharacterGenerator()
     
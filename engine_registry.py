@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+占星引擎註冊表
+依精度層級登記引擎，首次使用時才載入（kerykeion 匯入與星曆初始化延後到實際需要時）：
+- exact: Kerykeion / Swiss Ephemeris
+- fast: 解析星曆（Meeus/JPL 完整項）
+- approx: 解析星曆截斷版，月亮項與迭代次數較少，供預覽使用
+
+無法載入的層級依 fallback 鏈降級。各層級相對 Swiss Ephemeris 的誤差上限
+由 benchmarks/accuracy_engines.py 量測後記錄於 max_error_deg。
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRECISION_TIERS = ('exact', 'fast', 'approx')
+
+
+class EngineUnavailable(Exception):
+    """指定層級（含其 fallback 鏈）沒有可用的引擎"""
+
+
+@dataclass(frozen=True)
+class EngineSpec:
+    """引擎登記資訊"""
+    precision: str
+    label: str
+    loader: Callable[[], Any]
+    fallback: Optional[str] = None
+    max_error_deg: Optional[float] = None  # 行星黃經最大誤差（度）；None 表示即為參考引擎
+
+
+class EngineRegistry:
+    """
+    依精度層級延遲載入的引擎註冊表
+    載入結果（含失敗）只記錄一次，多執行緒同時首次取用時只會載入一次
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, EngineSpec] = {}
+        self._engines: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, precision: str, label: str, loader: Callable[[], Any],
+                 fallback: Optional[str] = None, max_error_deg: Optional[float] = None) -> None:
+        """登記引擎；loader 在首次取用時呼叫，回傳具 calculate_natal_chart 的物件"""
+        self._specs[precision] = EngineSpec(precision, label, loader, fallback, max_error_deg)
+
+    @property
+    def tiers(self) -> Tuple[str, ...]:
+        return tuple(self._specs)
+
+    def spec(self, precision: str) -> EngineSpec:
+        try:
+            return self._specs[precision]
+        except KeyError:
+            raise EngineUnavailable(f"未知的精度層級: {precision}") from None
+
+    def label(self, precision: str) -> str:
+        return self.spec(precision).label
+
+    def get(self, precision: str) -> Any:
+        """取得指定層級的引擎，不降級；載入失敗時拋出 EngineUnavailable"""
+        spec = self.spec(precision)
+        engine = self._engines.get(precision)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            if precision in self._engines:
+                return self._engines[precision]
+            if precision in self._errors:
+                raise EngineUnavailable(self._errors[precision])
+            try:
+                engine = spec.loader()
+            except Exception as e:
+                self._errors[precision] = f"{spec.label} 載入失敗: {e}"
+                logger.warning("⚠️ 無法載入 %s 引擎: %s", precision, e)
+                raise EngineUnavailable(self._errors[precision]) from e
+            self._engines[precision] = engine
+            logger.info("✅ %s 引擎載入成功: %s", precision, spec.label)
+            return engine
+
+    def resolve(self, precision: str) -> Tuple[str, Any]:
+        """
+        取得引擎，無法載入時沿 fallback 鏈降級
+
+        Returns:
+            (實際使用的層級, 引擎)
+        """
+        current: Optional[str] = precision
+        visited = set()
+        while current is not None and current not in visited:
+            visited.add(current)
+            try:
+                return current, self.get(current)
+            except EngineUnavailable:
+                current = self.spec(current).fallback
+        raise EngineUnavailable(f"精度層級 {precision} 沒有可用的引擎")
+
+    def expected(self, precision: str) -> str:
+        """
+        resolve 預計使用的層級，只依已知的載入結果判斷，不觸發載入（健康檢查等低成本路徑使用）
+        尚未嘗試載入的層級視為可用
+        """
+        current: Optional[str] = precision
+        visited = set()
+        while current is not None and current not in visited:
+            visited.add(current)
+            if current not in self._errors:
+                return current
+            current = self.spec(current).fallback
+        return precision
+
+    def available(self, precision: str) -> bool:
+        """指定層級是否可用（必要時觸發載入）"""
+        try:
+            self.get(precision)
+            return True
+        except EngineUnavailable:
+            return False
+
+    def status(self) -> Dict[str, Dict]:
+        """各層級狀態；尚未嘗試載入的層級 available 為 None"""
+        result = {}
+        for precision, spec in self._specs.items():
+            if precision in self._engines:
+                available = True
+            elif precision in self._errors:
+                available = False
+            else:
+                available = None
+            result[precision] = {
+                'label': spec.label,
+                'loaded': precision in self._engines,
+                'available': available,
+                'fallback': spec.fallback,
+                'max_error_deg': spec.max_error_deg,
+            }
+        return result
+
+
+def _load_swiss_ephemeris():
+    from astro_consultant import ProfessionalAstrologer
+    return ProfessionalAstrologer()
+
+
+def _analytic_loader(precision: str) -> Callable[[], Any]:
+    def load():
+        from analytic_ephemeris import AnalyticEphemeris
+        return AnalyticEphemeris(precision)
+    return load
+
+
+def create_default_registry() -> EngineRegistry:
+    """建立內建三個層級的註冊表"""
+    registry = EngineRegistry()
+    registry.register('exact', "Kerykeion Swiss Ephemeris v4.26.3", _load_swiss_ephemeris,
+                      fallback='fast')
+    registry.register('fast', "解析星曆引擎 v2.0 (Meeus/JPL)", _analytic_loader('fast'),
+                      max_error_deg=0.25)
+    registry.register('approx', "解析星曆引擎 v2.0 (Meeus/JPL 截斷)", _analytic_loader('approx'),
+                      fallback='fast', max_error_deg=0.25)
+    return registry
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+角色欄式匯出（寫入檔案）
+與 POST /api/export 產生相同格式的 .npz 或 CSV，不受 EXPORT_MAX_ROWS 限制，並以多個處理程序平行計算區塊；
+區塊依序寫出，seed 與區塊大小相同時結果與處理程序數無關。CSV 另寫出 <輸出檔>.dictionaries.json 對照表。
+
+用法:
+    python export_characters.py --sample 10000000 --out characters.npz --processes 8
+    python export_characters.py --input births.jsonl --out characters.csv
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('JOB_WORKER_PROCESSES', '0')
+
+import main
+from columnar_export import (EXPORT_FORMATS, ColumnarCharacters, birth_columns, chunk_rng, csv_columns,
+                             iter_csv, iter_npz, sample_births)
+
+logger = logging.getLogger(__name__)
+
+_builder = None
+
+
+def _init_worker(precision, house_system):
+    global _builder
+    _builder = ColumnarCharacters(main.dnd_generator, precision, house_system)
+
+
+def _build_chunk(task):
+    index, seed, births, size, start_year, end_year = task
+    rng = chunk_rng(seed, index)
+    columns = birth_columns(births) if births is not None else sample_births(size, rng, start_year, end_year)
+    return _builder.build(columns, rng)
+
+
+def read_births(path):
+    """讀取 JSONL 出生資料並整批驗證；任一筆無效即結束"""
+    lines, items = [], []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            lines.append(line_number)
+            items.append(json.loads(line))
+    births = []
+    for line_number, (values, error) in zip(lines, main.validate_birth_items(items)):
+        if error:
+            sys.exit(f"{path}:{line_number}: {error}")
+        births.append(values)
+    return births
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='角色欄式匯出')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sample', type=int, help='合成出生資料的列數')
+    source.add_argument('--input', help='出生資料 JSONL 檔（每行格式同 /api/calculate_chart）')
+    parser.add_argument('--out', required=True, help='輸出檔（.npz 或 .csv）')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, help='輸出格式（預設依副檔名）')
+    parser.add_argument('--start-year', type=int, default=1950, help='合成資料的起始年份')
+    parser.add_argument('--end-year', type=int, default=2010, help='合成資料的結束年份（含）')
+    parser.add_argument('--precision', default=main.BACKUP_PRECISION, help='解析星曆精度層級')
+    parser.add_argument('--house-system', default='placidus', help='宮位制')
+    parser.add_argument('--seed', type=int, default=None, help='亂數種子（預設隨機）')
+    parser.add_argument('--chunk', type=int, default=main.app.config['EXPORT_CHUNK_ROWS'], help='每個區塊的列數')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='平行計算的處理程序數')
+    args = parser.parse_args()
+
+    export_format = args.format or os.path.splitext(args.out)[1].lstrip('.').lower()
+    if export_format not in EXPORT_FORMATS:
+        parser.error(f"無法由副檔名判斷格式，請指定 --format {'/'.join(EXPORT_FORMATS)}")
+    seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(4), 'little')
+    builder = ColumnarCharacters(main.dnd_generator, args.precision, args.house_system)
+
+    births = read_births(args.input) if args.input else None
+    rows = len(births) if births is not None else args.sample
+    tasks = []
+    for index, start in enumerate(range(0, rows, args.chunk)):
+        size = min(args.chunk, rows - start)
+        tasks.append((index, seed, births[start:start + size] if births is not None else None,
+                      size, args.start_year, args.end_year))
+
+    start_time = time.time()
+    with multiprocessing.Pool(max(1, args.processes), _init_worker, (args.precision, args.house_system)) as pool:
+        chunks = pool.imap(_build_chunk, tasks)
+        if export_format == 'npz':
+            metadata = {
+                'rows': rows,
+                'seed': seed,
+                'chunk_rows': args.chunk,
+                'precision': args.precision,
+                'house_system': args.house_system,
+                'source': 'items' if births is not None else 'sample',
+                'generated': datetime.now().isoformat(),
+            }
+            with open(args.out, 'wb') as f:
+                for part in iter_npz(chunks, rows, builder.dictionaries(), metadata):
+                    f.write(part)
+        else:
+            with open(args.out, 'w', encoding='utf-8', newline='') as f:
+                for part in iter_csv(chunks):
+                    f.write(part)
+            with open(args.out + '.dictionaries.json', 'w', encoding='utf-8') as f:
+                json.dump({'dictionaries': builder.dictionaries(), 'csv_columns': csv_columns()},
+                          f, ensure_ascii=False, indent=2)
+
+    elapsed = time.time() - start_time
+    print(f"✅ {rows} 列 → {args.out}（{elapsed:.1f} 秒，{rows / max(elapsed, 1e-9):,.0f} 列/秒，seed={seed}）")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+離線城市地名索引
+請求只帶 city 時，不經網路即可解析出經緯度與時區（kerykeion 的 geonames 線上查詢在此不可用）：
+- 資料來源 data/cities.csv（中英文名稱與別名）並併入 tzdb 各時區的代表城市
+- 建置為緊湊的二進位檔 data/gazetteer.bin，以 mmap 唯讀載入，多個 worker 共用同一份分頁快取
+- 名稱索引為依正規化鍵排序的陣列：二分搜尋即可完成精確查詢與前綴查詢（等同攤平的字典樹）
+- 查無前綴時以相似度比對提供模糊建議
+- 經緯度網格索引：由座標推斷 IANA 時區（最近的參考城市；遠離所有城市的海上座標改用 Etc/GMT 航海時區）
+
+時區推斷沒有時區邊界多邊形資料，以參考城市的最近鄰近似：國界附近可能判斷錯誤，
+回傳的 distance_km 可作為信心指標，請求明確指定的時區一律優先。
+
+檔案格式（小端序）:
+    header   magic, 版本, 網格邊長(度), 城市數, 時區數, 鍵數, 各區段位移
+    cities   每筆 lat f32, lon f32, 時區索引 u16, 人口(千人) u32, 國家 2s, 中文名與英文名 (位移 u32, 長度 u16)
+    zones    每筆 (位移 u32, 長度 u16)
+    keys     每筆 (位移 u32, 長度 u16, 城市 ID u32)，依鍵的 UTF-8 位元組排序
+    grid     每個網格在 grid_ids 中的起始位置 u32（列優先，共 格數 + 1 筆）
+    grid_ids 依網格排序的城市 ID u32
+    strings  UTF-8 字串池
+
+用法:
+    python gazetteer.py build            # 由 data/cities.csv 重新產生 data/gazetteer.bin
+    python gazetteer.py 台北             # 查詢
+"""
+
+import csv
+import difflib
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import unicodedata
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DEFAULT_SOURCE = os.path.join(_DATA_DIR, 'cities.csv')
+DEFAULT_PATH = os.path.join(_DATA_DIR, 'gazetteer.bin')
+
+MAGIC = b'GZT1'
+VERSION = 2
+_HEADER = struct.Struct('<4sHHIIIIIIIII')
+_CITY = struct.Struct('<ffHI2sIHIH')
+_ZONE = struct.Struct('<IH')
+_KEY = struct.Struct('<IHI')
+_U32 = struct.Struct('<I')
+_CITY_DTYPE = np.dtype([('lat', '<f4'), ('lon', '<f4'), ('zone', '<u2'), ('population', '<u4'), ('country', 'S2'),
+                        ('zh', '<u4'), ('zh_len', '<u2'), ('en', '<u4'), ('en_len', '<u2')])
+
+GRID_CELL_DEG = 5
+EARTH_RADIUS_KM = 6371.0
+# 最近參考城市超過此距離視為海上或無人區，改用依經度劃分的航海時區
+MAX_REFERENCE_DISTANCE_KM = 1500.0
+
+# 城市名常見的簡體字 → 繁體，使簡繁輸入對應到同一個鍵
+_SIMPLIFIED_TO_TRADITIONAL = (
+    '东東门門湾灣广廣尔爾兰蘭罗羅马馬亚亞伦倫约約华華圣聖宁寧阳陽汉漢庆慶沈瀋连連岛島苏蘇无無锡錫'
+    '厦廈长長贵貴云雲济濟郑鄭开開乌烏鲁魯齐齊滨濱龙龍义義维維纳納达達内內纽紐旧舊顿頓费費温溫奥奧'
+    '灵靈莱萊宾賓丽麗头頭银銀庄莊萨薩桥橋乡鄉县縣区區镇鎮韩韓贡貢岘峴边邊万萬买買兹茲麦麥辅輔矶磯'
+    '图圖迈邁娄婁毕畢'
+)
+_TRADITIONAL_MAP = str.maketrans(dict(zip(_SIMPLIFIED_TO_TRADITIONAL[0::2], _SIMPLIFIED_TO_TRADITIONAL[1::2])))
+_CJK_SUFFIXES = '市縣區鎮鄉'
+
+
+class City(NamedTuple):
+    """城市記錄；name 為中文名（無中文名時為英文名）"""
+    id: int
+    name: str
+    name_en: str
+    country: str
+    latitude: float
+    longitude: float
+    timezone: str
+    population: int  # 千人
+
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'name_en': self.name_en,
+            'country': self.country,
+            'latitude': round(self.latitude, 4),
+            'longitude': round(self.longitude, 4),
+            'timezone': self.timezone,
+        }
+
+
+class TimezoneGuess(NamedTuple):
+    """座標推斷的時區；source 為 nearest_city 或 nautical"""
+    timezone: str
+    source: str
+    distance_km: Optional[float] = None
+    reference: Optional[City] = None
+    ambiguous: bool = False
+
+    def as_dict(self) -> Dict:
+        info = {'timezone': self.timezone, 'source': self.source}
+        if self.reference is not None:
+            info['distance_km'] = round(self.distance_km, 1)
+            info['reference_city'] = self.reference.name
+            info['ambiguous'] = self.ambiguous
+        return info
+
+
+def nautical_timezone(longitude: float) -> str:
+    """依經度劃分的航海時區；Etc/GMT 的正負號與 UTC 偏移相反（Etc/GMT-8 為 UTC+8）"""
+    offset = int(math.floor((longitude + 7.5) / 15.0))
+    offset = max(-12, min(12, offset))
+    return 'Etc/GMT' if offset == 0 else f"Etc/GMT{-offset:+d}"
+
+
+def _grid_shape(cell_deg: int) -> Tuple[int, int]:
+    return 180 // cell_deg, 360 // cell_deg
+
+
+def _grid_cell(lat: float, lon: float, cell_deg: int) -> Tuple[int, int]:
+    rows, cols = _grid_shape(cell_deg)
+    row = min(rows - 1, max(0, int((lat + 90.0) // cell_deg)))
+    col = int(((lon + 180.0) % 360.0) // cell_deg) % cols
+    return row, col
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def normalize_name(text: str) -> str:
+    """
+    名稱正規化：去除變音符號、大小寫與標點，簡體轉繁體，去掉中文的行政區劃尾綴
+    例如 "São Paulo" → "saopaulo"、"台北市" → "台北"、"厦门" → "廈門"
+    """
+    decomposed = unicodedata.normalize('NFKD', text.strip())
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    key = ''.join(c for c in unicodedata.normalize('NFKC', stripped).casefold() if c.isalnum())
+    key = key.translate(_TRADITIONAL_MAP)
+    if len(key) > 2 and key[-1] in _CJK_SUFFIXES:
+        key = key[:-1]
+    return key
+
+
+# ==================== 建置 ====================
+
+def _parse_tab_coordinate(text: str) -> Tuple[float, float]:
+    """zone.tab 的 ISO 6709 座標，如 +2503+12130 或 +404251-0740023"""
+    split = max(text.rfind('+'), text.rfind('-'))
+    values = []
+    for part in (text[:split], text[split:]):
+        sign = -1 if part[0] == '-' else 1
+        digits = part[1:]
+        degree_digits = 2 if len(digits) in (4, 6) else 3
+        degrees = int(digits[:degree_digits])
+        minutes = int(digits[degree_digits:degree_digits + 2])
+        seconds = int(digits[degree_digits + 2:] or 0)
+        values.append(sign * (degrees + minutes / 60 + seconds / 3600))
+    return values[0], values[1]
+
+
+def _zone_reference_cities() -> List[Dict]:
+    """tzdb 各時區的代表城市（英文名），補足 cities.csv 未收錄的地區"""
+    import pytz
+    rows = []
+    with pytz.open_resource('zone.tab') as f:
+        for raw in f:
+            line = raw.decode('utf-8').strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            country, coordinate, zone = parts[0], parts[1], parts[2]
+            if zone not in pytz.all_timezones_set:
+                continue
+            lat, lon = _parse_tab_coordinate(coordinate)
+            rows.append({
+                'name_zh': '', 'name_en': zone.rsplit('/', 1)[-1].replace('_', ' '),
+                'aliases': '', 'country': country, 'latitude': lat, 'longitude': lon,
+                'timezone': zone, 'population': 0,
+            })
+    return rows
+
+
+def _read_source(path: str) -> List[Dict]:
+    import pytz
+    with open(path, encoding='utf-8') as f:
+        lines = [line for line in f if not line.startswith('#')]
+    rows = []
+    for row in csv.DictReader(lines):
+        if row['timezone'] not in pytz.all_timezones_set:
+            raise ValueError(f"{row['name_en']}: 未知的時區 {row['timezone']}")
+        rows.append({
+            'name_zh': row['name_zh'].strip(), 'name_en': row['name_en'].strip(),
+            'aliases': row['aliases'], 'country': row['country'].strip().upper(),
+            'latitude': float(row['latitude']), 'longitude': float(row['longitude']),
+            'timezone': row['timezone'], 'population': int(row['population'] or 0),
+        })
+    return rows
+
+
+def build_gazetteer(source: str = DEFAULT_SOURCE, output: str = DEFAULT_PATH,
+                    include_zone_cities: bool = True) -> Dict:
+    """
+    由 CSV 建置二進位索引
+
+    Returns:
+        城市數、鍵數與檔案大小
+    """
+    rows = _read_source(source)
+    if include_zone_cities:
+        # 與 CSV 同國同名者以 CSV 為準
+        known = {(r['country'], normalize_name(r['name_en'])) for r in rows}
+        rows += [r for r in _zone_reference_cities()
+                 if (r['country'], normalize_name(r['name_en'])) not in known]
+
+    pool = bytearray()
+    pooled: Dict[str, Tuple[int, int]] = {}
+
+    def intern(text: str) -> Tuple[int, int]:
+        if text not in pooled:
+            data = text.encode('utf-8')
+            pooled[text] = (len(pool), len(data))
+            pool.extend(data)
+        return pooled[text]
+
+    zones = sorted({r['timezone'] for r in rows})
+    zone_index = {z: i for i, z in enumerate(zones)}
+
+    city_blob = bytearray()
+    keys: Dict[str, set] = {}
+    for city_id, r in enumerate(rows):
+        zh_off, zh_len = intern(r['name_zh'])
+        en_off, en_len = intern(r['name_en'])
+        city_blob += _CITY.pack(r['latitude'], r['longitude'], zone_index[r['timezone']],
+                                r['population'], r['country'].encode('ascii')[:2].ljust(2),
+                                zh_off, zh_len, en_off, en_len)
+        names = [r['name_zh'], r['name_en']] + [a for a in r['aliases'].split('|') if a.strip()]
+        for name in names:
+            key = normalize_name(name) if name else ''
+            if key:
+                keys.setdefault(key, set()).add(city_id)
+
+    zone_blob = bytearray()
+    for zone in zones:
+        zone_blob += _ZONE.pack(*intern(zone))
+
+    rows_n, cols_n = _grid_shape(GRID_CELL_DEG)
+    cells: List[List[int]] = [[] for _ in range(rows_n * cols_n)]
+    for city_id, r in enumerate(rows):
+        row, col = _grid_cell(r['latitude'], r['longitude'], GRID_CELL_DEG)
+        cells[row * cols_n + col].append(city_id)
+    grid_blob = bytearray()
+    grid_ids_blob = bytearray()
+    position = 0
+    for members in cells:
+        grid_blob += _U32.pack(position)
+        for city_id in members:
+            grid_ids_blob += _U32.pack(city_id)
+        position += len(members)
+    grid_blob += _U32.pack(position)
+
+    key_blob = bytearray()
+    entries = 0
+    for key in sorted(keys, key=lambda k: k.encode('utf-8')):
+        off, length = intern(key)
+        for city_id in sorted(keys[key]):
+            key_blob += _KEY.pack(off, length, city_id)
+            entries += 1
+
+    cities_off = _HEADER.size
+    zones_off = cities_off + len(city_blob)
+    keys_off = zones_off + len(zone_blob)
+    grid_off = keys_off + len(key_blob)
+    grid_ids_off = grid_off + len(grid_blob)
+    pool_off = grid_ids_off + len(grid_ids_blob)
+    header = _HEADER.pack(MAGIC, VERSION, GRID_CELL_DEG, len(rows), len(zones), entries,
+                          cities_off, zones_off, keys_off, grid_off, grid_ids_off, pool_off)
+
+    tmp = f"{output}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header + city_blob + zone_blob + key_blob + grid_blob + grid_ids_blob + pool)
+    os.replace(tmp, output)
+    return {'cities': len(rows), 'timezones': len(zones), 'keys': entries, 'bytes': os.path.getsize(output)}
+
+
+# ==================== 查詢 ====================
+
+class Gazetteer:
+    """
+    以 mmap 載入的地名索引（首次查詢時才開檔）
+    查詢直接由唯讀對映解碼所需的記錄，不建立常駐的物件表，執行緒安全
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mm: Optional[mmap.mmap] = None
+        self._zones: Tuple[str, ...] = ()
+        self._key_list: Optional[List[Tuple[str, int]]] = None
+        self._coordinates: Optional[np.ndarray] = None
+        self._grid: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def _load(self) -> mmap.mmap:
+        mm = self._mm
+        if mm is not None:
+            return mm
+        with self._lock:
+            if self._mm is None:
+                with open(self.path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                (magic, version, self._cell_deg, self._cities, n_zones, self._keys, self._cities_off,
+                 zones_off, self._keys_off, self._grid_off, self._grid_ids_off,
+                 self._pool_off) = _HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION:
+                    mm.close()
+                    raise ValueError(f"{self.path} 不是有效的地名索引檔")
+                self._zones = tuple(self._string(mm, *_ZONE.unpack_from(mm, zones_off + i * _ZONE.size))
+                                    for i in range(n_zones))
+                self._mm = mm
+        return self._mm
+
+    def _string(self, mm: mmap.mmap, offset: int, length: int) -> str:
+        start = self._pool_off + offset
+        return mm[start:start + length].decode('utf-8')
+
+    def _key_bytes(self, mm: mmap.mmap, index: int) -> Tuple[bytes, int]:
+        offset, length, city_id = _KEY.unpack_from(mm, self._keys_off + index * _KEY.size)
+        start = self._pool_off + offset
+        return mm[start:start + length], city_id
+
+    def city(self, city_id: int) -> City:
+        mm = self._load()
+        lat, lon, zone, population, country, zh_off, zh_len, en_off, en_len = _CITY.unpack_from(
+            mm, self._cities_off + city_id * _CITY.size)
+        name_en = self._string(mm, en_off, en_len)
+        name = self._string(mm, zh_off, zh_len) or name_en
+        return City(city_id, name, name_en, country.decode('ascii').strip(),
+                    lat, lon, self._zones[zone], population)
+
+    def _lower_bound(self, key: bytes) -> int:
+        mm = self._load()
+        lo, hi = 0, self._keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mm, mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _prefix_ids(self, prefix: bytes, limit: int) -> Iterator[Tuple[bytes, int]]:
+        mm = self._load()
+        index = self._lower_bound(prefix)
+        while index < self._keys and limit > 0:
+            key, city_id = self._key_bytes(mm, index)
+            if not key.startswith(prefix):
+                break
+            yield key, city_id
+            index += 1
+            limit -= 1
+
+    def resolve(self, name: str) -> Optional[City]:
+        """精確名稱（含別名）查詢；同名城市取人口最多者"""
+        key = normalize_name(name).encode('utf-8')
+        if not key:
+            return None
+        matches = [self.city(city_id) for k, city_id in self._prefix_ids(key, 64) if k == key]
+        return max(matches, key=lambda c: c.population) if matches else None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[City]:
+        """前綴查詢；完全相符者優先，其次依人口排序"""
+        key = normalize_name(prefix).encode('utf-8')
+        if not key:
+            return []
+        exact: Dict[int, bool] = {}
+        # 前綴過短時候選很多，掃描數量設上限
+        for k, city_id in self._prefix_ids(key, 2000):
+            exact[city_id] = exact.get(city_id, False) or k == key
+        cities = [self.city(city_id) for city_id in exact]
+        cities.sort(key=lambda c: (not exact[c.id], -c.population, c.name_en))
+        return cities[:limit]
+
+    def suggest(self, name: str, limit: int = 5, cutoff: float = 0.6) -> List[Tuple[City, float]]:
+        """模糊比對（拼錯或少字）；只在前綴查無結果時使用，耗時約數毫秒"""
+        key = normalize_name(name)
+        if not key:
+            return []
+        keys = self._all_keys()
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(key)
+        scored: Dict[int, float] = {}
+        for candidate, city_id in keys:
+            if abs(len(candidate) - len(key)) > max(2, len(key) // 2):
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+                continue
+            score = matcher.ratio()
+            if score >= cutoff and score > scored.get(city_id, 0.0):
+                scored[city_id] = score
+        ranked = sorted(scored.items(), key=lambda kv: (-kv[1], -self.city(kv[0]).population))
+        return [(self.city(city_id), round(score, 3)) for city_id, score in ranked[:limit]]
+
+    def _all_keys(self) -> List[Tuple[str, int]]:
+        if self._key_list is None:
+            mm = self._load()
+            keys = []
+            for i in range(self._keys):
+                key, city_id = self._key_bytes(mm, i)
+                keys.append((key.decode('utf-8'), city_id))
+            self._key_list = keys
+        return self._key_list
+
+    def search(self, query: str, limit: int = 10) -> Tuple[List[City], bool]:
+        """
+        自動完成：前綴查詢，查無結果時改用模糊比對
+
+        Returns:
+            (城市列表, 是否為模糊結果)
+        """
+        results = self.complete(query, limit)
+        if results:
+            return results, False
+        return [city for city, _ in self.suggest(query, limit)], True
+
+    # ---------- 座標 → 時區 ----------
+
+    def _arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """城市座標（弧度）、時區索引與網格陣列；皆為 mmap 的唯讀視圖或由其衍生的小型陣列"""
+        if self._coordinates is None:
+            mm = self._load()
+            records = np.frombuffer(mm, dtype=_CITY_DTYPE, count=self._cities, offset=self._cities_off)
+            rows, cols = _grid_shape(self._cell_deg)
+            grid = np.frombuffer(mm, dtype='<u4', count=rows * cols + 1, offset=self._grid_off)
+            grid_ids = np.frombuffer(mm, dtype='<u4', count=int(grid[-1]), offset=self._grid_ids_off)
+            coordinates = np.radians(np.stack([records['lat'], records['lon']]).astype(np.float64))
+            self._grid = (grid, grid_ids, records['zone'].astype(np.intp))
+            self._coordinates = coordinates
+        return self._coordinates[0], self._coordinates[1], self._grid[2], self._grid
+
+    def _scan(self, latitude: float, longitude: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        半徑內所有城市，依距離排序的 (城市 ID, 距離)
+        只取與搜尋半徑的外接經緯度範圍重疊的網格
+        """
+        city_lat, city_lon, _, (grid, grid_ids, _) = self._arrays()
+        cell = self._cell_deg
+        rows, cols = _grid_shape(cell)
+        # 球面上的外接經緯度範圍：半徑觸及極點時經度方向涵蓋全部網格
+        angle = math.degrees(radius_km / EARTH_RADIUS_KM)
+        lat_min, lat_max = latitude - angle, latitude + angle
+        row_lo = max(0, int((lat_min + 90.0) // cell))
+        row_hi = min(rows - 1, int((lat_max + 90.0) // cell))
+        if lat_min <= -90.0 or lat_max >= 90.0:
+            col_span = cols
+        else:
+            half_width = math.degrees(math.asin(min(1.0, math.sin(math.radians(angle))
+                                                    / math.cos(math.radians(latitude)))))
+            col_span = int(math.ceil(half_width / cell))
+        col = _grid_cell(latitude, longitude, cell)[1]
+
+        slices = []
+        for r in range(row_lo, row_hi + 1):
+            if 2 * col_span + 1 >= cols:
+                slices.append(grid_ids[grid[r * cols]:grid[(r + 1) * cols]])
+                continue
+            for d in range(-col_span, col_span + 1):
+                c = r * cols + (col + d) % cols
+                if grid[c] != grid[c + 1]:
+                    slices.append(grid_ids[grid[c]:grid[c + 1]])
+        if not slices:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        ids = np.concatenate(slices).astype(np.intp)
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        a = (np.sin((city_lat[ids] - lat) / 2) ** 2
+             + math.cos(lat) * np.cos(city_lat[ids]) * np.sin((city_lon[ids] - lon) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        within = distance <= radius_km
+        ids, distance = ids[within], distance[within]
+        order = np.argsort(distance, kind='stable')
+        return ids[order], distance[order]
+
+    def nearest(self, latitude: float, longitude: float, count: int = 1,
+                max_distance_km: float = MAX_REFERENCE_DISTANCE_KM) -> List[Tuple[City, float]]:
+        """
+        最近的 count 個城市與距離（公里），只含 max_distance_km 內的城市
+        由小半徑開始搜尋，找到足夠的城市即停止，人口稠密地區通常只需掃描少數網格
+        """
+        radius = min(250.0, max_distance_km)
+        while True:
+            ids, distances = self._scan(latitude, longitude, radius)
+            if len(ids) >= count or radius >= max_distance_km:
+                return [(self.city(int(i)), float(d)) for i, d in zip(ids[:count], distances[:count])]
+            radius = min(radius * 2, max_distance_km)
+
+    def timezone_at(self, latitude: float, longitude: float) -> TimezoneGuess:
+        """
+        由座標推斷時區：最近參考城市的時區，遠離所有城市時改用航海時區
+        第二近的參考城市距離相近但時區不同時標記 ambiguous（可能位於時區邊界附近）
+        """
+        candidates = self.nearest(latitude, longitude, count=2)
+        if not candidates:
+            return TimezoneGuess(nautical_timezone(longitude), 'nautical')
+        city, distance = candidates[0]
+        ambiguous = (len(candidates) > 1 and candidates[1][0].timezone != city.timezone
+                     and candidates[1][1] < distance * 1.5 + 50)
+        return TimezoneGuess(city.timezone, 'nearest_city', distance, city, ambiguous)
+
+    def timezones_at(self, latitudes: Sequence[float], longitudes: Sequence[float],
+                     chunk: int = 2048) -> List[str]:
+        """
+        批次推斷時區（整批匯入只有經緯度時使用），以 NumPy 一次計算與所有參考城市的距離
+        結果與逐筆 timezone_at 相同
+        """
+        lats = np.radians(np.asarray(latitudes, dtype=np.float64))
+        lons = np.asarray(longitudes, dtype=np.float64)
+        city_lat, city_lon, zone_index, _ = self._arrays()
+
+        result: List[str] = []
+        for start in range(0, len(lats), chunk):
+            lat = lats[start:start + chunk, None]
+            lon = np.radians(lons[start:start + chunk, None])
+            a = (np.sin((city_lat - lat) / 2) ** 2
+                 + np.cos(lat) * np.cos(city_lat) * np.sin((city_lon - lon) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            nearest = distance.argmin(axis=1)
+            within = distance[np.arange(len(nearest)), nearest] <= MAX_REFERENCE_DISTANCE_KM
+            for i, city_idx in enumerate(nearest):
+                if within[i]:
+                    result.append(self._zones[zone_index[city_idx]])
+                else:
+                    result.append(nautical_timezone(float(lons[start + i])))
+        return result
+
+    def status(self) -> Dict:
+        try:
+            self._load()
+        except (OSError, ValueError) as e:
+            return {'available': False, 'error': str(e)}
+        return {'available': True, 'cities': self._cities, 'keys': self._keys,
+                'timezones': len(self._zones), 'bytes': len(self._mm)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+                self._key_list = None
+                self._coordinates = None
+                self._grid = None
+
+
+def main_cli():
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        stats = build_gazetteer()
+        print(f"✅ 已建置 {DEFAULT_PATH}: {stats['cities']} 個城市、{stats['keys']} 個名稱鍵、"
+              f"{stats['timezones']} 個時區，{stats['bytes'] / 1024:.1f} KB")
+        return
+    gazetteer = Gazetteer()
+    for query in sys.argv[1:]:
+        results, fuzzy = gazetteer.search(query)
+        print(f"🔎 {query}{'（模糊）' if fuzzy else ''}")
+        for city in results:
+            print(f"   {city.name} / {city.name_en} ({city.country}) "
+                  f"{city.latitude:.2f}, {city.longitude:.2f} {city.timezone}")
+
+
+if __name__ == "__main__":
+    main_cli()
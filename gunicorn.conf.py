@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn 生產環境設定
+虹靈御所占星主角生成系統
+
+- preload_app: 在 master 載入應用，引擎對照表與時區資料以 copy-on-write 共用
+- workers / threads 依 CPU 數量決定，可用環境變數覆寫
+- 互動工作階段只存在單一 worker 的記憶體中，多個 worker 時預設停用；啟用時為 SSE 串流另加執行緒
+- 每個 worker 啟動後先執行一次 /api/test 等價計算預熱
+- worker 常駐記憶體超過門檻時優雅回收，另以 max_requests 定期回收
+- 預載模式下由 master 啟動非同步工作佇列的處理程序（JOB_WORKER_PROCESSES），關閉時一併停止
+
+啟動: gunicorn -c gunicorn.conf.py main:app
+"""
+
+import multiprocessing
+import os
+
+_cpu_count = multiprocessing.cpu_count()
+
+# 綁定位址
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Worker 設定：計算屬 CPU 密集，worker 數量對應核心數，執行緒用來吸收 I/O 等待
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, _cpu_count)))
+
+# 互動工作階段沒有共享儲存，多個 worker 又沒有黏著路由時 PATCH / 串流會落到其他 worker 而找不到工作階段；
+# 未明確設定 WHATIF_ENABLED 時只在單一 worker 啟用（設定檔先於應用載入，main 讀到的即為此值）
+whatif_enabled = os.environ.setdefault('WHATIF_ENABLED', 'true' if workers == 1 else 'false').lower() == 'true'
+
+# 每個開啟中的 SSE 串流長時間佔用一個 gthread 執行緒；啟用工作階段時另加串流上限數的執行緒，計算請求仍有執行緒可用
+_stream_threads = int(os.environ.get('WHATIF_MAX_STREAMS', '8')) if whatif_enabled else 0
+threads = int(os.environ.get('GUNICORN_THREADS', 2 + _stream_threads if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '200'))  # gevent 使用
+
+# 預載應用；gevent 需在 worker 內先完成 monkey patch 才能載入應用（否則執行緒池與佇列會卡住），預設不預載
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false' if worker_class == 'gevent' else 'true').lower() == 'true'
+
+# 逾時與連線
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '20'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Worker 回收：依請求數（加上抖動避免同時重啟）與常駐記憶體門檻
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+max_worker_rss_mb = int(os.environ.get('GUNICORN_MAX_WORKER_RSS_MB', '512'))
+
+# 日誌
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None  # 設為空字串可關閉存取日誌
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+_job_workers = None
+
+
+def when_ready(server):
+    """預載模式下先在 master 載入預設精度引擎（引擎為延遲載入），worker 以 copy-on-write 共用"""
+    global _job_workers
+    if not preload_app:
+        server.log.info("未預載應用，工作佇列處理程序需以 python job_worker.py 另行啟動")
+        return
+    try:
+        import main
+        precision, _ = main.default_engine()
+        server.log.info("預設引擎已於 master 載入: %s", precision)
+        _job_workers = main.start_job_workers()
+        if _job_workers is not None:
+            server.log.info("工作佇列處理程序已啟動: %s", _job_workers.pids)
+    except Exception as e:
+        server.log.warning("master 載入引擎失敗: %s", e)
+
+
+def on_exit(server):
+    """停止工作佇列處理程序；處理中的區塊完成後才結束，未完成者租約到期後由下次啟動接手"""
+    if _job_workers is not None:
+        _job_workers.stop()
+
+
+def post_fork(server, worker):
+    """fork 後關閉繼承自 master 的星曆檔案代碼，避免多個程序共用檔案位置"""
+    try:
+        import swisseph
+        swisseph.close()
+    except ImportError:
+        pass
+
+
+def post_worker_init(worker):
+    """worker 載入應用後預熱計算路徑"""
+    try:
+        import main
+        elapsed = main.warmup()
+        worker.log.info("Worker %s 預熱完成，用時 %.3f秒", worker.pid, elapsed)
+    except Exception as e:
+        worker.log.warning("Worker %s 預熱失敗: %s", worker.pid, e)
+
+
+def post_request(worker, req, environ, resp):
+    """常駐記憶體超過門檻時，處理完目前請求後優雅回收 worker"""
+    if max_worker_rss_mb <= 0:
+        return
+    from memory_diagnostics import current_rss_mb  # 應用目錄於載入設定檔後才加入 sys.path
+    rss = current_rss_mb()
+    if rss > max_worker_rss_mb and worker.alive:
+        worker.log.warning("Worker %s 記憶體 %.0fMB 超過門檻 %dMB，準備回收",
+                           worker.pid, rss, max_worker_rss_mb)
+        worker.alive = False
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+增量星盤計算
+網頁介面中使用者一次只調整一個欄位（通常是分鐘或姓名），與最近一次的星盤比對輸入後只重算受影響的部分：
+- 只改姓名、城市名稱：整張星盤重用，只替換 birth_info
+- 改時間：重算時區換算、月亮、上升天頂與宮位；太陽與行星在可證明輸出不變時重用
+- 改經緯度或宮位制：只重算上升天頂與宮位
+
+可證明不變：重用的天體以最大日行速度推得新黃經所在區間，
+區間兩端的星座、兩位小數的度數、所在宮位與逆行判斷都相同時，區間內任何值的輸出都相同，
+因此結果與完整重算逐欄位一致；無法證明時就重算該組天體。
+
+解析星曆引擎（fast / approx）支援逐階段重用；Swiss Ephemeris 只支援只改姓名時的整張重用。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from analytic_ephemeris import (BODY_GROUPS, PRECISION_LEVELS, assemble_chart_arrays, birth_info,
+                                body_group, chart_from_arrays, house_frame, house_numbers,
+                                local_julian_day, sign_index)
+from concurrency import AtomicCounter
+from perf_timing import NULL_TIMER
+
+# 解析星曆在 1900-2050 年間量得的最大地心日行速度（度/日）再放寬約 25%
+MAX_DAILY_MOTION = {
+    'sun': 1.3,
+    'moon': 19.5,
+    'mercury': 2.8,
+    'venus': 1.6,
+    'mars': 1.0,
+    'jupiter': 0.31,
+    'saturn': 0.17,
+    'uranus': 0.08,
+    'neptune': 0.05,
+    'pluto': 0.05,
+}
+_GROUP_MOTION = {group: np.array([MAX_DAILY_MOTION[key] for key in keys]) for group, keys in BODY_GROUPS}
+# 浮點運算誤差的餘裕（度）
+_EPSILON = 1e-9
+
+STAGES = ('chart', 'tz') + tuple(group for group, _ in BODY_GROUPS) + ('houses',)
+
+
+class ChartState(NamedTuple):
+    """
+    一次計算的中間結果，建立後不再修改，可在多個請求與工作階段間共用
+    groups[group] 為 (計算時的儒略日, 黃經 (1, k), 黃經差 (1, k) 或 None)
+    """
+    engine_key: str
+    time_key: Tuple
+    location_key: Tuple[float, float, str]  # (緯度, 經度, 宮位制)
+    jd: Optional[float]
+    groups: Dict[str, Tuple[float, np.ndarray, Optional[np.ndarray]]]
+    frame: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+    chart: Dict
+
+    @property
+    def key(self) -> Tuple:
+        return self.engine_key, self.time_key, self.location_key
+
+
+def _output_unchanged(longitudes: np.ndarray, motion: Optional[np.ndarray], bound: np.ndarray,
+                      cusps: np.ndarray) -> bool:
+    """
+    新黃經落在 longitudes ± bound 內時，輸出的星座、度數、宮位與逆行判斷是否必定不變
+    星座內 round(黃經 % 30, 2) 隨黃經單調，只需比較區間兩端
+    """
+    low, high = longitudes - bound - _EPSILON, longitudes + bound + _EPSILON
+    if np.any(sign_index(low) != sign_index(high)):
+        return False
+    for lo, hi in zip(low.ravel().tolist(), high.ravel().tolist()):
+        if round(lo % 30, 2) != round(hi % 30, 2):
+            return False
+    # 區間短於最窄的宮位時，兩端同宮即整段同宮
+    width = np.mod(np.roll(cusps, -1, axis=-1) - cusps, 360.0)
+    if np.any(2 * (bound + _EPSILON) >= width.min()):
+        return False
+    if np.any(house_numbers(low, cusps[:, None, :]) != house_numbers(high, cusps[:, None, :])):
+        return False
+    # 前後半日黃經差的變化不超過 2 × bound
+    return motion is None or bool(np.all(np.abs(motion) > 2 * (bound + _EPSILON)))
+
+
+class IncrementalCharts:
+    """
+    增量星盤計算器
+    以 (引擎, 出生日期) 索引保留最近的計算狀態，新請求與同一天最近的狀態比對後只重算有變化的階段
+
+    Args:
+        capacity: 保留的狀態數上限；0 表示停用，每次都完整計算
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._recent: 'OrderedDict[Tuple, ChartState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = AtomicCounter()
+        self.base_hits = AtomicCounter()
+        self._computed = {stage: AtomicCounter() for stage in STAGES}
+        self._reused = {stage: AtomicCounter() for stage in STAGES}
+        self.proven_reuse = AtomicCounter()
+
+    @staticmethod
+    def engine_key(engine) -> str:
+        precision = getattr(engine, 'precision', None)
+        return precision if precision in PRECISION_LEVELS else type(engine).__name__
+
+    def _index_key(self, state: ChartState) -> Tuple:
+        return state.engine_key, state.time_key[:3]
+
+    def recent(self, engine, data: Dict) -> Optional[ChartState]:
+        """同一引擎、同一出生日期最近的狀態"""
+        if self.capacity <= 0:
+            return None
+        key = (self.engine_key(engine), (int(data['year']), int(data['month']), int(data['day'])))
+        with self._lock:
+            return self._recent.get(key)
+
+    def _remember(self, state: ChartState) -> None:
+        if self.capacity <= 0:
+            return
+        key = self._index_key(state)
+        with self._lock:
+            self._recent[key] = state
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def _count(self, reused: List[str], computed: List[str]) -> None:
+        for stage in reused:
+            self._reused[stage].increment()
+        for stage in computed:
+            self._computed[stage].increment()
+
+    def calculate(self, engine, data: Dict, timer=NULL_TIMER,
+                  base: Optional[ChartState] = None) -> Tuple[Dict, ChartState, List[str]]:
+        """
+        計算星盤，與 base（未指定時為同一天最近的狀態）比對後重用未受影響的階段
+
+        Returns:
+            (星盤, 新狀態, 重用的階段)
+        """
+        self.requests.increment()
+        engine_key = self.engine_key(engine)
+        time_key = (int(data['year']), int(data['month']), int(data['day']),
+                    int(data['hour']), int(data['minute']), data.get('timezone', 'Asia/Taipei'))
+        location_key = (float(data['latitude']), float(data['longitude']), data.get('house_system', 'placidus'))
+        info = birth_info(data['name'], *time_key[:5], data['city'],
+                          location_key[1], location_key[0], time_key[5])
+
+        if base is None:
+            base = self.recent(engine, data)
+        if base is not None and base.engine_key != engine_key:
+            base = None
+        if base is not None:
+            self.base_hits.increment()
+
+        if base is not None and base.key == (engine_key, time_key, location_key):
+            # 只改姓名或城市名稱：星盤內容與出生資料的其他欄位無關
+            chart = {**base.chart, 'birth_info': info}
+            state = base._replace(chart=chart)
+            reused = list(STAGES) if engine_key in PRECISION_LEVELS else ['chart']
+            self._count(reused, [])
+            self._remember(state)
+            return chart, state, reused
+
+        if engine_key not in PRECISION_LEVELS:
+            chart = engine.calculate_natal_chart(data['name'], *time_key[:5], data['city'],
+                                                 location_key[1], location_key[0], time_key[5], timer=timer,
+                                                 house_system=location_key[2])
+            state = ChartState(engine_key, time_key, location_key, None, {}, None, chart)
+            self._count([], ['chart'])
+            self._remember(state)
+            return chart, state, []
+
+        return self._calculate_analytic(engine_key, time_key, location_key, info, base, timer)
+
+    def _calculate_analytic(self, precision: str, time_key: Tuple, location_key: Tuple[float, float, str],
+                            info: Dict, base: Optional[ChartState], timer) -> Tuple[Dict, ChartState, List[str]]:
+        reused, computed = [], ['chart']
+
+        with timer.stage('tz'):
+            if base is not None and base.time_key == time_key:
+                jd = base.jd
+                reused.append('tz')
+            else:
+                jd = local_julian_day(*time_key)
+                computed.append('tz')
+        jd_array = np.array([jd])
+
+        with timer.stage('houses'):
+            if base is not None and base.jd == jd and base.location_key == location_key:
+                frame = base.frame
+                reused.append('houses')
+            else:
+                frame = house_frame(jd_array, location_key[0], location_key[1], precision, location_key[2])
+                computed.append('houses')
+
+        with timer.stage('ephemeris'):
+            groups = {}
+            for group, _ in BODY_GROUPS:
+                previous = base.groups.get(group) if base is not None else None
+                if previous is not None:
+                    computed_at, longitudes, motion = previous
+                    if computed_at == jd or _output_unchanged(
+                            longitudes, motion, _GROUP_MOTION[group] * abs(jd - computed_at), frame[2]):
+                        groups[group] = previous
+                        reused.append(group)
+                        if computed_at != jd:
+                            self.proven_reuse.increment()
+                        continue
+                longitudes, motion = body_group(group, jd_array, precision)
+                groups[group] = (jd, longitudes, motion)
+                computed.append(group)
+
+        # 重用的天體沿用原計算時刻的黃經：上方已證明其星座、度數、宮位與逆行判斷皆與重算相同
+        arrays = assemble_chart_arrays({group: value[1:] for group, value in groups.items()}, frame)
+        chart = chart_from_arrays(arrays, 0, info)
+        state = ChartState(precision, time_key, location_key, jd, groups, frame, chart)
+        self._count(reused, computed)
+        self._remember(state)
+        return chart, state, reused
+
+    def status(self) -> Dict:
+        """各階段的重算與重用次數"""
+        stages = {}
+        for stage in STAGES:
+            reused, computed = self._reused[stage].value, self._computed[stage].value
+            stages[stage] = {
+                'reused': reused,
+                'computed': computed,
+                'reuse_rate': round(reused / (reused + computed), 3) if reused + computed else 0.0,
+            }
+        with self._lock:
+            size = len(self._recent)
+        return {
+            'capacity': self.capacity,
+            'states': size,
+            'requests': self.requests.value,
+            'base_hits': self.base_hits.value,
+            'proven_reuse': self.proven_reuse.value,
+            'stages': stages,
+        }
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+非同步工作佇列
+大量生成請求（例如一次匯入數萬筆出生資料）不適合同步 HTTP 呼叫，改為提交工作後輪詢或串流進度：
+- 以 SQLite (WAL) 作為本機持久佇列，服務重啟後未完成的工作繼續執行
+- 工作切成固定大小的區塊，多個 worker 程序各自租用區塊處理，同一個大工作可以平行消化
+- 區塊處理失敗時以指數退避重試，超過次數後該區塊的項目標記錯誤；worker 當掉時租約到期由其他 worker 接手
+- 依優先度（大者優先）再依提交時間排程；取消後尚未處理的區塊不再執行
+- 每個工作記錄處理量、worker 實際耗時與吞吐量，供進度顯示與估計剩餘時間
+
+單筆項目的驗證錯誤屬於結果的一部分（該項目 error），不會觸發重試；重試只針對區塊層級的例外。
+"""
+
+import json
+import logging
+import os
+import signal
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+TERMINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+MAX_PRIORITY = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    options TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed_items INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL,
+    chunks_finished INTEGER NOT NULL DEFAULT 0,
+    chunks_failed INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    busy_seconds REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    start_idx INTEGER NOT NULL,
+    end_idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    PRIMARY KEY (job_id, chunk)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunks_ready ON chunks (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, finished);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+) WITHOUT ROWID;
+"""
+
+
+class JobQueue:
+    """
+    SQLite 持久工作佇列
+    每個執行緒（與 fork 後的每個程序）使用各自的連線；寫入以 BEGIN IMMEDIATE 取得寫鎖
+
+    Args:
+        path: 資料庫檔案路徑
+        chunk_size: 每個區塊的項目數
+        max_attempts: 區塊最多嘗試次數（含第一次）
+        lease_seconds: 區塊租約；處理中的 worker 每隔三分之一租約延長一次，超過此時間未延長視為當掉，由其他 worker 接手
+        retry_backoff: 第一次重試前等待的秒數，之後每次加倍
+        retention_seconds: 已結束的工作保留秒數，超過後連同區塊與項目一併刪除；0 表示不依時間刪除
+        max_finished: 最多保留的已結束工作數，超過時刪除最早結束者；0 表示不限
+        prune_batch: 每次提交工作時最多刪除的舊工作數，避免單次提交因清理而變慢
+    """
+
+    def __init__(self, path: str, chunk_size: int = 200, max_attempts: int = 3,
+                 lease_seconds: float = 120, retry_backoff: float = 2.0,
+                 retention_seconds: float = 0, max_finished: int = 0, prune_batch: int = 100):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff = retry_backoff
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self.prune_batch = prune_batch
+        self.pruned = 0
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """本執行緒的連線；首次連線時才建立目錄與資料表，唯讀環境下匯入模組不會失敗"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _write(self):
+        """寫入交易：with self._write() as db"""
+        return _Transaction(self._connection())
+
+    def submit(self, items: Sequence[Dict], priority: int = 0, options: Optional[Dict] = None) -> Dict:
+        """提交工作，回傳工作狀態；提交前先清理超過保留期限或數量的已結束工作"""
+        self.prune()
+        job_id = os.urandom(12).hex()
+        now = time.time()
+        count = len(items)
+        chunks = [(job_id, i, start, min(start + self.chunk_size, count), 'pending', now)
+                  for i, start in enumerate(range(0, count, self.chunk_size))]
+        with self._write() as db:
+            db.execute(
+                'INSERT INTO jobs (id, status, priority, options, total, chunks, created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued' if chunks else 'succeeded', priority, json.dumps(options or {}), count,
+                 len(chunks), now))
+            if not chunks:
+                db.execute('UPDATE jobs SET finished = ? WHERE id = ?', (now, job_id))
+            db.executemany(
+                'INSERT INTO chunks (job_id, chunk, start_idx, end_idx, status, available_at) VALUES (?, ?, ?, ?, ?, ?)',
+                chunks)
+            db.executemany('INSERT INTO items (job_id, idx, input) VALUES (?, ?, ?)',
+                           ((job_id, i, json.dumps(item, ensure_ascii=False)) for i, item in enumerate(items)))
+        return self.get(job_id)
+
+    def prune(self) -> int:
+        """
+        刪除超過保留期限或保留數量的已結束工作（含區塊與項目），一次最多 prune_batch 個，回傳刪除數
+        刪除後的空間由 SQLite 重複使用，檔案大小維持在保留量附近而不會持續成長
+        """
+        if self.retention_seconds <= 0 and self.max_finished <= 0:
+            return 0
+        terminal = ', '.join(f"'{status}'" for status in TERMINAL_STATUSES)
+        conditions, params = [], []
+        if self.retention_seconds > 0:
+            conditions.append('finished < ?')
+            params.append(time.time() - self.retention_seconds)
+        if self.max_finished > 0:
+            conditions.append(f"""id IN (SELECT id FROM jobs WHERE status IN ({terminal})
+                                   ORDER BY finished DESC LIMIT -1 OFFSET ?)""")
+            params.append(self.max_finished)
+        with self._write() as db:
+            ids = [(row['id'],) for row in db.execute(
+                f"SELECT id FROM jobs WHERE status IN ({terminal}) AND ({' OR '.join(conditions)}) LIMIT ?",
+                (*params, self.prune_batch))]
+            db.executemany('DELETE FROM items WHERE job_id = ?', ids)
+            db.executemany('DELETE FROM chunks WHERE job_id = ?', ids)
+            db.executemany('DELETE FROM jobs WHERE id = ?', ids)
+        self.pruned += len(ids)
+        return len(ids)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """工作狀態與吞吐量統計；不存在時回傳 None"""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _describe(row) if row is not None else None
+
+    def list(self, limit: int = 20, status: Optional[str] = None) -> List[Dict]:
+        """最近提交的工作"""
+        if status is None:
+            rows = self._connection().execute('SELECT * FROM jobs ORDER BY created DESC LIMIT ?', (limit,))
+        else:
+            rows = self._connection().execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?', (status, limit))
+        return [_describe(row) for row in rows]
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """依序分頁取得項目結果；尚未處理的項目 status 為 pending"""
+        rows = self._connection().execute(
+            'SELECT idx, result, error FROM items WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?',
+            (job_id, offset, limit))
+        page = []
+        for row in rows:
+            if row['error'] is not None:
+                page.append({'index': row['idx'], 'status': 'error', 'error': row['error']})
+            elif row['result'] is not None:
+                page.append({'index': row['idx'], 'status': 'done', 'result': json.loads(row['result'])})
+            else:
+                page.append({'index': row['idx'], 'status': 'pending'})
+        return page
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        取消工作：尚未開始的區塊不再執行，進行中的區塊完成後結果仍會保存
+        已結束的工作不受影響；回傳取消後的狀態，工作不存在時回傳 None
+        """
+        now = time.time()
+        with self._write() as db:
+            updated = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, job_id)).rowcount
+            if updated:
+                db.execute("UPDATE chunks SET status = 'cancelled' WHERE job_id = ? AND status = 'pending'",
+                           (job_id,))
+        return self.get(job_id)
+
+    def claim(self, owner: str) -> Optional[Tuple[str, int, Dict, List[Tuple[int, Dict]]]]:
+        """
+        租用下一個可執行的區塊：優先度高者優先，同優先度依提交時間、區塊順序
+        租約過期的區塊（worker 當掉）重新指派；嘗試次數用盡者改標記失敗
+
+        Returns:
+            (工作 ID, 區塊編號, 工作選項, [(項目索引, 輸入)])；沒有可執行的區塊時回傳 None
+        """
+        while True:
+            now = time.time()
+            with self._write() as db:
+                row = db.execute(
+                    """SELECT c.job_id, c.chunk, c.start_idx, c.end_idx, c.attempts, j.options
+                       FROM chunks c JOIN jobs j ON j.id = c.job_id
+                       WHERE j.status IN ('queued', 'running')
+                         AND ((c.status = 'pending' AND c.available_at <= ?)
+                              OR (c.status = 'running' AND c.lease_expires < ?))
+                       ORDER BY j.priority DESC, j.created, c.chunk
+                       LIMIT 1""", (now, now)).fetchone()
+                if row is None:
+                    return None
+                job_id, chunk = row['job_id'], row['chunk']
+                if row['attempts'] >= self.max_attempts:
+                    self._fail_chunk(db, job_id, chunk, 'worker 租約逾時且重試次數已用盡', now)
+                    continue
+                db.execute(
+                    """UPDATE chunks SET status = 'running', attempts = attempts + 1,
+                       lease_owner = ?, lease_expires = ? WHERE job_id = ? AND chunk = ?""",
+                    (owner, now + self.lease_seconds, job_id, chunk))
+                if row['attempts'] > 0:
+                    db.execute('UPDATE jobs SET retries = retries + 1 WHERE id = ?', (job_id,))
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started = COALESCE(started, ?) WHERE id = ? AND status = 'queued'",
+                    (now, job_id))
+                items = db.execute(
+                    'SELECT idx, input FROM items WHERE job_id = ? AND idx >= ? AND idx < ? ORDER BY idx',
+                    (job_id, row['start_idx'], row['end_idx'])).fetchall()
+            return job_id, chunk, json.loads(row['options']), [(r['idx'], json.loads(r['input'])) for r in items]
+
+    def complete(self, job_id: str, chunk: int, owner: str,
+                 results: Sequence[Tuple[int, Optional[Dict], Optional[str]]], busy_seconds: float) -> bool:
+        """
+        保存區塊結果 [(項目索引, 結果, 錯誤)]
+        租約已被他人接手時捨棄結果並回傳 False
+        """
+        now = time.time()
+        with self._write() as db:
+            if not self._holds_lease(db, job_id, chunk, owner):
+                return False
+            db.executemany(
+                'UPDATE items SET result = ?, error = ? WHERE job_id = ? AND idx = ?',
+                ((json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id, idx)
+                 for idx, result, error in results))
+            db.execute("UPDATE chunks SET status = 'done', lease_owner = NULL WHERE job_id = ? AND chunk = ?",
+                       (job_id, chunk))
+            db.execute(
+                """UPDATE jobs SET processed = processed + ?, failed_items = failed_items + ?,
+                   chunks_finished = chunks_finished + 1, busy_seconds = busy_seconds + ? WHERE id = ?""",
+                (len(results), sum(1 for _, _, error in results if error is not None), busy_seconds, job_id))
+            self._finish_if_done(db, job_id, now)
+        return True
+
+    def retry(self, job_id: str, chunk: int, owner: str, error: str, busy_seconds: float = 0.0) -> None:
+        """區塊處理失敗：退避後重試，嘗試次數用盡時標記失敗"""
+        now = time.time()
+        with self._write() as db:
+            if not self._holds_lease(db, job_id, chunk, owner):
+                return
+            db.execute('UPDATE jobs SET busy_seconds = busy_seconds + ? WHERE id = ?', (busy_seconds, job_id))
+            attempts = db.execute('SELECT attempts FROM chunks WHERE job_id = ? AND chunk = ?',
+                                  (job_id, chunk)).fetchone()['attempts']
+            if attempts >= self.max_attempts:
+                self._fail_chunk(db, job_id, chunk, error, now)
+                return
+            db.execute(
+                """UPDATE chunks SET status = 'pending', lease_owner = NULL, error = ?, available_at = ?
+                   WHERE job_id = ? AND chunk = ?""",
+                (error, now + self.retry_backoff * 2 ** (attempts - 1), job_id, chunk))
+
+    def renew(self, job_id: str, chunk: int, owner: str) -> bool:
+        """延長租約；回傳是否仍持有租約"""
+        with self._write() as db:
+            return db.execute(
+                "UPDATE chunks SET lease_expires = ? WHERE job_id = ? AND chunk = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, chunk, owner)).rowcount > 0
+
+    @staticmethod
+    def _holds_lease(db, job_id: str, chunk: int, owner: str) -> bool:
+        row = db.execute('SELECT status, lease_owner FROM chunks WHERE job_id = ? AND chunk = ?',
+                         (job_id, chunk)).fetchone()
+        return row is not None and row['status'] == 'running' and row['lease_owner'] == owner
+
+    def _fail_chunk(self, db, job_id: str, chunk: int, error: str, now: float) -> None:
+        row = db.execute('SELECT start_idx, end_idx FROM chunks WHERE job_id = ? AND chunk = ?',
+                         (job_id, chunk)).fetchone()
+        db.execute("UPDATE chunks SET status = 'failed', lease_owner = NULL, error = ? WHERE job_id = ? AND chunk = ?",
+                   (error, job_id, chunk))
+        failed = db.execute(
+            'UPDATE items SET error = ? WHERE job_id = ? AND idx >= ? AND idx < ? AND result IS NULL AND error IS NULL',
+            (f'處理失敗: {error}', job_id, row['start_idx'], row['end_idx'])).rowcount
+        db.execute(
+            """UPDATE jobs SET processed = processed + ?, failed_items = failed_items + ?,
+               chunks_finished = chunks_finished + 1, chunks_failed = chunks_failed + 1, error = ? WHERE id = ?""",
+            (failed, failed, error, job_id))
+        self._finish_if_done(db, job_id, now)
+
+    @staticmethod
+    def _finish_if_done(db, job_id: str, now: float) -> None:
+        db.execute(
+            """UPDATE jobs SET status = CASE WHEN chunks_failed > 0 THEN 'failed' ELSE 'succeeded' END, finished = ?
+               WHERE id = ? AND status = 'running' AND chunks_finished = chunks""",
+            (now, job_id))
+
+    def status(self) -> Dict:
+        """佇列概況：各狀態的工作數與待處理項目數"""
+        db = self._connection()
+        counts = {status: 0 for status in JOB_STATUSES}
+        for row in db.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status'):
+            counts[row['status']] = row['n']
+        pending = db.execute(
+            "SELECT COALESCE(SUM(total - processed), 0) AS n FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()['n']
+        return {
+            'path': self.path,
+            'jobs': counts,
+            'pending_items': pending,
+            'chunk_size': self.chunk_size,
+            'max_attempts': self.max_attempts,
+            'retention_seconds': self.retention_seconds,
+            'max_finished': self.max_finished,
+            'pruned': self.pruned,
+        }
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE 寫入交易，例外時回滾"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.db.execute('ROLLBACK' if exc_type is not None else 'COMMIT')
+
+
+def _describe(row: sqlite3.Row) -> Dict:
+    """工作狀態；吞吐量以實際經過時間計算，worker_seconds 為各 worker 處理時間總和"""
+    now = time.time()
+    elapsed = ((row['finished'] or now) - row['started']) if row['started'] else 0.0
+    throughput = row['processed'] / elapsed if elapsed > 0 else None
+    remaining = row['total'] - row['processed']
+    return {
+        'job_id': row['id'],
+        'status': row['status'],
+        'priority': row['priority'],
+        'options': json.loads(row['options']),
+        'total': row['total'],
+        'processed': row['processed'],
+        'failed_items': row['failed_items'],
+        'progress': round(row['processed'] / row['total'], 4) if row['total'] else 1.0,
+        'retries': row['retries'],
+        'error': row['error'],
+        'created': row['created'],
+        'started': row['started'],
+        'finished': row['finished'],
+        'stats': {
+            'elapsed_seconds': round(elapsed, 3),
+            'worker_seconds': round(row['busy_seconds'], 3),
+            'items_per_second': round(throughput, 2) if throughput else None,
+            'ms_per_item': round(row['busy_seconds'] / row['processed'] * 1000, 3) if row['processed'] else None,
+            'eta_seconds': round(remaining / throughput, 1)
+            if throughput and row['status'] not in TERMINAL_STATUSES else None,
+        },
+    }
+
+
+class JobWorker:
+    """
+    工作處理迴圈：租用區塊、處理、保存結果
+
+    Args:
+        queue: JobQueue
+        process: process(項目清單, 工作選項) -> [(結果, 錯誤)]，與項目一一對應
+        idle_seconds: 沒有工作時的輪詢間隔
+    """
+
+    def __init__(self, queue: JobQueue, process: Callable[[List[Dict], Dict], List[Tuple[Optional[Dict], Optional[str]]]],
+                 idle_seconds: float = 0.5):
+        self.queue = queue
+        self.process = process
+        self.idle_seconds = idle_seconds
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{threading.get_ident()}"
+
+    def run_once(self) -> bool:
+        """處理一個區塊；沒有可執行的區塊時回傳 False"""
+        claimed = self.queue.claim(self.owner)
+        if claimed is None:
+            return False
+        job_id, chunk, options, items = claimed
+        start = time.perf_counter()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, chunk, done),
+                                     name='job-lease-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            outcomes = self.process([item for _, item in items], options)
+        except Exception as e:
+            logger.warning("工作 %s 區塊 %d 處理失敗: %s", job_id, chunk, e, exc_info=True)
+            self.queue.retry(job_id, chunk, self.owner, str(e) or type(e).__name__, time.perf_counter() - start)
+            return True
+        finally:
+            done.set()
+            heartbeat.join()
+        results = [(idx, result, error) for (idx, _), (result, error) in zip(items, outcomes)]
+        if not self.queue.complete(job_id, chunk, self.owner, results, time.perf_counter() - start):
+            logger.warning("工作 %s 區塊 %d 租約已由其他 worker 接手，捨棄結果", job_id, chunk)
+        return True
+
+    def _heartbeat(self, job_id: str, chunk: int, done: threading.Event) -> None:
+        """
+        區塊處理期間每隔租約的三分之一延長一次，處理時間超過 lease_seconds 的區塊不會被其他 worker 重複接手
+        租約已遺失（例如曾長時間停頓）時停止延長，結果由 complete 捨棄
+        """
+        while not done.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.renew(job_id, chunk, self.owner):
+                    logger.warning("工作 %s 區塊 %d 租約已遺失，停止延長", job_id, chunk)
+                    return
+            except sqlite3.Error as e:
+                logger.error("工作 %s 區塊 %d 延長租約失敗: %s", job_id, chunk, e)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """持續處理直到 stop 被設定"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                busy = self.run_once()
+            except sqlite3.Error as e:
+                logger.error("工作佇列資料庫錯誤: %s", e)
+                busy = False
+            if not busy:
+                stop.wait(self.idle_seconds)
+
+
+_RESET_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT, signal.SIGCHLD,
+                  signal.SIGUSR1, signal.SIGUSR2, signal.SIGTTIN, signal.SIGTTOU, signal.SIGWINCH)
+
+
+class WorkerPool:
+    """
+    工作處理程序池：fork 出 count 個程序執行 target()，並由監督執行緒重啟意外結束的程序
+    直接使用 os.fork 而非 multiprocessing：gunicorn master 會回收所有子程序，
+    且之後 fork 出的 web worker 會繼承 multiprocessing 的子程序清單並在結束時嘗試 join
+
+    Args:
+        target: 程序進入點（無參數），通常在迴圈中呼叫 JobWorker.run
+        count: 程序數
+    """
+
+    def __init__(self, target: Callable[[], None], count: int, check_seconds: float = 5.0):
+        self.target = target
+        self.count = count
+        self.check_seconds = check_seconds
+        self._pids: List[int] = []
+        self._stop = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+        self.restarts = 0
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # 還原繼承自父程序（例如 gunicorn master）的訊號處理
+            for signum in _RESET_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                self.target()
+            except BaseException:
+                logger.exception("工作處理程序異常結束")
+                code = 1
+            finally:
+                logging.shutdown()
+                # 結束碼 3、4 在 gunicorn master 回收時會被視為 worker 啟動失敗，不可使用
+                os._exit(code)
+        return pid
+
+    @staticmethod
+    def _running(pid: int) -> bool:
+        """程序是否仍在執行；已結束的子程序若尚未被回收則在此回收（也可能已由 gunicorn master 回收）"""
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                return False
+        except ChildProcessError:
+            pass
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+    def start(self) -> None:
+        self._pids = [self._spawn() for _ in range(self.count)]
+        self._supervisor = threading.Thread(target=self._supervise, name='job-worker-supervisor', daemon=True)
+        self._supervisor.start()
+
+    def _supervise(self) -> None:
+        while not self._stop.wait(self.check_seconds):
+            for i, pid in enumerate(self._pids):
+                if not self._running(pid) and not self._stop.is_set():
+                    logger.warning("工作處理程序 %s 已結束，重新啟動", pid)
+                    self._pids[i] = self._spawn()
+                    self.restarts += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """送出 SIGTERM，等待各程序完成目前的區塊；逾時仍未結束者強制終止"""
+        self._stop.set()
+        self._signal(signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while self.pids and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._signal(signal.SIGKILL)
+
+    def _signal(self, signum: int) -> None:
+        for pid in self.pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    @property
+    def pids(self) -> List[int]:
+        return [pid for pid in self._pids if self._running(pid)]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+非同步工作佇列處理程序（獨立部署）
+與網頁服務共用 JOB_DB_PATH 指向的 SQLite 檔案；網頁服務端設定 JOB_WORKER_PROCESSES=0 即只負責收件。
+必須與網頁服務在同一台主機（或掛載同一個共享磁碟區）上執行：分開的容器各有自己的檔案系統，
+處理程序會讀到另一個空的資料庫，送出的工作永遠不會被處理。預設部署由 gunicorn master 啟動處理程序，不需另行執行。
+收到 SIGTERM / SIGINT 時各處理程序完成目前的區塊後結束。
+
+用法:
+    python job_worker.py
+    python job_worker.py --processes 4
+"""
+
+import argparse
+import logging
+import signal
+import threading
+
+import main
+
+logger = logging.getLogger(__name__)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='非同步工作佇列處理程序')
+    parser.add_argument('--processes', type=int, default=max(1, main.app.config['JOB_WORKER_PROCESSES']),
+                        help='處理程序數（預設 JOB_WORKER_PROCESSES，至少 1）')
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    pool = main.start_job_workers(max(1, args.processes))
+    logger.info("工作佇列處理程序已啟動: %s (%s)", pool.pids, main.app.config['JOB_DB_PATH'])
+    stop.wait()
+    pool.stop()
+    logger.info("工作佇列處理程序已停止")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+非阻塞日誌管線
+請求執行緒只把日誌記錄放入佇列，由背景執行緒負責格式化與寫出 stdout
+支援結構化 JSON 輸出與成功日誌取樣（WARNING 以上一律保留）
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+# LogRecord 內建屬性，其餘視為 extra 欄位輸出
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None)).keys()) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """結構化 JSON 日誌格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    成功日誌取樣
+    低於 WARNING 的記錄以 sample_rate 機率保留，WARNING 以上一律保留
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1.0:
+            return True
+        return random.random() < self.sample_rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    延遲格式化的佇列處理器
+    標準 QueueHandler 會在呼叫端執行緒合併訊息參數；此處原樣入列，
+    交由背景執行緒格式化。帶例外的記錄仍在呼叫端先轉為文字，避免保留堆疊框架。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_formatter(fmt: str) -> logging.Formatter:
+    if fmt == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging(level: int = logging.INFO, fmt: Optional[str] = None,
+                  sample_rate: Optional[float] = None,
+                  async_enabled: Optional[bool] = None, stream=None) -> None:
+    """
+    設定根日誌器
+
+    Args:
+        level: 日誌等級
+        fmt: 'text' 或 'json'，預設讀取 LOG_FORMAT
+        sample_rate: 成功日誌取樣率 0-1，預設讀取 LOG_SAMPLE_RATE
+        async_enabled: 是否使用背景佇列，預設讀取 LOG_ASYNC
+        stream: 輸出串流，預設 stdout
+    """
+    global _listener, _queue_handler
+
+    if fmt is None:
+        fmt = os.environ.get('LOG_FORMAT', 'text').lower()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+    if async_enabled is None:
+        async_enabled = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+
+    shutdown_logging()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(_build_formatter(fmt))
+    sampler = SamplingFilter(sample_rate)
+
+    if async_enabled:
+        _queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+        _queue_handler.addFilter(sampler)
+        root.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler,
+                                                   respect_handler_level=True)
+        _listener.start()
+    else:
+        stream_handler.addFilter(sampler)
+        root.addHandler(stream_handler)
+
+
+def shutdown_logging() -> None:
+    """停止背景執行緒並寫出佇列中剩餘的記錄"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+
+def _restart_listener_after_fork() -> None:
+    """fork 後背景執行緒不會被繼承，子程序需重新啟動"""
+    global _listener
+    if _listener is not None and _queue_handler is not None:
+        handlers = _listener.handlers
+        _queue_handler.queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers,
+                                                   respect_handler_level=True)
+        _listener.start()
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -15,21 +15,46 @@ Enhanced Railway Deployment Version
 import os
 import sys
 import time
+import atexit
+import hmac
+import random
+import signal
+import sqlite3
+import threading
 import logging
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
+from datetime import date, datetime, timedelta
+from flask import Flask, request, jsonify, render_template_string, send_from_directory, g, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import json
 import traceback
+from perf_timing import NULL_TIMER, StageTimer, new_timer
+from log_pipeline import setup_logging
+from rate_limiter import AdmissionController, create_limiter, retry_after_header
+from deadline import CircuitBreaker, DeadlineExceeded, DeadlineRunner
+from request_schema import BIRTH_DATA_FIELDS, BIRTH_DATA_SCHEMA, known_timezone
+from concurrency import AtomicCounter
+from engine_registry import EngineUnavailable, create_default_registry
+from request_profiler import ProfileStore, RequestProfile, requested_mode
+from memory_diagnostics import GROUP_KEYS, MemoryTracker, measure_allocations
+from traffic_capture import TrafficCapture
+from gazetteer import DEFAULT_PATH as GAZETTEER_DEFAULT_PATH, Gazetteer
+from rectification import BirthTimeSweep
+from incremental_chart import IncrementalCharts
+from whatif_sessions import SessionClosed, SessionStore, format_event
+from job_queue import MAX_PRIORITY, TERMINAL_STATUSES, JobQueue, JobWorker, WorkerPool
+from character_store import CharacterStore, canonical_json, valid_id
+from columnar_export import (EXPORT_FORMATS, ColumnarCharacters, birth_columns, chunk_rng, csv_columns,
+                             iter_csv, iter_npz, sample_births)
+from analytic_ephemeris import PRECISION_LEVELS, compute_chart_arrays, local_julian_day, timezone_info
+from zodiac import ASPECTS, HOUSE_SYSTEMS
+from chart_wheel import RENDERER_VERSION, WheelCache
+from transit_forecast import (DEFAULT_BODIES as DEFAULT_TRANSIT_BODIES, DEFAULT_ORB, FAST_BODIES,
+                              natal_from_arrays, natal_from_astro_data, point_name, transit_forecast)
 
 # 配置日誌 - 僅使用 stdout，適配 serverless 環境
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# 由背景佇列寫出，格式 (LOG_FORMAT)、取樣率 (LOG_SAMPLE_RATE) 可由環境變數調整
+setup_logging(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -44,65 +69,322 @@ app.config.update({
     'JSON_SORT_KEYS': False,
     'JSONIFY_PRETTYPRINT_REGULAR': True,
     'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB
+    # 階段計時：輸出 Server-Timing 標頭；IN_BODY 時同時寫入 metadata.timings
+    'SERVER_TIMING_ENABLED': os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true',
+    'SERVER_TIMING_IN_BODY': os.environ.get('SERVER_TIMING_IN_BODY', 'false').lower() == 'true',
+    # 速率限制：每個客戶端每秒補充 RATE 個令牌，最多累積 BURST 個；BACKEND 為 memory 或 shm
+    'RATE_LIMIT_ENABLED': os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    'RATE_LIMIT_RATE': float(os.environ.get('RATE_LIMIT_RATE', '2')),
+    'RATE_LIMIT_BURST': int(os.environ.get('RATE_LIMIT_BURST', '20')),
+    'RATE_LIMIT_BACKEND': os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    # API_KEYS 為逗號分隔的允許清單，只有清單中的 X-API-Key 擁有獨立的令牌桶，其他請求一律以 IP 限流
+    'RATE_LIMIT_API_KEYS': frozenset(key.strip() for key in os.environ.get('RATE_LIMIT_API_KEYS', '').split(',')
+                                     if key.strip()),
+    # 前方可信任的反向代理層數（Railway / Heroku 路由器為 1）：由 X-Forwarded-For / -Proto 取得客戶端位址；
+    # 0 表示直接使用連線位址（未經代理時勿設定，否則客戶端可偽造標頭繞過限流）
+    'TRUSTED_PROXIES': int(os.environ.get('TRUSTED_PROXIES', '0')),
+    # 負載削減：同時進行的計算超過此數量時回應 503
+    'MAX_PENDING_CALCULATIONS': int(os.environ.get('MAX_PENDING_CALCULATIONS', '16')),
+    # 計算時限（秒）：逾時改用備用引擎；0 表示不設時限
+    'REQUEST_DEADLINE_SECONDS': float(os.environ.get('REQUEST_DEADLINE_SECONDS', '5')),
+    # 熔斷器：連續逾時 THRESHOLD 次後，RESET 秒內直接使用備用引擎
+    'CIRCUIT_BREAKER_THRESHOLD': int(os.environ.get('CIRCUIT_BREAKER_THRESHOLD', '5')),
+    'CIRCUIT_BREAKER_RESET_SECONDS': float(os.environ.get('CIRCUIT_BREAKER_RESET_SECONDS', '30')),
+    # 請求未指定 precision 時使用的精度層級：exact / fast / approx
+    'DEFAULT_PRECISION': os.environ.get('DEFAULT_PRECISION', 'exact'),
+    # 請求剖析：帶 X-Profile 標頭與正確的 X-Profile-Secret 時剖析該請求；SECRET 為空則停用標頭觸發
+    # SAMPLE_RATE > 0 時另依比例自動以取樣模式剖析；HISTORY 為每個 worker 保留的筆數
+    'PROFILING_SECRET': os.environ.get('PROFILING_SECRET', ''),
+    'PROFILING_SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'PROFILING_HISTORY': int(os.environ.get('PROFILING_HISTORY', '50')),
+    # 流量擷取：將 calculate_chart 的去識別化請求、狀態與耗時寫入輪替的 NDJSON 檔，供重播工具使用
+    # PATH 中的 {pid} 代換為 worker PID；MAX_BYTES 為單檔上限，BACKUPS 為保留的舊檔數
+    # SALT 為姓名代號的 HMAC 鹽，未設定時每個 worker 隨機產生
+    'CAPTURE_ENABLED': os.environ.get('CAPTURE_ENABLED', 'false').lower() == 'true',
+    'CAPTURE_PATH': os.environ.get('CAPTURE_PATH', 'captures/calculate_chart-{pid}.ndjson'),
+    'CAPTURE_MAX_BYTES': int(os.environ.get('CAPTURE_MAX_BYTES', str(10 * 1024 * 1024))),
+    'CAPTURE_BACKUPS': int(os.environ.get('CAPTURE_BACKUPS', '5')),
+    'CAPTURE_SAMPLE_RATE': float(os.environ.get('CAPTURE_SAMPLE_RATE', '1')),
+    'CAPTURE_SALT': os.environ.get('CAPTURE_SALT', ''),
+    # 離線地名索引：請求省略經緯度時依 city 解析座標與時區，並提供 /api/cities 自動完成
+    'GAZETTEER_PATH': os.environ.get('GAZETTEER_PATH', GAZETTEER_DEFAULT_PATH),
+    # 增量計算：每個 worker 保留最近的星盤狀態數，新請求與同一天最近的星盤比對後只重算變動部分；0 表示停用
+    'INCREMENTAL_CHART_STATES': int(os.environ.get('INCREMENTAL_CHART_STATES', '256')),
+    # 互動工作階段：每個 worker 的工作階段數與估計記憶體上限、閒置過期秒數、每個 SSE 串流的事件佇列長度
+    # PRECISION 為工作階段未指定 precision 時的精度層級，拖動時需要毫秒級回應，預設 fast（只能是 fast 或 approx）
+    # ENABLED：工作階段只存在建立它的 worker 記憶體中，多個 worker 又沒有黏著路由時後續請求會找不到工作階段，
+    # gunicorn.conf.py 在 worker 數大於 1 且未明確設定時設為 false；MAX_STREAMS 為每個 worker 同時開啟的 SSE 串流上限
+    'WHATIF_ENABLED': os.environ.get('WHATIF_ENABLED', 'true').lower() == 'true',
+    'WHATIF_MAX_STREAMS': int(os.environ.get('WHATIF_MAX_STREAMS', '8')),
+    'WHATIF_MAX_SESSIONS': int(os.environ.get('WHATIF_MAX_SESSIONS', '1000')),
+    'WHATIF_MEMORY_MB': float(os.environ.get('WHATIF_MEMORY_MB', '64')),
+    'WHATIF_IDLE_SECONDS': float(os.environ.get('WHATIF_IDLE_SECONDS', '900')),
+    'WHATIF_QUEUE_SIZE': int(os.environ.get('WHATIF_QUEUE_SIZE', '32')),
+    'WHATIF_PRECISION': os.environ.get('WHATIF_PRECISION', 'fast'),
+    # 非同步工作佇列：SQLite 檔案路徑、每個工作的項目數上限、區塊大小與區塊最多嘗試次數
+    # WORKER_PROCESSES 為 gunicorn master（或 python main.py）啟動的處理程序數；改以 job_worker.py 另行執行時設為 0，
+    # 且兩者須能存取同一個 JOB_DB_PATH（同一主機或共享磁碟區）
+    'JOB_DB_PATH': os.environ.get('JOB_DB_PATH', 'jobs/jobs.sqlite3'),
+    'JOB_MAX_ITEMS': int(os.environ.get('JOB_MAX_ITEMS', '100000')),
+    'JOB_CHUNK_SIZE': int(os.environ.get('JOB_CHUNK_SIZE', '200')),
+    'JOB_MAX_ATTEMPTS': int(os.environ.get('JOB_MAX_ATTEMPTS', '3')),
+    'JOB_WORKER_PROCESSES': int(os.environ.get('JOB_WORKER_PROCESSES', '1')),
+    'JOB_DEFAULT_PRECISION': os.environ.get('JOB_DEFAULT_PRECISION', 'fast'),
+    # 已結束工作的保留時數與最多保留數，超過者在提交新工作時連同結果刪除；0 表示不限（資料庫會持續成長）
+    'JOB_RETENTION_HOURS': float(os.environ.get('JOB_RETENTION_HOURS', '168')),
+    'JOB_MAX_FINISHED': int(os.environ.get('JOB_MAX_FINISHED', '1000')),
+    # 角色永久儲存：calculate_chart 生成的角色以內容雜湊 ID 存入 SQLite，/api/characters/<id> 取回
+    # 預設停用：需要所有 worker 共用且重新部署後仍保留的可寫入磁碟（Vercel 等唯讀或暫存檔案系統上連結會失效），
+    # 啟用時請將 PATH 設為該磁碟上的絕對路徑
+    # FLUSH_MS 為批次寫入間隔（其他 worker 在此時間內可能還查不到新角色）；CACHE 為每個 worker 的近期角色快取筆數
+    # MAX_ROWS 為保留筆數上限（每筆約數百位元組，預設約 100MB），超過時刪除最舊的角色；0 表示不限
+    'CHARACTER_STORE_ENABLED': os.environ.get('CHARACTER_STORE_ENABLED', 'false').lower() == 'true',
+    'CHARACTER_STORE_PATH': os.environ.get('CHARACTER_STORE_PATH', 'store/characters.sqlite3'),
+    'CHARACTER_STORE_FLUSH_MS': float(os.environ.get('CHARACTER_STORE_FLUSH_MS', '250')),
+    'CHARACTER_STORE_CACHE': int(os.environ.get('CHARACTER_STORE_CACHE', '1024')),
+    'CHARACTER_STORE_MAX_ROWS': int(os.environ.get('CHARACTER_STORE_MAX_ROWS', '200000')),
+    # 欄式匯出：單次請求的列數上限與每個區塊的列數；端點不需驗證，上限以單次請求的成本為準
+    # （約 30 微秒/列，2 萬列約 0.6 秒 CPU、回應約 2.4MB），更大量的匯出以 export_characters.py 多處理程序寫入檔案
+    'EXPORT_MAX_ROWS': int(os.environ.get('EXPORT_MAX_ROWS', '20000')),
+    'EXPORT_CHUNK_ROWS': int(os.environ.get('EXPORT_CHUNK_ROWS', '10000')),
+    # 星盤圖：每個 worker 的 SVG 快取大小；GZIP 為同時保存 gzip 壓縮版本（約為原大小的 1/3），用戶端支援時直接送出
+    'CHART_SVG_CACHE_MB': float(os.environ.get('CHART_SVG_CACHE_MB', '32')),
+    'CHART_SVG_GZIP': os.environ.get('CHART_SVG_GZIP', 'true').lower() == 'true',
+    # 行運預測：單次請求的日期範圍上限（天）與未指定範圍時的預設天數
+    # FAST_MAX_DAYS 為含太陽、月亮、水星、金星或火星時的上限（月亮十年約有 1.3 萬段相位，計算需數秒）
+    'TRANSIT_MAX_DAYS': int(os.environ.get('TRANSIT_MAX_DAYS', '3660')),
+    'TRANSIT_FAST_MAX_DAYS': int(os.environ.get('TRANSIT_FAST_MAX_DAYS', '366')),
+    'TRANSIT_DEFAULT_DAYS': int(os.environ.get('TRANSIT_DEFAULT_DAYS', '365')),
 })
 
+if app.config['TRUSTED_PROXIES'] > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                            x_proto=app.config['TRUSTED_PROXIES'])
+
+# 需要限流的計算型端點；健康檢查等低成本端點不受影響
+RATE_LIMITED_ENDPOINTS = {'calculate_chart', 'birth_time_sweep', 'create_session', 'update_session',
+                          'submit_job', 'export_characters', 'forecast_transits', 'test_system'}
+
+# 可剖析的端點
+PROFILED_ENDPOINTS = {'calculate_chart'}
+
+rate_limiter = create_limiter(app.config['RATE_LIMIT_BACKEND'],
+                              app.config['RATE_LIMIT_RATE'],
+                              app.config['RATE_LIMIT_BURST'])
+admission = AdmissionController(app.config['MAX_PENDING_CALCULATIONS'])
+deadline_runner = DeadlineRunner(max_workers=max(4, app.config['MAX_PENDING_CALCULATIONS']))
+engine_breaker = CircuitBreaker(app.config['CIRCUIT_BREAKER_THRESHOLD'],
+                                app.config['CIRCUIT_BREAKER_RESET_SECONDS'])
+profile_store = ProfileStore(app.config['PROFILING_HISTORY'])
+memory_tracker = MemoryTracker()
+city_index = Gazetteer(app.config['GAZETTEER_PATH'])
+chart_states = IncrementalCharts(app.config['INCREMENTAL_CHART_STATES'])
+wheel_cache = WheelCache(int(app.config['CHART_SVG_CACHE_MB'] * 1024 * 1024),
+                         gzip_level=9 if app.config['CHART_SVG_GZIP'] else 0)
+job_store = JobQueue(app.config['JOB_DB_PATH'], app.config['JOB_CHUNK_SIZE'], app.config['JOB_MAX_ATTEMPTS'],
+                     retention_seconds=app.config['JOB_RETENTION_HOURS'] * 3600,
+                     max_finished=app.config['JOB_MAX_FINISHED'])
+traffic_capture = None
+if app.config['CAPTURE_ENABLED']:
+    traffic_capture = TrafficCapture(app.config['CAPTURE_PATH'],
+                                     app.config['CAPTURE_MAX_BYTES'],
+                                     app.config['CAPTURE_BACKUPS'],
+                                     app.config['CAPTURE_SAMPLE_RATE'],
+                                     app.config['CAPTURE_SALT'])
+    atexit.register(traffic_capture.close)
+character_store = None
+if app.config['CHARACTER_STORE_ENABLED']:
+    character_store = CharacterStore(app.config['CHARACTER_STORE_PATH'],
+                                     dictionary_source=lambda: character_store_samples(),
+                                     flush_seconds=app.config['CHARACTER_STORE_FLUSH_MS'] / 1000.0,
+                                     cache_size=app.config['CHARACTER_STORE_CACHE'],
+                                     max_rows=app.config['CHARACTER_STORE_MAX_ROWS'])
+    atexit.register(character_store.close)
 # 全域變數
 app_start_time = datetime.now()
-request_count = 0
-error_count = 0
-
-# 嘗試導入真實的占星計算引擎
-try:
-    from astro_consultant import ProfessionalAstrologer
-    from dnd_character_generator import DnDCharacterGenerator
-
-    astrologer = ProfessionalAstrologer()
-    dnd_generator = DnDCharacterGenerator()
-    USE_REAL_ASTRO = True
-    ENGINE_STATUS = "Kerykeion Swiss Ephemeris v4.26.3"
-    logger.info("✅ 真實占星計算引擎載入成功")
-
-except ImportError as e:
-    logger.warning(f"⚠️ 無法載入真實占星引擎: {e}")
-    logger.info("🔄 使用備用計算方案")
-    USE_REAL_ASTRO = False
-    ENGINE_STATUS = "備用計算引擎 v1.0"
-
-    # 導入備用模組
-    import random
-    from datetime import datetime
+request_counter = AtomicCounter()
+error_counter = AtomicCounter()
+
+# 角色生成不依賴 kerykeion，永遠可用
+from dnd_character_generator import DnDCharacterGenerator
+
+dnd_generator = DnDCharacterGenerator()
+birth_time_sweeper = BirthTimeSweep(dnd_generator)
+
+# 占星引擎依精度層級登記，首次使用時才載入；exact 無法載入時降級為 fast
+engine_registry = create_default_registry()
+BACKUP_PRECISION = 'fast'
+
+def default_engine():
+    """預設精度層級實際使用的 (層級, 引擎)"""
+    return engine_registry.resolve(app.config['DEFAULT_PRECISION'])
+
+def engine_status():
+    """預設精度層級使用的引擎名稱；不觸發引擎載入，尚未載入的層級以預計使用的引擎表示"""
+    return engine_registry.label(engine_registry.expected(app.config['DEFAULT_PRECISION']))
 
 # 請求計數中間件
 @app.before_request
 def before_request():
-    global request_count
-    request_count += 1
+    request_counter.increment()
+
+    # 建立本次請求的階段計時器
+    g.timer = new_timer(app.config['SERVER_TIMING_ENABLED'] and request.path.startswith('/api/'))
+
+    # 流量擷取：被限流或削減的請求同樣屬於真實流量，於准入控制前決定
+    if traffic_capture is not None and request.endpoint == 'calculate_chart' and traffic_capture.should_capture():
+        g.capture_started = time.perf_counter()
 
     # 記錄API請求
     if request.path.startswith('/api/'):
-        logger.info(f"API請求: {request.method} {request.path} - IP: {request.remote_addr}")
+        logger.info("API請求: %s %s - IP: %s", request.method, request.path, request.remote_addr)
+
+    # 准入控制
+    if request.endpoint in RATE_LIMITED_ENDPOINTS and app.config['RATE_LIMIT_ENABLED']:
+        rejection = check_admission()
+        if rejection is not None:
+            return rejection
+
+    # 請求剖析
+    if request.endpoint in PROFILED_ENDPOINTS:
+        mode, explicit = profiling_mode()
+        if mode:
+            g.profile = RequestProfile(mode)
+            g.profile_inline = explicit
+            g.profile.start()
+
+def profiling_authorized():
+    """請求是否附上正確的剖析密鑰；未設定密鑰時一律拒絕"""
+    secret = app.config['PROFILING_SECRET']
+    provided = request.headers.get('X-Profile-Secret', '')
+    return bool(secret) and hmac.compare_digest(provided.encode('utf-8'), secret.encode('utf-8'))
+
+def profiling_mode():
+    """
+    本次請求的剖析模式：標頭指定且密鑰正確，或依設定比例抽樣
+
+    Returns:
+        (模式, 是否為明確要求)；不剖析時模式為 None
+    """
+    mode = requested_mode(request.headers.get('X-Profile'))
+    if mode and profiling_authorized():
+        return mode, True
+    rate = app.config['PROFILING_SAMPLE_RATE']
+    if rate > 0 and random.random() < rate:
+        return 'sampling', False
+    return None, False
+
+def engine_timeout():
+    """
+    真實引擎的時限：明確要求且通過密鑰驗證的剖析在本執行緒計算（0），剖析器才看得到引擎內部；
+    抽樣剖析的請求是真實流量，仍使用預設時限（None）
+    """
+    return 0 if g.get('profile_inline') else None
+
+def record_capture(status):
+    """寫入本次請求的擷取記錄；query string 的 precision 併入 body，與 calculate_chart 的解讀一致"""
+    started = g.pop('capture_started', None)
+    if started is None:
+        return
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and 'precision' not in body and 'precision' in request.args:
+        body = {**body, 'precision': request.args['precision']}
+    try:
+        traffic_capture.record(body, status, (time.perf_counter() - started) * 1000,
+                               g.pop('capture_result', None))
+    except OSError as e:
+        logger.warning("流量擷取寫入失敗: %s", e)
+
+def client_key():
+    """限流鍵：允許清單中的 API Key，否則使用客戶端 IP（任意的 X-API-Key 不能換得新的令牌桶）"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key and api_key in app.config['RATE_LIMIT_API_KEYS']:
+        return f"key:{api_key}"
+    return f"ip:{request.remote_addr}"
+
+def check_admission():
+    """
+    負載削減與令牌桶限流，拒絕時回傳錯誤回應
+    先檢查計算名額：因伺服器忙碌而被削減的請求不扣用戶端的令牌；被限流時歸還名額
+    """
+    if not admission.try_enter():
+        response = jsonify({
+            'success': False,
+            'error': '伺服器忙碌中，請稍後再試',
+            'error_code': 'SERVER_OVERLOADED',
+            'pending': admission.pending
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = retry_after_header(admission.retry_after)
+        return response
+
+    allowed, wait = rate_limiter.acquire(client_key())
+    if not allowed:
+        admission.leave()
+        response = jsonify({
+            'success': False,
+            'error': '請求過於頻繁，請稍後再試',
+            'error_code': 'RATE_LIMITED',
+            'retry_after': round(wait, 2)
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = retry_after_header(wait)
+        return response
+
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    """釋放計算名額"""
+    if g.pop('admitted', False):
+        admission.leave()
+
+@app.teardown_request
+def stop_profiling(exc):
+    """請求未經 after_request 結束時（例如未處理的例外）仍須停止剖析器"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
 
 # 錯誤處理中間件
 @app.after_request
 def after_request(response):
+    # 串流回應在此時尚未開始計算，剖析、流量擷取與階段計時改由產生器完成時結算
+    streaming = g.get('streaming', False)
+
+    # 結束剖析並保存結果
+    profile = None if streaming else g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+        response.headers['X-Profile-Id'] = profile_store.add(request.path, profile, response.status_code)
+
+    # 流量擷取
+    if 'capture_started' in g and not streaming:
+        record_capture(response.status_code)
+
     # 添加安全標頭
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY' 
     response.headers['X-XSS-Protection'] = '1; mode=block'
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
 
+    # 輸出階段計時
+    timer = g.get('timer', NULL_TIMER)
+    if timer.enabled and not streaming:
+        response.headers['Server-Timing'] = timer.server_timing_header(total=timer.elapsed())
+
     # 記錄回應狀態
     if response.status_code >= 400:
-        global error_count
-        error_count += 1
-        logger.warning(f"錯誤回應: {response.status_code} - {request.path}")
+        error_counter.increment()
+        logger.warning("錯誤回應: %s - %s", response.status_code, request.path)
 
     return response
 
 # 全域錯誤處理器
 @app.errorhandler(404)
 def not_found(error):
-    logger.warning(f"404錯誤: {request.path}")
+    logger.warning("404錯誤: %s", request.path)
     return jsonify({
         'success': False,
         'error': '請求的資源不存在',
@@ -113,7 +395,7 @@ def not_found(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"內部服務器錯誤: {str(error)}")
+    logger.error("內部服務器錯誤: %s", error)
     return jsonify({
         'success': False,
         'error': '內部服務器錯誤',
@@ -267,6 +549,73 @@ curl -X POST {{ base_url }}/api/calculate_chart \
                 <p>系統功能測試，使用預設資料測試占星計算和角色生成</p>
             </div>
 
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <strong>/api/birth_time_sweep</strong>
+                <p>出生時間不確定時使用：出生資料加上 <code>window_minutes</code>（預設 120，即 ±2 小時）與 <code>step_minutes</code>（預設 1），一次回傳上升、天頂、月亮星座、各行星宮位與 D&D 職業的變化區段，邊界時刻精確到秒</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <strong>/api/transits</strong>
+                <p>行運預測：出生資料或 <code>{"character_id": "..."}</code>，加上 <code>start</code> / <code>end</code>（YYYY-MM-DD，預設今天起 365 天）、<code>transits</code>（預設木星至冥王星）、<code>aspects</code>（預設五種主要相位）與 <code>orb</code>（預設 1 度），範圍最多 3660 天，含太陽、月亮、水星、金星或火星時最多 366 天（<code>TRANSIT_FAST_MAX_DAYS</code>），回傳每段行運相位的入相、出相與精確時刻（含是否逆行），時刻精確到秒；一年的預測在數十毫秒內完成</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <strong>/api/sessions</strong>
+                <p>建立互動工作階段（body 與 /api/calculate_chart 相同，<code>precision</code> 只能是 fast 或 approx），回傳 <code>session_id</code> 與完整文件；開啟 <code>GET /api/sessions/&lt;id&gt;/events</code>（Server-Sent Events）後，每次以 <code>PATCH /api/sessions/&lt;id&gt;</code> 只送出變動的欄位（如 <code>{"minute": 31}</code>），串流即推送只含變化欄位的 JSON Merge Patch；<code>GET</code> 取得完整文件、<code>DELETE</code> 結束工作階段，閒置 15 分鐘自動過期。工作階段保存在單一 worker 的記憶體中，多個 worker 的部署預設停用（回傳 503 <code>SESSIONS_UNAVAILABLE</code>）；每個 worker 同時開啟的串流達 <code>WHATIF_MAX_STREAMS</code> 時回傳 503 <code>TOO_MANY_STREAMS</code></p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <strong>/api/jobs</strong>
+                <p>大量生成的非同步工作：<code>{"items": [出生資料, ...], "priority": 0, "precision": "fast", "include_astro_data": false}</code>（最多 10 萬筆），回傳 202 與 <code>job_id</code>。以 <code>GET /api/jobs/&lt;id&gt;</code> 輪詢進度與吞吐量、<code>GET /api/jobs/&lt;id&gt;/events</code>（SSE）串流進度、<code>GET /api/jobs/&lt;id&gt;/results?offset=0&amp;limit=100</code> 分頁取得結果、<code>POST /api/jobs/&lt;id&gt;/cancel</code> 取消；<code>GET /api/jobs</code> 列出佇列概況。已結束的工作預設保留 7 天、最多 1000 個（JOB_RETENTION_HOURS、JOB_MAX_FINISHED），之後結果會被刪除</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <strong>/api/export</strong>
+                <p>角色欄式大量匯出（分析用）：<code>{"format": "npz", "items": [出生資料, ...]}</code> 或 <code>{"format": "csv", "sample": {"count": 10000, "start_year": 1950, "end_year": 2010}, "seed": 1}</code>，每次最多 2 萬列（<code>EXPORT_MAX_ROWS</code>）。串流回傳 NumPy <code>.npz</code>（<code>np.load(f)['characters']</code> 為結構化陣列，內含字串對照表）或 CSV；星座、宮位、職業、屬性皆為整數代碼，對照表見 <code>GET /api/export/dictionaries</code>。更大量請用 <code>python export_characters.py</code></p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <strong>/api/characters/&lt;id&gt;</strong>
+                <p>取回已生成的角色與星盤（分享連結）。<code>/api/calculate_chart</code> 的回應含 <code>character_id</code> 與 <code>metadata.permalink</code>；ID 由內容雜湊而來，同一角色永遠得到相同內容，回應可永久快取。需設定 <code>CHARACTER_STORE_ENABLED=true</code> 並將 <code>CHARACTER_STORE_PATH</code> 指向共用的可寫入磁碟，未啟用時回傳 503 且計算回應不附連結</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <strong>/api/chart/&lt;id&gt;.svg</strong>
+                <p>角色的星盤圓盤圖（SVG，上升點在左方，含宮位、行星與主要相位線）；連結見回應的 <code>metadata.chart_svg</code>，可直接放在 <code>&lt;img&gt;</code>，依星盤內容快取並可永久快取</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <strong>/api/cities?q=台</strong>
+                <p>城市自動完成（離線地名索引，支援中英文與簡繁名稱），前綴查無結果時回傳模糊比對結果</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <strong>/api/timezone?latitude=25.03&longitude=121.56</strong>
+                <p>由經緯度離線推斷 IANA 時區（最近參考城市；遠洋座標回傳 Etc/GMT 航海時區）</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="method post">POST</span>
+                <strong>/api/memory</strong>
+                <p>記憶體診斷（需 X-Profile-Secret）。GET 回傳 RSS 與 tracemalloc 配置排行；POST <code>{"action": "start" | "stop" | "baseline" | "measure"}</code> 控制追蹤或量測每次計算的配置量</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <strong>/api/profiles</strong>
+                <p>最近的請求剖析列表（需 X-Profile-Secret）。對 /api/calculate_chart 加上 <code>X-Profile: 1</code>（cProfile）或 <code>X-Profile: sample</code>（取樣）與密鑰即可剖析該請求，回應標頭 X-Profile-Id 對應 /api/profiles/&lt;id&gt;</p>
+            </div>
+
             <div class="endpoint">
                 <span class="method post">POST</span>
                 <strong>/api/calculate_chart</strong>
@@ -282,9 +631,11 @@ curl -X POST {{ base_url }}/api/calculate_chart \
   "hour": "integer",       // 必填 - 出生時間-時 (0-23)
   "minute": "integer",     // 必填 - 出生時間-分 (0-59)
   "city": "string",        // 必填 - 出生城市
-  "longitude": "float",    // 必填 - 經度 (-180 to 180)
-  "latitude": "float",     // 必填 - 緯度 (-90 to 90)
-  "timezone": "string"     // 選填 - 時區 (預設: Asia/Taipei)
+  "longitude": "float",    // 必填 - 經度 (-180 to 180)；city 可由離線地名索引解析時可省略
+  "latitude": "float",     // 必填 - 緯度 (-90 to 90)；同上
+  "timezone": "string",    // 選填 - 時區 (預設: 依城市或經緯度離線推斷)
+  "house_system": "string", // 選填 - 宮位制 placidus / porphyry / equal / whole_sign (預設: placidus)
+  "precision": "string"    // 選填 - 計算精度 exact | fast | approx (亦可用 ?precision=)
 }
                 </div>
 
@@ -328,6 +679,16 @@ curl -X POST {{ base_url }}/api/calculate_chart \
 }
                 </div>
 
+                <h4>⚡ 漸進式回應</h4>
+                <p>加上 <code>?stream=sse</code> 或 <code>?stream=ndjson</code>（或 Accept: text/event-stream / application/x-ndjson）時，每個部分完成即送出，依序合併各事件的 <code>character</code> 即為完整角色：</p>
+                <div class="code">
+{"event": "chart", "data": {"character": {"name", "birth_chart"}, "astro_data": {...}, "precision": "exact"}}
+{"event": "profile", "data": {"character": {"class", "stats", "total_stats", "rating"}}}
+{"event": "story", "data": {"character": {"background", ...}, "psychology": {...}}}
+{"event": "done", "data": {"success": true, "metadata": {...}}}
+                </div>
+                <p>串流的標頭在計算前送出，因此不帶 Server-Timing 與 X-Profile-Id；啟用時改在 done 事件的 <code>metadata.timings</code> 與 <code>metadata.profile_id</code> 提供</p>
+
                 <h4>❌ 錯誤回應</h4>
                 <div class="code">
 {
@@ -348,7 +709,7 @@ curl -X POST {{ base_url }}/api/calculate_chart \
                     <li><strong>框架:</strong> Flask 3.1.1</li>
                     <li><strong>占星引擎:</strong> Kerykeion 4.26.3 + Swiss Ephemeris</li>
                     <li><strong>CORS:</strong> ✅ 支援跨域請求</li>
-                    <li><strong>速率限制:</strong> 無限制 (建議合理使用)</li>
+                    <li><strong>速率限制:</strong> 計算端點每客戶端 {{ rate_limit_burst }} 次突發、每秒補充 {{ rate_limit_rate }} 次 (以已登記的 X-API-Key 或 IP 區分)</li>
                     <li><strong>資料格式:</strong> JSON</li>
                     <li><strong>字元編碼:</strong> UTF-8</li>
                     <li><strong>最大請求大小:</strong> 16MB</li>
@@ -363,6 +724,8 @@ curl -X POST {{ base_url }}/api/calculate_chart \
                     <li><code>INTERNAL_ERROR</code> - 內部服務器錯誤</li>
                     <li><code>RESOURCE_NOT_FOUND</code> - 請求的資源不存在</li>
                     <li><code>REQUEST_TOO_LARGE</code> - 請求資料過大</li>
+                    <li><code>RATE_LIMITED</code> - 請求過於頻繁 (HTTP 429，附 Retry-After)</li>
+                    <li><code>SERVER_OVERLOADED</code> - 伺服器忙碌中 (HTTP 503，附 Retry-After)</li>
                 </ul>
             </div>
 
@@ -379,16 +742,20 @@ curl -X POST {{ base_url }}/api/calculate_chart \
     </html>
     """
 
+    request_count = request_counter.value
+    error_count = error_counter.value
     success_rate = round(((request_count - error_count) / max(request_count, 1)) * 100, 1)
 
     return render_template_string(api_docs,
-        engine_status=ENGINE_STATUS,
+        engine_status=engine_status(),
         hours=int(hours),
         minutes=int(minutes),
         request_count=request_count,
         error_count=error_count,
         success_rate=success_rate,
         base_url=request.url_root.rstrip('/'),
+        rate_limit_rate=app.config['RATE_LIMIT_RATE'],
+        rate_limit_burst=app.config['RATE_LIMIT_BURST'],
         current_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     )
 
@@ -400,12 +767,25 @@ def health_check():
     """
     try:
         uptime_seconds = (datetime.now() - app_start_time).total_seconds()
+        request_count = request_counter.value
+        error_count = error_counter.value
 
         health_data = {
             'status': 'healthy',
             'version': '2.0.0',
-            'engine': ENGINE_STATUS,
-            'real_astro_enabled': USE_REAL_ASTRO,
+            'engine': engine_status(),
+            # 只回報已知的載入結果，不在健康檢查中載入 kerykeion；尚未嘗試載入時為 null
+            'real_astro_enabled': engine_registry.status()['exact']['available'],
+            'default_precision': app.config['DEFAULT_PRECISION'],
+            'engines': engine_registry.status(),
+            'circuit_breaker': engine_breaker.snapshot(),
+            'capture': traffic_capture.status() if traffic_capture is not None else None,
+            'gazetteer': city_index.status(),
+            'incremental': chart_states.status(),
+            'sessions': session_store.status() if session_store is not None else None,
+            'jobs': job_queue_status(),
+            'characters': character_store.status() if character_store is not None else None,
+            'chart_svg': wheel_cache.status(),
             'uptime_seconds': round(uptime_seconds),
             'request_count': request_count,
             'error_count': error_count,
@@ -422,7 +802,7 @@ def health_check():
         return jsonify(health_data)
 
     except Exception as e:
-        logger.error(f"健康檢查失敗: {str(e)}")
+        logger.error("健康檢查失敗: %s", e)
         return jsonify({
             'status': 'unhealthy',
             'error': str(e),
@@ -435,6 +815,7 @@ def calculate_chart():
     🎲 主要功能 - 計算星盤並生成D&D角色
     """
     start_time = time.time()
+    timer = g.get('timer', NULL_TIMER)
 
     try:
         # 驗證請求格式
@@ -445,7 +826,8 @@ def calculate_chart():
                 'error_code': 'INVALID_CONTENT_TYPE'
             }), 400
 
-        data = request.get_json()
+        with timer.stage('parse'):
+            data = request.get_json()
         if not data:
             return jsonify({
                 'success': False,
@@ -453,109 +835,58 @@ def calculate_chart():
                 'error_code': 'EMPTY_REQUEST'
             }), 400
 
-        # 驗證必填欄位
-        required_fields = ['name', 'year', 'month', 'day', 'hour', 'minute', 'city', 'longitude', 'latitude']
-        missing_fields = [field for field in required_fields if field not in data or data[field] is None]
+        # 精度層級可放在 body 或 query string
+        if 'precision' not in data and 'precision' in request.args:
+            data = {**data, 'precision': request.args['precision']}
 
-        if missing_fields:
+        stream_format = requested_stream_format()
+        if stream_format not in (None,) + STREAM_FORMATS:
             return jsonify({
                 'success': False,
-                'error': f'缺少必填欄位: {", ".join(missing_fields)}',
-                'error_code': 'MISSING_REQUIRED_FIELDS',
-                'missing_fields': missing_fields
+                'error': f"stream 必須是 {' 或 '.join(STREAM_FORMATS)}",
+                'error_code': 'VALIDATION_ERROR'
             }), 400
 
-        # 資料類型和範圍驗證
-        validation_errors = []
-
-        # 年份驗證
-        try:
-            year = int(data['year'])
-            if not (1900 <= year <= 2050):
-                validation_errors.append('年份必須在1900-2050之間')
-        except (ValueError, TypeError):
-            validation_errors.append('年份必須是數字')
-
-        # 月份驗證  
-        try:
-            month = int(data['month'])
-            if not (1 <= month <= 12):
-                validation_errors.append('月份必須在1-12之間')
-        except (ValueError, TypeError):
-            validation_errors.append('月份必須是數字')
-
-        # 日期驗證
-        try:
-            day = int(data['day'])
-            if not (1 <= day <= 31):
-                validation_errors.append('日期必須在1-31之間')
-        except (ValueError, TypeError):
-            validation_errors.append('日期必須是數字')
-
-        # 時間驗證
-        try:
-            hour = int(data['hour'])
-            if not (0 <= hour <= 23):
-                validation_errors.append('小時必須在0-23之間')
-        except (ValueError, TypeError):
-            validation_errors.append('小時必須是數字')
-
-        try:
-            minute = int(data['minute'])
-            if not (0 <= minute <= 59):
-                validation_errors.append('分鐘必須在0-59之間')
-        except (ValueError, TypeError):
-            validation_errors.append('分鐘必須是數字')
-
-        # 經緯度驗證
-        try:
-            longitude = float(data['longitude'])
-            if not (-180 <= longitude <= 180):
-                validation_errors.append('經度必須在-180到180之間')
-        except (ValueError, TypeError):
-            validation_errors.append('經度必須是數字')
-
-        try:
-            latitude = float(data['latitude'])
-            if not (-90 <= latitude <= 90):
-                validation_errors.append('緯度必須在-90到90之間')
-        except (ValueError, TypeError):
-            validation_errors.append('緯度必須是數字')
-
-        if validation_errors:
-            return jsonify({
-                'success': False,
-                'error': '資料驗證失敗',
-                'error_code': 'VALIDATION_ERROR',
-                'validation_errors': validation_errors
-            }), 400
+        data, location, error_response = prepare_birth_data(data, timer)
+        if error_response is not None:
+            return error_response
 
         # 執行計算
-        logger.info(f"開始為用戶 {data['name']} 計算星盤和角色")
-
-        if USE_REAL_ASTRO:
-            result = calculate_with_real_engine(data)
+        logger.info("開始為用戶 %s 計算星盤和角色", data['name'])
+
+        requested = data.get('precision') or app.config['DEFAULT_PRECISION']
+        precision, engine = engine_registry.resolve(requested)
+        degraded_reason = None if precision == requested else 'engine_unavailable'
+        if stream_format:
+            return stream_calculation(stream_format, data, location, precision, engine, degraded_reason,
+                                      start_time, timer)
+        if precision == 'exact':
+            result, degraded_reason = calculate_with_deadline(data, timer, engine_timeout())
+            if degraded_reason:
+                precision = BACKUP_PRECISION
         else:
-            result = calculate_with_backup_engine(data)
-
-        calculation_time = time.time() - start_time
+            result = calculate_with_engine(engine, data, timer)
 
         # 添加元數據
-        result['metadata'] = {
-            'calculation_time': round(calculation_time, 3),
-            'engine': ENGINE_STATUS,
-            'timestamp': datetime.now().isoformat(),
-            'request_id': f"{int(time.time())}-{hash(data['name']) % 1000:03d}"
-        }
-
-        logger.info(f"角色生成完成，用時 {calculation_time:.3f}秒")
-        return jsonify(result)
+        result['metadata'] = calculation_metadata(data, precision, start_time, result.pop('reused_stages', []),
+                                                  location, degraded_reason, timer)
+        with timer.stage('store'):
+            character_id = store_character(result['character'], result['astro_data'], precision)
+        if character_id:
+            result['character_id'] = character_id
+            result['metadata'].update(character_links(character_id))
+        if 'capture_started' in g:
+            g.capture_result = result
+
+        logger.info("角色生成完成，用時 %.3f秒", result['metadata']['calculation_time'])
+        with timer.stage('serialize'):
+            response = jsonify(result)
+        return response
 
     except Exception as e:
         calculation_time = time.time() - start_time
         error_msg = str(e)
-        logger.error(f"角色生成失敗: {error_msg}")
-        logger.error(f"錯誤詳情: {traceback.format_exc()}")
+        logger.error("角色生成失敗: %s", error_msg, exc_info=True)
 
         return jsonify({
             'success': False,
@@ -566,24 +897,348 @@ def calculate_chart():
             'timestamp': datetime.now().isoformat()
         }), 500
 
-def calculate_with_real_engine(data):
-    """使用真實占星引擎進行計算"""
+def calculation_metadata(data, precision, start_time, reused, location, degraded_reason, timer):
+    """calculate_chart 回應的 metadata（一般回應與串流的 done 事件共用）"""
+    metadata = {
+        'calculation_time': round(time.time() - start_time, 3),
+        'engine': engine_registry.label(precision),
+        'precision': precision,
+        'max_error_deg': engine_registry.spec(precision).max_error_deg,
+        'timestamp': datetime.now().isoformat(),
+        'request_id': f"{int(time.time())}-{hash(data['name']) % 1000:03d}",
+        'reused_stages': reused
+    }
+    if location:
+        metadata['location'] = location
+    if degraded_reason:
+        metadata['degraded'] = True
+        metadata['degraded_reason'] = degraded_reason
+    if timer.enabled and (app.config['SERVER_TIMING_IN_BODY'] or request.args.get('timings') == '1'):
+        metadata['timings'] = timer.as_dict()
+    return metadata
+
+# 漸進式回應格式：Server-Sent Events 或每行一個 JSON 物件
+STREAM_FORMATS = ('sse', 'ndjson')
+STREAM_MIMETYPES = {'sse': 'text/event-stream', 'ndjson': 'application/x-ndjson'}
+
+def requested_stream_format():
+    """?stream=sse|ndjson 或 Accept 標頭指定串流；未指定時回傳 None，無效值原樣回傳供呼叫端回報"""
+    stream = request.args.get('stream')
+    if stream is not None:
+        return stream.lower()
+    for stream_format, mimetype in STREAM_MIMETYPES.items():
+        if request.accept_mimetypes.best == mimetype:
+            return stream_format
+    return None
+
+def stream_calculation(stream_format, data, location, precision, engine, degraded_reason, start_time, timer):
+    """
+    漸進式回應：每個部分完成即送出，總計算量與一般回應相同
+    chart（星盤與角色摘要）→ profile（屬性、職業）→ story（背景故事、心理分析）→ done（metadata）
+    用戶端依序合併各事件的 character 即得到與一般回應相同的角色
+
+    標頭在計算前就已送出：階段計時（啟用時）與剖析 ID 放在 done 事件的 metadata，
+    流量擷取與剖析在最後一個事件送出前結算
+    """
+    def encode(event, payload):
+        if stream_format == 'sse':
+            return format_event(event, payload)
+        return json.dumps({'event': event, 'data': payload}, ensure_ascii=False) + "\n"
+
+    def finish(status, result=None):
+        """停止剖析並保存、寫入流量擷取；result 為與一般回應相同結構的計算結果"""
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.stop()
+            profile_id = profile_store.add(request.path, profile, status)
+            if result is not None:
+                result['metadata']['profile_id'] = profile_id
+        if 'capture_started' in g:
+            g.capture_result = result
+            record_capture(status)
+
+    def generate():
+        nonlocal precision, degraded_reason
+        try:
+            if precision == 'exact':
+                (chart_data, reused), degraded_reason = calculate_with_deadline(
+                    data, timer, engine_timeout(), calculate=calculate_chart_data)
+                if degraded_reason:
+                    precision = BACKUP_PRECISION
+            else:
+                chart_data, reused = calculate_chart_data(engine, data, timer)
+
+            parts = dnd_generator.iter_character_parts(chart_data, timer)
+            astro_data = {
+                'planets': chart_data['planets'],
+                'houses': chart_data['houses'],
+                'angles': chart_data['angles']
+            }
+            _, summary = next(parts)
+            yield encode('chart', {
+                'precision': precision,
+                'engine': engine_registry.label(precision),
+                'character': summary,
+                'astro_data': astro_data
+            })
+            _, profile = next(parts)
+            yield encode('profile', {'character': profile})
+            _, story = next(parts)
+            with timer.stage('psychology'):
+                psychology = chart_psychology(chart_data)
+            yield encode('story', {'character': story, 'psychology': psychology})
+            done = {
+                'success': True,
+                'metadata': calculation_metadata(data, precision, start_time, reused,
+                                                 location, degraded_reason, timer)
+            }
+            character = dnd_generator.merge_character_parts(
+                {'chart': summary, 'profile': profile, 'story': story})
+            with timer.stage('store'):
+                character_id = store_character(character, astro_data, precision)
+            if character_id:
+                done['character_id'] = character_id
+                done['metadata'].update(character_links(character_id))
+            if timer.enabled:
+                done['metadata']['timings'] = timer.as_dict()
+            finish(200, {'character': character, 'astro_data': astro_data, 'metadata': done['metadata']})
+            yield encode('done', done)
+        except Exception as e:
+            # 狀態碼已送出，改以 error 事件回報
+            logger.error("串流角色生成失敗: %s", e, exc_info=True)
+            error_counter.increment()
+            finish(500)
+            yield encode('error', {
+                'success': False,
+                'error': '角色生成過程中發生錯誤',
+                'error_code': 'CALCULATION_ERROR',
+                'details': str(e) if app.debug else '內部錯誤'
+            })
+
+    g.streaming = True
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format],
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def store_character(character, astro_data, precision):
+    """存入角色永久儲存並回傳 ID；停用或儲存無法寫入時回傳 None（回應不附分享連結）"""
+    if character_store is None:
+        return None
+    return character_store.save({'character': character, 'astro_data': astro_data, 'precision': precision})
+
+def character_links(character_id):
+    return {
+        'permalink': f"/api/characters/{character_id}",
+        'chart_svg': f"/api/chart/{character_id}.svg"
+    }
+
+def character_store_samples():
+    """
+    角色儲存壓縮字典的樣本：以備用引擎生成一年內每月一個角色（涵蓋各星座與多數職業）
+    資料庫尚無字典時由背景寫入執行緒呼叫一次
+    """
+    engine = engine_registry.get(BACKUP_PRECISION)
+    samples = []
+    for month in range(1, 13):
+        data = {**SYSTEM_TEST_DATA, 'month': month, 'hour': (month * 7) % 24}
+        chart_data = engine.calculate_natal_chart(
+            data['name'], data['year'], data['month'], data['day'], data['hour'], data['minute'],
+            data['city'], data['longitude'], data['latitude'], data['timezone'])
+        character = dnd_generator.generate_complete_character(chart_data, rng=random.Random(month))
+        samples.append(canonical_json({
+            'character': character,
+            'astro_data': {key: chart_data[key] for key in ('planets', 'houses', 'angles')},
+            'precision': BACKUP_PRECISION
+        }))
+    return samples
+
+def chart_psychology(chart_data):
+    """心理占星分析；分析文字由 Swiss Ephemeris 引擎的諮詢模組提供，無法載入時回傳 None"""
+    try:
+        astrologer = engine_registry.get('exact')
+    except EngineUnavailable:
+        return None
+    return astrologer.analyze_chart_psychology(chart_data)
+
+def prepare_birth_data(data, timer=NULL_TIMER):
+    """
+    補齊位置資訊並依出生資料結構驗證：必填欄位、型別、範圍與日曆有效性
+
+    Returns:
+        (驗證後的資料, 位置解析資訊, 錯誤回應)；驗證通過時錯誤回應為 None
+    """
+    # 只帶城市名稱時由離線地名索引補上經緯度與時區
+    with timer.stage('geocode'):
+        data, location = resolve_location(data)
+
+    with timer.stage('validate'):
+        validation = BIRTH_DATA_SCHEMA.validate(data)
+
+    if validation.missing_fields and location and location['source'] == 'unresolved' \
+            and set(validation.missing_fields) <= {'longitude', 'latitude'}:
+        return data, location, (jsonify({
+            'success': False,
+            'error': f"找不到城市「{data['city']}」，請提供經緯度或改用建議的城市名稱",
+            'error_code': 'CITY_NOT_FOUND',
+            'suggestions': location['suggestions']
+        }), 400)
+
+    if validation.missing_fields:
+        return data, location, (jsonify({
+            'success': False,
+            'error': f'缺少必填欄位: {", ".join(validation.missing_fields)}',
+            'error_code': 'MISSING_REQUIRED_FIELDS',
+            'missing_fields': validation.missing_fields,
+            'validation_errors': validation.errors
+        }), 400)
+
+    if validation.errors:
+        return data, location, (jsonify({
+            'success': False,
+            'error': '資料驗證失敗',
+            'error_code': 'VALIDATION_ERROR',
+            'validation_errors': validation.errors
+        }), 400)
+
+    return {**data, **validation.values}, location, None
+
+def resolve_location(data):
+    """
+    以離線地名索引補齊位置資訊：
+    - 缺少經緯度但有城市名稱時，補上城市座標（請求未指定時區時一併補上城市時區）
+    - 有經緯度但未指定時區時，由座標推斷時區，不再一律預設為 Asia/Taipei
+
+    Returns:
+        (補齊後的資料, 解析資訊)；不需解析時資訊為 None，查無城市時附上模糊建議
+    """
+    try:
+        if 'longitude' not in data or 'latitude' not in data:
+            city_name = data.get('city')
+            if not isinstance(city_name, str) or not city_name.strip():
+                return data, None
+            city = city_index.resolve(city_name)
+            if city is None:
+                suggestions = [c.as_dict() for c, _ in city_index.suggest(city_name)]
+                return data, {'source': 'unresolved', 'suggestions': suggestions}
+            resolved = {**data, 'longitude': city.longitude, 'latitude': city.latitude}
+            if 'timezone' not in data:
+                resolved['timezone'] = city.timezone
+            return resolved, {'source': 'gazetteer', **city.as_dict()}
+
+        if 'timezone' in data:
+            return data, None
+        try:
+            latitude, longitude = float(data['latitude']), float(data['longitude'])
+        except (TypeError, ValueError):
+            return data, None  # 交由結構驗證回報型別錯誤
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return data, None
+        guess = city_index.timezone_at(latitude, longitude)
+        return {**data, 'timezone': guess.timezone}, {'source': 'request', 'timezone_inference': guess.as_dict()}
+    except (OSError, ValueError) as e:
+        logger.warning("地名索引無法使用: %s", e)
+        return data, None
+
+def resolve_locations(items):
+    """
+    批次版的 resolve_location（批次工作與匯出使用）：同一城市名稱只查詢一次，
+    只有經緯度的項目以 timezones_at 整批推斷時區
+
+    Returns:
+        [(補齊後的資料, 解析資訊)]，與 items 一一對應；非 JSON 物件的項目為 (None, None)
+    """
+    outcomes = [(item, None) if isinstance(item, dict) else (None, None) for item in items]
+    cities = {}
+    pending = []  # 待推斷時區的 (索引, 緯度, 經度)
+    try:
+        for i, (data, _) in enumerate(outcomes):
+            if data is None:
+                continue
+            if 'longitude' not in data or 'latitude' not in data:
+                city_name = data.get('city')
+                if not isinstance(city_name, str) or not city_name.strip():
+                    continue
+                if city_name not in cities:
+                    city = city_index.resolve(city_name)
+                    suggestions = None if city else [c.as_dict() for c, _ in city_index.suggest(city_name)]
+                    cities[city_name] = city, suggestions
+                city, suggestions = cities[city_name]
+                if city is None:
+                    outcomes[i] = data, {'source': 'unresolved', 'suggestions': suggestions}
+                    continue
+                resolved = {**data, 'longitude': city.longitude, 'latitude': city.latitude}
+                if 'timezone' not in data:
+                    resolved['timezone'] = city.timezone
+                outcomes[i] = resolved, {'source': 'gazetteer', **city.as_dict()}
+            elif 'timezone' not in data:
+                try:
+                    latitude, longitude = float(data['latitude']), float(data['longitude'])
+                except (TypeError, ValueError):
+                    continue  # 交由結構驗證回報型別錯誤
+                if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                    pending.append((i, latitude, longitude))
+
+        if pending:
+            zones = city_index.timezones_at([lat for _, lat, _ in pending], [lon for _, _, lon in pending])
+            for (i, _, _), zone in zip(pending, zones):
+                outcomes[i] = {**outcomes[i][0], 'timezone': zone}, {'source': 'request', 'timezone': zone}
+    except (OSError, ValueError) as e:
+        logger.warning("地名索引無法使用: %s", e)
+    return outcomes
+
+def calculate_with_deadline(data, timer=NULL_TIMER, timeout=None, calculate=None):
+    """
+    在時限內使用真實引擎計算，逾時、引擎例外或熔斷時降級為備用引擎
+
+    Args:
+        timeout: 時限秒數，預設使用 REQUEST_DEADLINE_SECONDS；0 表示在呼叫端執行緒直接計算
+        calculate: calculate(engine, data, timer)，預設為 calculate_with_engine（星盤與角色）
+
+    Returns:
+        (結果, 降級原因)；未降級時原因為 None
+    """
+    if not engine_breaker.allow():
+        logger.warning("熔斷器開啟，直接使用備用引擎")
+        with timer.stage('backup'):
+            return calculate_with_backup_engine(data, calculate), 'circuit_open'
+
+    # 逾時後計算仍會在背景跑完，因此使用獨立的計時器，成功時才合併
+    engine_timer = StageTimer() if timer.enabled else NULL_TIMER
+    try:
+        if timeout is None:
+            timeout = app.config['REQUEST_DEADLINE_SECONDS']
+        result = deadline_runner.run(timeout, calculate_with_real_engine, data, engine_timer, calculate)
+    except DeadlineExceeded as e:
+        engine_breaker.record_failure()
+        logger.warning("真實引擎逾時，改用備用引擎: %s", e)
+        with timer.stage('backup'):
+            return calculate_with_backup_engine(data, calculate), 'deadline_exceeded'
+    except Exception as e:
+        # 引擎例外同樣計為失敗，半開狀態的試探請求才不會卡到 reset_timeout 之後
+        engine_breaker.record_failure()
+        logger.warning("真實引擎計算失敗，改用備用引擎: %s", e, exc_info=True)
+        with timer.stage('backup'):
+            return calculate_with_backup_engine(data, calculate), 'engine_error'
+
+    engine_breaker.record_success()
+    timer.merge(engine_timer)
+    return result, None
+
+def calculate_with_real_engine(data, timer=NULL_TIMER, calculate=None):
+    """使用真實占星引擎 (Swiss Ephemeris) 進行計算"""
+    return (calculate or calculate_with_engine)(engine_registry.get('exact'), data, timer)
+
+def calculate_chart_data(engine, data, timer=NULL_TIMER):
+    """只計算星盤；回傳 (星盤, 重用的階段)"""
+    chart_data, _, reused = chart_states.calculate(engine, data, timer)
+    return chart_data, reused
+
+def calculate_with_engine(engine, data, timer=NULL_TIMER):
+    """使用指定引擎計算星盤並生成角色；與最近的星盤比對，只重算輸入有變動的部分"""
     # 計算星盤
-    chart_data = astrologer.calculate_natal_chart(
-        data['name'], 
-        int(data['year']), 
-        int(data['month']), 
-        int(data['day']),
-        int(data['hour']), 
-        int(data['minute']), 
-        data['city'],
-        float(data['longitude']), 
-        float(data['latitude']), 
-        data.get('timezone', 'Asia/Taipei')
-    )
+    chart_data, reused = calculate_chart_data(engine, data, timer)
 
     # 生成D&D角色
-    character = dnd_generator.generate_complete_character(chart_data)
+    character = dnd_generator.generate_complete_character(chart_data, timer=timer)
 
     return {
         'success': True,
@@ -592,93 +1247,1161 @@ def calculate_with_real_engine(data):
             'planets': chart_data['planets'],
             'houses': chart_data['houses'],
             'angles': chart_data['angles']
-        }
+        },
+        'reused_stages': reused
     }
 
-def calculate_with_backup_engine(data):
-    """使用備用計算引擎"""
-    import random
-    
-    # 星座列表
-    ZODIAC_SIGNS = [
-        "白羊座", "金牛座", "雙子座", "巨蟹座", "獅子座", "處女座",
-        "天秤座", "天蠍座", "射手座", "摩羯座", "水瓶座", "雙魚座"
-    ]
-    
-    # 基於出生日期的基本星座判斷
-    month = int(data.get('month', 1))
-    day = int(data.get('day', 1))
-    
-    # 簡化的星座判斷
-    sun_sign_index = ((month - 1) + (day // 22)) % 12
-    sun_sign = ZODIAC_SIGNS[sun_sign_index]
-    
-    # 生成其他行星位置
-    planets = {
-        'sun': {'sign': sun_sign, 'degree': (day * 10) % 30, 'house': (month % 12) + 1},
-        'moon': {'sign': ZODIAC_SIGNS[(month + 4) % 12], 'degree': (day * 12) % 30, 'house': ((month + 4) % 12) + 1},
-        'mercury': {'sign': ZODIAC_SIGNS[(month + 1) % 12], 'degree': (day * 8) % 30, 'house': ((month + 1) % 12) + 1},
-        'venus': {'sign': ZODIAC_SIGNS[(month + 2) % 12], 'degree': (day * 15) % 30, 'house': ((month + 2) % 12) + 1},
-        'mars': {'sign': ZODIAC_SIGNS[(month + 6) % 12], 'degree': (day * 7) % 30, 'house': ((month + 6) % 12) + 1},
+def calculate_with_backup_engine(data, calculate=None):
+    """
+    使用備用計算引擎
+    以解析星曆（NumPy 向量化的 Meeus/JPL 低精度解）計算星盤，不需 kerykeion，
+    星座與宮位與 Swiss Ephemeris 幾乎一致，輸出結構與真實引擎相同
+    """
+    return (calculate or calculate_with_engine)(engine_registry.get(BACKUP_PRECISION), data)
+
+# 系統測試與 worker 預熱使用的預設資料
+SYSTEM_TEST_DATA = {
+    "name": "系統測試用戶",
+    "year": 1990,
+    "month": 6,
+    "day": 15,
+    "hour": 14,
+    "minute": 30,
+    "city": "台北",
+    "longitude": 121.55,
+    "latitude": 25.017,
+    "timezone": "Asia/Taipei"
+}
+
+def warmup():
+    """
+    預熱計算路徑
+    執行一次與 /api/test 相同的計算，載入星曆檔案、時區資料與各層快取，
+    讓 worker 的第一個真實請求不必承擔冷啟動成本
+
+    Returns:
+        預熱耗時（秒）
+    """
+    start_time = time.time()
+    calculate_with_engine(default_engine()[1], dict(SYSTEM_TEST_DATA))
+    return time.time() - start_time
+
+@app.route('/api/birth_time_sweep', methods=['POST'])
+def birth_time_sweep():
+    """
+    ⏱️ 出生時間敏感度掃描
+    出生資料加上 window_minutes（預設 ±120 分鐘）與 step_minutes（預設 1），
+    回傳上升、天頂、月亮星座、各行星宮位與職業在時間窗內的變化區段與精確邊界時刻；
+    以解析星曆向量化計算，precision 為 exact 時改用 fast
+    """
+    start_time = time.time()
+    timer = g.get('timer', NULL_TIMER)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({
+            'success': False,
+            'error': '請求必須是非空的JSON物件',
+            'error_code': 'INVALID_CONTENT_TYPE'
+        }), 400
+
+    # 掃描不產生角色，姓名與城市名稱可省略
+    data = {'name': '', 'city': '', **data}
+    with timer.stage('geocode'):
+        data, location = resolve_location(data)
+    with timer.stage('validate'):
+        validation = BIRTH_DATA_SCHEMA.validate(data)
+    if validation.missing_fields:
+        return jsonify({
+            'success': False,
+            'error': f'缺少必填欄位: {", ".join(validation.missing_fields)}',
+            'error_code': 'MISSING_REQUIRED_FIELDS',
+            'missing_fields': validation.missing_fields,
+            'validation_errors': validation.errors
+        }), 400
+
+    errors = list(validation.errors)
+    try:
+        window_minutes = int(data.get('window_minutes', 120))
+        step_minutes = int(data.get('step_minutes', 1))
+    except (TypeError, ValueError):
+        errors.append('window_minutes 與 step_minutes 必須是整數')
+    if errors:
+        return jsonify({
+            'success': False,
+            'error': '資料驗證失敗',
+            'error_code': 'VALIDATION_ERROR',
+            'validation_errors': errors
+        }), 400
+
+    values = validation.values
+    precision = values.get('precision') or app.config['DEFAULT_PRECISION']
+    if precision == 'exact':
+        precision = BACKUP_PRECISION
+    try:
+        with timer.stage('sweep'):
+            result = birth_time_sweeper.sweep(
+                values['year'], values['month'], values['day'], values['hour'], values['minute'],
+                values['latitude'], values['longitude'], values['timezone'],
+                window_minutes, step_minutes, precision, values['house_system'])
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+
+    result['metadata'] = {
+        'calculation_time': round(time.time() - start_time, 3),
+        'engine': engine_registry.label(precision),
+        'precision': precision,
+        'max_error_deg': engine_registry.spec(precision).max_error_deg,
+        'window_minutes': window_minutes,
+        'step_minutes': step_minutes,
+        'timezone': values['timezone'],
     }
-    
-    # D&D職業選擇
-    dnd_classes = [
-        {"name": "聖騎士", "description": "正義的化身，以神聖之力守護盟友", "match_score": 0.85},
-        {"name": "法師", "description": "精通奧術的智者，操縱元素之力", "match_score": 0.82},
-        {"name": "盜賊", "description": "靈活的冒險家，擅長潛行與詭計", "match_score": 0.78},
-        {"name": "牧師", "description": "虔誠的治療者，神力的代行者", "match_score": 0.80},
-    ]
-    
-    # 基於星座選擇職業
-    class_choice = dnd_classes[sun_sign_index % len(dnd_classes)]
-    
-    # 屬性生成
-    stats = {}
-    for stat in ['strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma']:
-        base_value = 8 + (hash(f"{stat}{data.get('name', 'default')}{month}{day}") % 11)
-        stats[stat] = base_value
-    
-    total_stats = sum(stats.values())
-    
-    # 評級
-    if total_stats >= 100:
-        rating = "SS"
-    elif total_stats >= 90:
-        rating = "S"
-    elif total_stats >= 80:
-        rating = "A"
-    elif total_stats >= 70:
-        rating = "B"
-    elif total_stats >= 60:
-        rating = "C"
+    if location:
+        result['metadata']['location'] = location
+    with timer.stage('serialize'):
+        return jsonify({'success': True, **result})
+
+# 只帶 character_id 時另外指定的輸出時區，與出生資料的時區欄位使用相同檢查
+TIMEZONE_FIELD = next(field for field in BIRTH_DATA_FIELDS if field.name == 'timezone')
+
+def transit_range(data, timezone, bodies):
+    """
+    行運預測的日期範圍：start（預設今天）至 end（含當日）或 start 起 days 天，皆為 timezone 的當地日期
+    行運天體含快速天體時範圍上限為 TRANSIT_FAST_MAX_DAYS
+
+    Returns:
+        (開始儒略日, 結束儒略日, 天數, 錯誤清單)
+    """
+    errors = []
+    try:
+        start = date.fromisoformat(data['start']) if 'start' in data \
+            else datetime.now(timezone_info(timezone)).date()
+    except (TypeError, ValueError):
+        return None, None, 0, ['start 必須是 YYYY-MM-DD 格式的日期']
+    try:
+        if 'end' in data:
+            end = date.fromisoformat(data['end']) + timedelta(days=1)
+        else:
+            end = start + timedelta(days=int(data.get('days', app.config['TRANSIT_DEFAULT_DAYS'])))
+    except (TypeError, ValueError, OverflowError):
+        return None, None, 0, ['end 必須是 YYYY-MM-DD 格式的日期，days 必須是整數']
+    days = (end - start).days
+    fast = [key for key in bodies if key in FAST_BODIES]
+    max_days = app.config['TRANSIT_MAX_DAYS']
+    if fast:
+        max_days = min(max_days, app.config['TRANSIT_FAST_MAX_DAYS'])
+    if not 1 <= days <= max_days:
+        errors.append(f"日期範圍必須在 1-{max_days} 天之間"
+                      + (f"（行運天體含{'、'.join(point_name(key) for key in fast)}）" if fast else ''))
+        return None, None, days, errors
+    start_jd = local_julian_day(start.year, start.month, start.day, 0, 0, timezone)
+    end_jd = local_julian_day(end.year, end.month, end.day, 0, 0, timezone)
+    return start_jd, end_jd, days, errors
+
+@app.route('/api/transits', methods=['POST'])
+def forecast_transits():
+    """
+    🔭 行運預測
+    本命盤（出生資料，或已儲存角色的 character_id）加上日期範圍，回傳行運天體對本命點的每個相位：
+    入相、出相與精確時刻（秒級）。整個範圍以解析星曆向量化取樣後一起二分收斂，precision 為 exact 時改用 fast
+    """
+    start_time = time.time()
+    timer = g.get('timer', NULL_TIMER)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({
+            'success': False,
+            'error': '請求必須是非空的JSON物件',
+            'error_code': 'INVALID_CONTENT_TYPE'
+        }), 400
+
+    location = None
+    if 'character_id' in data:
+        character_id = str(data['character_id'])
+        error_response = check_character_id(character_id)
+        if error_response is not None:
+            return error_response
+        payload, error_response = read_character(character_id)
+        if error_response is not None:
+            return error_response
+        natal = natal_from_astro_data(payload['astro_data'])
+        natal_info = {'source': 'character', 'character_id': character_id}
+        # 儲存的角色不含出生地，輸出時間預設為 UTC
+        timezone = data.get('timezone') or 'UTC'
+        precision = data.get('precision') or payload.get('precision') or app.config['DEFAULT_PRECISION']
+        errors = [] if isinstance(timezone, str) and known_timezone(timezone) else [TIMEZONE_FIELD.range_message]
     else:
-        rating = "D"
-    
-    # 背景故事
-    name = data.get('name', '冒險者')
-    background = f"{name}是一位{class_choice['name']}，{class_choice['description']}。出生在{sun_sign}的影響下，展現出獨特的個性特質。從小就對冒險充滿渴望，踏上了成為英雄的道路。"
-    
-    return {
-        'success': True,
-        'character': {
-            'name': name,
-            'class': class_choice,
-            'stats': stats,
-            'total_stats': total_stats,
-            'rating': rating,
-            'background': background,
-            'birth_chart': {
-                'sun': f"{planets['sun']['sign']} 第{planets['sun']['house']}宮",
-                'moon': f"{planets['moon']['sign']} 第{planets['moon']['house']}宮",
-                'ascendant': ZODIAC_SIGNS[month % 12]
-            }
-        },
+        # 預測不產生角色，姓名與城市名稱可省略
+        data = {'name': '', 'city': '', **data}
+        with timer.stage('geocode'):
+            data, location = resolve_location(data)
+        with timer.stage('validate'):
+            validation = BIRTH_DATA_SCHEMA.validate(data)
+        if validation.missing_fields:
+            return jsonify({
+                'success': False,
+                'error': f'缺少必填欄位: {", ".join(validation.missing_fields)}（或提供 character_id）',
+                'error_code': 'MISSING_REQUIRED_FIELDS',
+                'missing_fields': validation.missing_fields,
+                'validation_errors': validation.errors
+            }), 400
+        values = validation.values
+        natal, natal_info = None, {'source': 'birth_data'}
+        timezone = values.get('timezone')  # 驗證失敗時可能缺少，下方先回報錯誤
+        precision = values.get('precision') or app.config['DEFAULT_PRECISION']
+        errors = list(validation.errors)
+
+    if precision == 'exact':
+        precision = BACKUP_PRECISION
+    bodies = data.get('transits', list(DEFAULT_TRANSIT_BODIES))
+    aspects = data.get('aspects', list(ASPECTS))
+    if not isinstance(bodies, list) or not all(isinstance(key, str) for key in bodies):
+        errors.append('transits 必須是天體名稱的陣列')
+    if not isinstance(aspects, list) or not all(isinstance(key, str) for key in aspects):
+        errors.append('aspects 必須是相位名稱的陣列')
+    try:
+        orb = float(data.get('orb', DEFAULT_ORB))
+    except (TypeError, ValueError):
+        errors.append('orb 必須是數字')
+    if not errors:
+        start_jd, end_jd, days, range_errors = transit_range(data, timezone, bodies)
+        errors.extend(range_errors)
+    if errors:
+        return jsonify({
+            'success': False,
+            'error': '資料驗證失敗',
+            'error_code': 'VALIDATION_ERROR',
+            'validation_errors': errors
+        }), 400
+
+    try:
+        with timer.stage('transits'):
+            if natal is None:
+                if precision not in PRECISION_LEVELS:
+                    raise ValueError(f"未知的精度層級: {precision}")
+                jd = local_julian_day(values['year'], values['month'], values['day'],
+                                      values['hour'], values['minute'], timezone)
+                natal = natal_from_arrays(compute_chart_arrays(jd, values['latitude'], values['longitude'],
+                                                               precision, values['house_system']))
+            tz = timezone_info(timezone)
+            result = transit_forecast(natal, start_jd, end_jd, bodies, aspects, orb, precision, tz)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+
+    natal_info['longitudes'] = {key: round(value, 2) for key, value in natal.items()}
+    result['metadata'] = {
+        'calculation_time': round(time.time() - start_time, 3),
+        'engine': engine_registry.label(precision),
+        'precision': precision,
+        'max_error_deg': engine_registry.spec(precision).max_error_deg,
+        'days': days,
+        'orb': orb,
+        'transits': bodies,
+        'aspects': aspects,
+        'timezone': timezone if tz is not None else 'UTC',
+    }
+    if location:
+        result['metadata']['location'] = location
+    with timer.stage('serialize'):
+        return jsonify({'success': True, 'natal': natal_info, **result})
+
+# 工作階段可修改的欄位：出生資料結構中的全部欄位
+SESSION_FIELDS = tuple(field.name for field in BIRTH_DATA_FIELDS)
+
+# 工作階段只使用解析引擎：每次拖動都重算，exact 不經時限與熔斷器保護
+SESSION_PRECISIONS = ('fast', 'approx')
+
+def session_precision_error(values):
+    """工作階段的精度不是解析引擎層級時回傳錯誤回應，否則回傳 None"""
+    precision = values.get('precision') or app.config['WHATIF_PRECISION']
+    if precision in SESSION_PRECISIONS:
+        return None
+    return jsonify({
+        'success': False,
+        'error': f"互動工作階段的 precision 必須是 {' 或 '.join(SESSION_PRECISIONS)}",
+        'error_code': 'VALIDATION_ERROR'
+    }), 400
+
+def whatif_compute(data, base, rng):
+    """工作階段的重算：以上一版的星盤狀態為基準增量計算，屬性使用工作階段固定的亂數"""
+    precision, engine = engine_registry.resolve(data.get('precision') or app.config['WHATIF_PRECISION'])
+    chart_data, state, reused = chart_states.calculate(engine, data, base=base)
+    character = dnd_generator.generate_complete_character(chart_data, rng=rng)
+    document = {
+        'input': {key: data[key] for key in SESSION_FIELDS if key in data},
+        'precision': precision,
+        'character': character,
         'astro_data': {
-            'planets': planets,
-            'houses': {f'house_{i}': ZODIAC_SIGNS[(i-1) % 12] for i in range(1, 13)}
+            'planets': chart_data['planets'],
+            'houses': chart_data['houses'],
+            'angles': chart_data['angles']
         }
     }
+    return document, state, reused
+
+session_store = None
+if app.config['WHATIF_ENABLED']:
+    session_store = SessionStore(whatif_compute,
+                                 app.config['WHATIF_MAX_SESSIONS'],
+                                 int(app.config['WHATIF_MEMORY_MB'] * 1024 * 1024),
+                                 app.config['WHATIF_IDLE_SECONDS'],
+                                 app.config['WHATIF_QUEUE_SIZE'],
+                                 app.config['WHATIF_MAX_STREAMS'])
+
+def session_not_found(session_id):
+    return jsonify({
+        'success': False,
+        'error': f'找不到工作階段 {session_id}，可能已過期',
+        'error_code': 'SESSION_NOT_FOUND'
+    }), 404
+
+def sessions_unavailable():
+    return jsonify({
+        'success': False,
+        'error': '互動工作階段未啟用（需單一 worker 部署）',
+        'error_code': 'SESSIONS_UNAVAILABLE'
+    }), 503
+
+def find_session(session_id):
+    """
+    取得工作階段
+
+    Returns:
+        (工作階段, 錯誤回應)；工作階段停用或已過期時工作階段為 None
+    """
+    if session_store is None:
+        return None, sessions_unavailable()
+    session = session_store.get(session_id)
+    if session is None:
+        return None, session_not_found(session_id)
+    return session, None
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """
+    🎚️ 建立互動工作階段
+    body 與 /api/calculate_chart 相同（precision 只能是 fast 或 approx）；回傳完整文件與 SSE 串流網址，
+    之後以 PATCH /api/sessions/<id> 送出變動的欄位，串流推送 JSON Merge Patch
+    """
+    if session_store is None:
+        return sessions_unavailable()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({
+            'success': False,
+            'error': '請求必須是非空的JSON物件',
+            'error_code': 'INVALID_CONTENT_TYPE'
+        }), 400
+
+    inputs = {key: data[key] for key in SESSION_FIELDS if key in data}
+    values, location, error_response = prepare_birth_data(inputs, g.get('timer', NULL_TIMER))
+    if error_response is None:
+        error_response = session_precision_error(values)
+    if error_response is not None:
+        return error_response
+
+    session = session_store.create(values, inputs)
+    response = {
+        'success': True,
+        'session_id': session.id,
+        'seq': session.seq,
+        'document': session.document,
+        'events_url': f'/api/sessions/{session.id}/events',
+        'idle_seconds': session_store.idle_seconds
+    }
+    if location:
+        response['location'] = location
+    return jsonify(response), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """🎚️ 取得工作階段的完整文件（收到 resync 事件或重新連線時使用）"""
+    session, error_response = find_session(session_id)
+    if error_response is not None:
+        return error_response
+    with session.lock:
+        return jsonify({'success': True, 'session_id': session.id, 'seq': session.seq,
+                        'document': session.document})
+
+@app.route('/api/sessions/<session_id>', methods=['PATCH'])
+def update_session(session_id):
+    """
+    🎚️ 以變動的欄位更新工作階段
+    只需送出變動的欄位（例如 {"minute": 31}）；改城市而未帶經緯度時重新查詢城市座標，
+    未明確指定的時區隨位置重新推斷。回應只含序號與重用的階段，內容由 SSE 串流推送
+    """
+    session, error_response = find_session(session_id)
+    if error_response is not None:
+        return error_response
+
+    delta = request.get_json(silent=True)
+    unknown = sorted(set(delta) - set(SESSION_FIELDS)) if isinstance(delta, dict) else None
+    if not isinstance(delta, dict) or not delta or unknown:
+        return jsonify({
+            'success': False,
+            'error': f'不支援的欄位: {", ".join(unknown)}' if unknown else '請求必須是非空的JSON物件',
+            'error_code': 'VALIDATION_ERROR' if unknown else 'INVALID_CONTENT_TYPE'
+        }), 400
+
+    inputs = {**session.inputs, **delta}
+    if 'city' in delta and not {'longitude', 'latitude'} & set(delta):
+        inputs.pop('longitude', None)
+        inputs.pop('latitude', None)
+    values, _, error_response = prepare_birth_data(inputs, g.get('timer', NULL_TIMER))
+    if error_response is None:
+        error_response = session_precision_error(values)
+    if error_response is not None:
+        return error_response
+
+    try:
+        seq, patch, reused = session_store.update(session, values, inputs)
+    except SessionClosed:
+        return session_not_found(session_id)
+    return jsonify({'success': True, 'seq': seq, 'changed': patch is not None, 'reused_stages': reused})
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """🎚️ 結束工作階段，開啟中的串流收到 closed 事件"""
+    _, error_response = find_session(session_id)
+    if error_response is not None:
+        return error_response
+    if not session_store.close(session_id):
+        return session_not_found(session_id)
+    return jsonify({'success': True, 'session_id': session_id})
+
+@app.route('/api/sessions/<session_id>/events')
+def session_events(session_id):
+    """
+    📡 工作階段的 Server-Sent Events 串流
+    先送出 snapshot（完整文件），之後每次更新送出 patch（JSON Merge Patch）；
+    用戶端消費太慢時送出 resync，工作階段結束時送出 closed
+    每個串流佔用一個 worker 執行緒，開啟中的串流達 WHATIF_MAX_STREAMS 時拒絕，保留執行緒給計算請求
+    """
+    session, error_response = find_session(session_id)
+    if error_response is not None:
+        return error_response
+    if not session_store.try_open_stream():
+        return jsonify({
+            'success': False,
+            'error': '開啟中的串流過多，請稍後再試',
+            'error_code': 'TOO_MANY_STREAMS'
+        }), 503
+    response = Response(stream_with_context(session_store.stream(session)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # 由回應關閉時歸還名額：用戶端斷線或產生器從未開始執行時也會呼叫
+    response.call_on_close(session_store.release_stream)
+    return response
+
+def validate_birth_items(items):
+    """
+    驗證批次處理中的出生資料（以 resolve_locations 整批補上經緯度與時區），整批以 validate_columns 向量化驗證
+
+    Returns:
+        [(驗證後的資料, 錯誤訊息)]，與 items 一一對應；通過時錯誤訊息為 None
+    """
+    resolved = resolve_locations(items)
+    rows = [data for data, _ in resolved if data is not None]
+    validation = BIRTH_DATA_SCHEMA.validate_columns(
+        {field.name: [data.get(field.name) for data in rows] for field in BIRTH_DATA_FIELDS})
+    outcomes = []
+    row = -1
+    for data, location in resolved:
+        if data is None:
+            outcomes.append((None, '項目必須是JSON物件'))
+            continue
+        row += 1
+        missing, errors = validation.missing_fields.get(row), validation.errors.get(row)
+        if missing and location and location['source'] == 'unresolved':
+            outcomes.append((None, f"找不到城市「{data['city']}」"))
+        elif missing:
+            outcomes.append((None, f'缺少必填欄位: {", ".join(missing)}'))
+        elif errors:
+            outcomes.append((None, '; '.join(errors)))
+        else:
+            outcomes.append(({**data, **validation.values(row)}, None))
+    return outcomes
+
+def process_job_items(items, options):
+    """
+    工作佇列的處理函式：逐筆驗證並計算星盤與角色
+    單筆驗證失敗記為該項目的錯誤；計算過程的例外讓整個區塊重試
+
+    Returns:
+        [(結果, 錯誤)]，與 items 一一對應
+    """
+    precision, engine = engine_registry.resolve(options.get('precision') or app.config['JOB_DEFAULT_PRECISION'])
+    outcomes = []
+    for data, error in validate_birth_items(items):
+        if error:
+            outcomes.append((None, error))
+            continue
+        result = calculate_with_engine(engine, data)
+        del result['success'], result['reused_stages']
+        if not options.get('include_astro_data'):
+            del result['astro_data']
+        result['precision'] = precision
+        outcomes.append((result, None))
+    return outcomes
+
+def run_job_worker():
+    """工作處理程序進入點：收到 SIGTERM 時處理完目前的區塊後結束"""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    logger.info("工作處理程序 %s 啟動: %s", os.getpid(), app.config['JOB_DB_PATH'])
+    JobWorker(job_store, process_job_items).run(stop)
+
+def start_job_workers(count=None):
+    """啟動工作處理程序池；count 預設為 JOB_WORKER_PROCESSES，0 時不啟動並回傳 None"""
+    count = app.config['JOB_WORKER_PROCESSES'] if count is None else count
+    if count <= 0:
+        return None
+    pool = WorkerPool(run_job_worker, count)
+    pool.start()
+    return pool
+
+def job_queue_status():
+    try:
+        return job_store.status()
+    except (sqlite3.Error, OSError) as e:
+        return {'available': False, 'error': str(e)}
+
+def job_queue_unavailable(error):
+    logger.error("工作佇列無法使用: %s", error)
+    return jsonify({
+        'success': False,
+        'error': '工作佇列暫時無法使用',
+        'error_code': 'JOB_QUEUE_UNAVAILABLE'
+    }), 503
+
+def job_not_found(job_id):
+    return jsonify({
+        'success': False,
+        'error': f'找不到工作 {job_id}',
+        'error_code': 'JOB_NOT_FOUND'
+    }), 404
+
+def job_links(job_id):
+    return {
+        'status_url': f'/api/jobs/{job_id}',
+        'results_url': f'/api/jobs/{job_id}/results',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    📦 提交非同步生成工作
+    body: {"items": [出生資料, ...], "priority": 0, "precision": "fast", "include_astro_data": false}
+    每筆出生資料格式與 /api/calculate_chart 相同；回傳 202 與查詢進度、結果的網址
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    errors = []
+    if not isinstance(items, list) or not items:
+        errors.append('items 必須是非空的陣列')
+    elif len(items) > app.config['JOB_MAX_ITEMS']:
+        errors.append(f"items 最多 {app.config['JOB_MAX_ITEMS']} 筆")
+    priority = data.get('priority', 0) if isinstance(data, dict) else 0
+    if not isinstance(priority, int) or isinstance(priority, bool) or abs(priority) > MAX_PRIORITY:
+        errors.append(f'priority 必須是 -{MAX_PRIORITY} 到 {MAX_PRIORITY} 之間的整數')
+    precision = data.get('precision') if isinstance(data, dict) else None
+    if precision is not None and precision not in engine_registry.tiers:
+        errors.append(f"precision 必須是 {'、'.join(engine_registry.tiers)}")
+    if errors:
+        return jsonify({
+            'success': False,
+            'error': '資料驗證失敗',
+            'error_code': 'VALIDATION_ERROR',
+            'validation_errors': errors
+        }), 400
+
+    options = {'include_astro_data': bool(data.get('include_astro_data', False))}
+    if precision is not None:
+        options['precision'] = precision
+    try:
+        job = job_store.submit(items, priority, options)
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+    logger.info("工作 %s 已提交: %d 筆，優先度 %d", job['job_id'], job['total'], priority)
+    return jsonify({'success': True, 'job': job, **job_links(job['job_id'])}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """📦 工作佇列概況與最近的工作（?status=running&limit=20）"""
+    status = request.args.get('status')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    try:
+        return jsonify({
+            'success': True,
+            'queue': job_store.status(),
+            'jobs': job_store.list(limit, status)
+        })
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """📦 工作進度與吞吐量統計"""
+    try:
+        job = job_store.get(job_id)
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify({'success': True, 'job': job, **job_links(job_id)})
+
+@app.route('/api/jobs/<job_id>/results')
+def get_job_results(job_id):
+    """📦 依序分頁取得結果（?offset=0&limit=100，limit 最多 1000）；尚未處理的項目 status 為 pending"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    try:
+        job = job_store.get(job_id)
+        if job is None:
+            return job_not_found(job_id)
+        results = job_store.results(job_id, offset, limit)
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+    next_offset = offset + len(results)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'offset': offset,
+        'results': results,
+        'next_offset': next_offset if next_offset < job['total'] else None
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """📦 取消工作；尚未處理的項目不再執行，已完成的結果保留"""
+    try:
+        job = job_store.cancel(job_id)
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+    if job is None:
+        return job_not_found(job_id)
+    if job['status'] != 'cancelled':
+        return jsonify({
+            'success': False,
+            'error': f"工作已結束（{job['status']}），無法取消",
+            'error_code': 'JOB_ALREADY_FINISHED',
+            'job': job
+        }), 409
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    📡 工作進度的 Server-Sent Events 串流
+    進度有變化時送出 progress，工作結束時送出 done 並關閉連線
+    """
+    try:
+        job = job_store.get(job_id)
+    except (sqlite3.Error, OSError) as e:
+        return job_queue_unavailable(e)
+    if job is None:
+        return job_not_found(job_id)
+
+    def generate(job):
+        last_sent = time.monotonic()
+        if job['status'] not in TERMINAL_STATUSES:
+            yield format_event('progress', job)
+        while job['status'] not in TERMINAL_STATUSES:
+            time.sleep(1.0)
+            current = job_store.get(job_id)
+            if (current['processed'], current['status']) != (job['processed'], job['status']):
+                job, last_sent = current, time.monotonic()
+                if job['status'] not in TERMINAL_STATUSES:
+                    yield format_event('progress', job)
+            elif time.monotonic() - last_sent >= 15:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+        yield format_event('done', job)
+
+    return Response(stream_with_context(generate(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 合成出生資料的年份範圍與出生資料結構相同
+YEAR_FIELD = next(field for field in BIRTH_DATA_FIELDS if field.name == 'year')
+
+def export_errors(data):
+    """
+    驗證欄式匯出請求
+
+    Returns:
+        (選項, 已驗證的出生資料（sample 時為 None）, 錯誤清單, 各項目的錯誤)
+    """
+    errors = []
+    options = {
+        'format': data.get('format', 'npz'),
+        'precision': data.get('precision', BACKUP_PRECISION),
+        'house_system': data.get('house_system', 'placidus'),
+        'seed': data.get('seed'),
+    }
+    if options['format'] not in EXPORT_FORMATS:
+        errors.append(f"format 必須是 {' 或 '.join(EXPORT_FORMATS)}")
+    if options['precision'] not in PRECISION_LEVELS:
+        errors.append(f"precision 必須是 {'、'.join(PRECISION_LEVELS)}（欄式匯出以解析星曆計算）")
+    if options['house_system'] not in HOUSE_SYSTEMS:
+        errors.append(f"house_system 必須是 {'、'.join(HOUSE_SYSTEMS)}")
+    seed = options['seed']
+    if seed is None:
+        options['seed'] = int.from_bytes(os.urandom(4), 'little')
+    elif not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        errors.append('seed 必須是非負整數')
+
+    items, sample = data.get('items'), data.get('sample')
+    max_rows = app.config['EXPORT_MAX_ROWS']
+    if (items is None) == (sample is None):
+        errors.append('items 與 sample 需擇一提供')
+        return options, None, errors, []
+    if items is not None:
+        if not isinstance(items, list) or not items:
+            errors.append('items 必須是非空的陣列')
+        elif len(items) > max_rows:
+            errors.append(f'items 最多 {max_rows} 筆')
+        if errors:
+            return options, None, errors, []
+        births, item_errors = [], []
+        for index, (values, error) in enumerate(validate_birth_items(items)):
+            if error:
+                item_errors.append({'index': index, 'error': error})
+            births.append(values)
+        options['rows'] = len(births)
+        return options, births, errors, item_errors
+
+    if not isinstance(sample, dict):
+        return options, None, errors + ['sample 必須是JSON物件'], []
+    count = sample.get('count')
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= max_rows:
+        errors.append(f'sample.count 必須是 1-{max_rows} 之間的整數')
+    start_year, end_year = sample.get('start_year', 1950), sample.get('end_year', 2010)
+    if not all(isinstance(y, int) and not isinstance(y, bool) and YEAR_FIELD.min <= y <= YEAR_FIELD.max
+               for y in (start_year, end_year)) or start_year > end_year:
+        errors.append(f'sample.start_year 與 end_year 必須在 {YEAR_FIELD.min}-{YEAR_FIELD.max} 之間且起始不晚於結束')
+    options.update(rows=count, start_year=start_year, end_year=end_year)
+    return options, None, errors, []
+
+@app.route('/api/export', methods=['POST'])
+def export_characters():
+    """
+    📊 角色欄式大量匯出
+    body: {"format": "npz" | "csv", "items": [出生資料, ...]} 或 {"sample": {"count": 100000, "start_year": 1950, "end_year": 2010}}
+    選填 precision（fast / approx）、house_system、seed；回應為逐區塊串流產生的 .npz 或 CSV，
+    星座、宮位、職業、屬性皆為整數代碼，對照表在 .npz 內或 /api/export/dictionaries
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({
+            'success': False,
+            'error': '請求必須是JSON物件',
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+    options, births, errors, item_errors = export_errors(data)
+    if errors or item_errors:
+        return jsonify({
+            'success': False,
+            'error': '資料驗證失敗',
+            'error_code': 'VALIDATION_ERROR',
+            'validation_errors': errors,
+            # 欄式輸出的列與輸入一一對應，任一項目無效即拒絕整批
+            'item_errors': item_errors[:20],
+            'invalid_items': len(item_errors)
+        }), 400
+
+    builder = ColumnarCharacters(dnd_generator, options['precision'], options['house_system'])
+    rows, seed, chunk_rows = options['rows'], options['seed'], app.config['EXPORT_CHUNK_ROWS']
+
+    def chunks():
+        for index, start in enumerate(range(0, rows, chunk_rows)):
+            rng = chunk_rng(seed, index)
+            size = min(chunk_rows, rows - start)
+            if births is not None:
+                columns = birth_columns(births[start:start + size])
+            else:
+                columns = sample_births(size, rng, options['start_year'], options['end_year'])
+            yield builder.build(columns, rng)
+
+    def generate(body):
+        try:
+            yield from body
+        except Exception as e:
+            # 狀態碼已送出，只能中斷輸出；不完整的檔案在用戶端載入時會失敗
+            logger.error("欄式匯出失敗: %s", e, exc_info=True)
+            error_counter.increment()
+
+    metadata = {
+        'rows': rows,
+        'seed': seed,
+        'chunk_rows': chunk_rows,
+        'precision': options['precision'],
+        'house_system': options['house_system'],
+        'source': 'items' if births is not None else 'sample',
+        'generated': datetime.now().isoformat(),
+    }
+    if options['format'] == 'npz':
+        body, mimetype = iter_npz(chunks(), rows, builder.dictionaries(), metadata), 'application/octet-stream'
+    else:
+        body, mimetype = iter_csv(chunks()), 'text/csv'
+    logger.info("開始欄式匯出 %s 列 (%s)", rows, options['format'])
+    return Response(stream_with_context(generate(body)), mimetype=mimetype, headers={
+        'Content-Disposition': f"attachment; filename=characters.{options['format']}",
+        'X-Export-Rows': str(rows),
+        'X-Export-Seed': str(seed),
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/export/dictionaries')
+def export_dictionaries():
+    """
+    📖 欄式匯出的整數代碼對照表與 CSV 欄位
+    """
+    response = jsonify({
+        'success': True,
+        'dictionaries': ColumnarCharacters(dnd_generator).dictionaries(),
+        'csv_columns': csv_columns()
+    })
+    # 對照表只隨部署改變
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@app.route('/api/characters/<character_id>')
+def get_character(character_id):
+    """
+    🔗 取回已儲存的角色
+    ID 由 calculate_chart 回應的 character_id（metadata.permalink）取得；內容以雜湊定址、永不改變，可長期快取
+    """
+    error_response = check_character_id(character_id)
+    if error_response is not None:
+        return error_response
+    # 相同 ID 的內容必定相同，ETag 相符時只確認角色仍存在（可能已被清除），不必讀取內容
+    if character_id in request.if_none_match:
+        error_response = character_exists(character_id)
+        if error_response is not None:
+            return error_response
+        response = Response(status=304)
+    else:
+        payload, error_response = read_character(character_id)
+        if error_response is not None:
+            return error_response
+        response = jsonify({'success': True, 'character_id': character_id, **payload})
+    response.set_etag(character_id)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/chart/<character_id>.svg')
+def chart_svg(character_id):
+    """
+    🖼️ 星盤圓盤圖（SVG）
+    ID 同 /api/characters/<id>（calculate_chart 回應的 metadata.chart_svg）；
+    依星盤內容快取，用戶端接受 gzip 時直接送出預先壓縮的版本
+    """
+    error_response = check_character_id(character_id)
+    if error_response is not None:
+        return error_response
+    # gzip 與未壓縮兩種表示共用弱 ETag；繪圖版本改變時 ETag 隨之改變
+    etag = f"{character_id}-w{RENDERER_VERSION}"
+    if request.if_none_match.contains_weak(etag):
+        error_response = character_exists(character_id)
+        if error_response is not None:
+            return error_response
+        response = Response(status=304)
+    else:
+        payload, error_response = read_character(character_id)
+        if error_response is not None:
+            return error_response
+        _, svg, compressed = wheel_cache.get(payload['astro_data'])
+        if compressed is not None and 'gzip' in request.accept_encodings:
+            response = Response(compressed, mimetype='image/svg+xml')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(svg, mimetype='image/svg+xml')
+    response.set_etag(etag, weak=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def check_character_id(character_id):
+    """角色儲存停用或 ID 格式不符時回傳錯誤回應，否則回傳 None"""
+    if character_store is None:
+        return jsonify({
+            'success': False,
+            'error': '角色儲存未啟用',
+            'error_code': 'CHARACTER_STORE_UNAVAILABLE'
+        }), 503
+    if not valid_id(character_id):
+        return character_not_found(character_id)
+    return None
+
+def read_character(character_id):
+    """
+    讀取已儲存的角色
+
+    Returns:
+        (內容, 錯誤回應)；找到時錯誤回應為 None
+    """
+    try:
+        payload = character_store.get(character_id)
+    except (sqlite3.Error, OSError) as e:
+        return None, character_store_unavailable(e)
+    if payload is None:
+        return None, character_not_found(character_id)
+    return payload, None
+
+def character_exists(character_id):
+    """確認角色存在而不讀取內容；存在時回傳 None，否則回傳 404（或儲存無法使用時的 503）"""
+    try:
+        found = character_store.exists(character_id)
+    except (sqlite3.Error, OSError) as e:
+        return character_store_unavailable(e)
+    return None if found else character_not_found(character_id)
+
+def character_store_unavailable(error):
+    logger.error("角色儲存無法使用: %s", error)
+    return jsonify({
+        'success': False,
+        'error': '角色儲存無法使用',
+        'error_code': 'CHARACTER_STORE_UNAVAILABLE'
+    }), 503
+
+def character_not_found(character_id):
+    return jsonify({
+        'success': False,
+        'error': f'找不到角色 {character_id}',
+        'error_code': 'CHARACTER_NOT_FOUND'
+    }), 404
+
+@app.route('/api/cities')
+def search_cities():
+    """
+    🏙️ 城市自動完成
+    ?q=台&limit=10；前綴查無結果時回傳模糊比對結果（fuzzy 為 true）
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': '請提供查詢字串 q',
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    try:
+        results, fuzzy = city_index.search(query, limit)
+    except (OSError, ValueError) as e:
+        logger.error("地名索引無法使用: %s", e)
+        return jsonify({
+            'success': False,
+            'error': '地名索引無法使用',
+            'error_code': 'GAZETTEER_UNAVAILABLE'
+        }), 503
+
+    response = jsonify({
+        'success': True,
+        'query': query,
+        'fuzzy': fuzzy,
+        'results': [city.as_dict() for city in results]
+    })
+    # 索引隨部署更新，內容在部署之間不變
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@app.route('/api/timezone')
+def infer_timezone():
+    """
+    🕐 由經緯度推斷時區
+    ?latitude=25.03&longitude=121.56；ambiguous 為 true 時可能位於時區邊界附近
+    """
+    try:
+        latitude = float(request.args['latitude'])
+        longitude = float(request.args['longitude'])
+    except (KeyError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': '請提供數字格式的 latitude 與 longitude',
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({
+            'success': False,
+            'error': '緯度必須在-90到90之間，經度必須在-180到180之間',
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+
+    try:
+        guess = city_index.timezone_at(latitude, longitude)
+    except (OSError, ValueError) as e:
+        logger.error("地名索引無法使用: %s", e)
+        return jsonify({
+            'success': False,
+            'error': '地名索引無法使用',
+            'error_code': 'GAZETTEER_UNAVAILABLE'
+        }), 503
+
+    return jsonify({
+        'success': True,
+        'latitude': latitude,
+        'longitude': longitude,
+        **guess.as_dict()
+    })
+
+def diagnostics_forbidden():
+    """剖析與記憶體診斷端點共用的授權失敗回應"""
+    return jsonify({
+        'success': False,
+        'error': '需要有效的剖析密鑰',
+        'error_code': 'PROFILING_FORBIDDEN'
+    }), 403
+
+@app.route('/api/profiles')
+def list_profiles():
+    """
+    🔬 最近的請求剖析
+    需附 X-Profile-Secret；僅列出處理本請求的 worker 所保存的剖析
+    """
+    if not profiling_authorized():
+        return diagnostics_forbidden()
+
+    return jsonify({
+        'success': True,
+        'worker_pid': os.getpid(),
+        'profiles': profile_store.summaries()
+    })
+
+@app.route('/api/profiles/<profile_id>')
+def get_profile(profile_id):
+    """
+    🔬 單筆剖析詳細資料
+    ?format=pstats 下載原始 pstats 檔（僅 deterministic 模式）
+    """
+    if not profiling_authorized():
+        return diagnostics_forbidden()
+
+    record = profile_store.get(profile_id)
+    if record is None:
+        return jsonify({
+            'success': False,
+            'error': '剖析不存在或已被淘汰（剖析保存在各 worker 記憶體中）',
+            'error_code': 'PROFILE_NOT_FOUND'
+        }), 404
+
+    if request.args.get('format') == 'pstats':
+        if 'raw' not in record:
+            return jsonify({
+                'success': False,
+                'error': '僅 deterministic 模式提供 pstats 檔',
+                'error_code': 'VALIDATION_ERROR'
+            }), 400
+        return Response(record['raw'], mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename="profile-{profile_id}.pstats"'
+        })
+
+    return jsonify({
+        'success': True,
+        'profile': {k: v for k, v in record.items() if k != 'raw'}
+    })
+
+@app.route('/api/memory', methods=['GET'])
+def memory_status():
+    """
+    🧠 記憶體狀態
+    RSS、tracemalloc 追蹤狀態；追蹤中時附上配置位置排行
+    ?limit=20&group=lineno|filename|traceback&compare=1（與基準快照比較）
+    需附 X-Profile-Secret
+    """
+    if not profiling_authorized():
+        return diagnostics_forbidden()
+
+    result = {
+        'success': True,
+        'worker_pid': os.getpid(),
+        'memory': memory_tracker.status()
+    }
+    if memory_tracker.tracing:
+        group = request.args.get('group', 'lineno')
+        if group not in GROUP_KEYS:
+            return jsonify({
+                'success': False,
+                'error': f"group 必須是 {' / '.join(GROUP_KEYS)}",
+                'error_code': 'VALIDATION_ERROR'
+            }), 400
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+        compare = request.args.get('compare') == '1'
+        try:
+            result['top_allocations'] = memory_tracker.top_allocations(limit, group, compare)
+        except RuntimeError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'error_code': 'VALIDATION_ERROR'
+            }), 400
+    return jsonify(result)
+
+@app.route('/api/memory', methods=['POST'])
+def memory_control():
+    """
+    🧠 記憶體追蹤控制
+    action: start（可帶 frames）/ stop / baseline / measure（可帶 requests、precision，
+    以系統測試資料連續計算並回報每次請求的配置峰值與留存量）
+    需附 X-Profile-Secret
+    """
+    if not profiling_authorized():
+        return diagnostics_forbidden()
+
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    try:
+        if action == 'start':
+            memory_tracker.start(min(max(int(data.get('frames', 10)), 1), 50))
+        elif action == 'stop':
+            memory_tracker.stop()
+        elif action == 'baseline':
+            memory_tracker.set_baseline()
+        elif action == 'measure':
+            requests_count = min(max(int(data.get('requests', 50)), 1), 1000)
+            precision, engine = engine_registry.resolve(data.get('precision') or app.config['DEFAULT_PRECISION'])
+
+            def run(i):
+                return calculate_with_engine(engine, dict(SYSTEM_TEST_DATA, minute=(i % 60 + 60) % 60))
+
+            measurement = measure_allocations(run, requests_count)
+            measurement['precision'] = precision
+            return jsonify({
+                'success': True,
+                'worker_pid': os.getpid(),
+                'measurement': measurement,
+                'memory': memory_tracker.status()
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'action 必須是 start、stop、baseline 或 measure',
+                'error_code': 'VALIDATION_ERROR'
+            }), 400
+    except (RuntimeError, ValueError, TypeError, EngineUnavailable) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'VALIDATION_ERROR'
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'worker_pid': os.getpid(),
+        'memory': memory_tracker.status()
+    })
 
 @app.route('/api/test')
 def test_system():
@@ -687,41 +2410,30 @@ def test_system():
     使用預設資料測試系統功能
     """
     try:
-        test_data = {
-            "name": "系統測試用戶",
-            "year": 1990,
-            "month": 6,
-            "day": 15,
-            "hour": 14,
-            "minute": 30,
-            "city": "台北",
-            "longitude": 121.55,
-            "latitude": 25.017,
-            "timezone": "Asia/Taipei"
-        }
+        test_data = dict(SYSTEM_TEST_DATA)
 
         logger.info("執行系統測試")
         start_time = time.time()
 
-        if USE_REAL_ASTRO:
-            result = calculate_with_real_engine(test_data)
-        else:
-            result = calculate_with_backup_engine(test_data)
+        precision, engine = default_engine()
+        result = calculate_with_engine(engine, test_data)
 
         test_time = time.time() - start_time
 
         result['test_info'] = {
             'test_passed': True,
             'test_time': round(test_time, 3),
-            'engine_used': ENGINE_STATUS,
+            'engine_used': engine_registry.label(precision),
+            'precision': precision,
+            'reused_stages': result.pop('reused_stages', []),
             'test_timestamp': datetime.now().isoformat()
         }
 
-        logger.info(f"系統測試完成，用時 {test_time:.3f}秒")
+        logger.info("系統測試完成，用時 %.3f秒", test_time)
         return jsonify(result)
 
     except Exception as e:
-        logger.error(f"系統測試失敗: {str(e)}")
+        logger.error("系統測試失敗: %s", e)
         return jsonify({
             'success': False,
             'test_passed': False,
@@ -736,17 +2448,24 @@ def favicon():
     return send_from_directory('.', 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
 if __name__ == "__main__":
-    logger.info(f"🌟 虹靈御所占星系統 v2.0 啟動中...")
-    logger.info(f"🔧 計算引擎: {ENGINE_STATUS}")
-    logger.info(f"🌐 端口: {port}")
-    logger.info(f"📱 CORS: 已啟用")
+    logger.info("🌟 虹靈御所占星系統 v2.0 啟動中...")
+    logger.info("🔧 計算引擎: %s", engine_status())
+    logger.info("🌐 端口: %s", port)
+    logger.info("📱 CORS: 已啟用")
+
+    debug = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+    # 開發模式的 reloader 會在子程序中再執行一次本程式，只在實際服務的程序中啟動工作處理程序
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_workers = start_job_workers()
+        if job_workers is not None:
+            atexit.register(job_workers.stop)
 
     try:
         app.run(
             host="0.0.0.0", 
             port=port, 
-            debug=os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+            debug=debug
         )
     except Exception as e:
-        logger.error(f"應用啟動失敗: {str(e)}")
+        logger.error("應用啟動失敗: %s", e)
         sys.exit(1)
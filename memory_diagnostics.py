@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+記憶體診斷
+- 常駐記憶體 (RSS) 讀取，供 gunicorn worker 回收與浸泡測試使用
+- tracemalloc 追蹤：配置位置排行、與基準快照的差異
+- 逐請求量測：每次計算的暫時配置峰值與留存的記憶體
+
+tracemalloc 啟用後所有配置約慢 2-4 倍，僅在診斷期間開啟。
+"""
+
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+GROUP_KEYS = ('lineno', 'filename', 'traceback')
+
+
+def current_rss_mb() -> float:
+    """目前常駐記憶體（MB）；無 /proc 時以峰值近似"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以位元組回報，Linux 以 KB 回報
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _format_trace(trace) -> List[str]:
+    return [f"{frame.filename}:{frame.lineno}" for frame in trace]
+
+
+class MemoryTracker:
+    """tracemalloc 的啟停、基準快照與配置排行"""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10) -> None:
+        """開始追蹤；frames 為每筆配置保留的堆疊深度"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+            self._baseline_time = None
+
+    def set_baseline(self) -> None:
+        """記錄目前快照作為之後比較的基準"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError('tracemalloc 尚未啟動')
+            gc.collect()
+            self._baseline = tracemalloc.take_snapshot()
+            self._baseline_time = time.time()
+
+    def status(self) -> Dict:
+        info = {
+            'rss_mb': round(current_rss_mb(), 2),
+            'tracing': tracemalloc.is_tracing(),
+            'gc_counts': gc.get_count(),
+            'allocated_blocks': sys.getallocatedblocks(),
+            'has_baseline': self._baseline is not None,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            info.update({
+                'traced_current_kb': round(current / 1024, 1),
+                'traced_peak_kb': round(peak / 1024, 1),
+                'traceback_limit': tracemalloc.get_traceback_limit(),
+                'tracemalloc_overhead_kb': round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            })
+        if self._baseline_time is not None:
+            info['baseline_age_seconds'] = round(time.time() - self._baseline_time, 1)
+        return info
+
+    def top_allocations(self, limit: int = 20, group: str = 'lineno', compare: bool = False) -> List[Dict]:
+        """
+        配置位置排行
+
+        Args:
+            group: lineno / filename / traceback
+            compare: 與基準快照比較，依增量排序
+        """
+        if group not in GROUP_KEYS:
+            raise ValueError(f"group 必須是 {' / '.join(GROUP_KEYS)}")
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc 尚未啟動')
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+        if compare:
+            if self._baseline is None:
+                raise RuntimeError('尚未設定基準快照')
+            stats = snapshot.compare_to(self._baseline, group)
+            return [{
+                'location': _format_trace(stat.traceback),
+                'size_kb': round(stat.size / 1024, 2),
+                'size_diff_kb': round(stat.size_diff / 1024, 2),
+                'count': stat.count,
+                'count_diff': stat.count_diff,
+            } for stat in stats[:limit]]
+
+        stats = snapshot.statistics(group)
+        return [{
+            'location': _format_trace(stat.traceback),
+            'size_kb': round(stat.size / 1024, 2),
+            'count': stat.count,
+        } for stat in stats[:limit]]
+
+
+def measure_allocations(fn: Callable[[int], object], requests: int) -> Dict:
+    """
+    逐請求量測配置量；fn(i) 執行第 i 次計算
+
+    Returns:
+        peak_kb_per_request: 單次計算的暫時配置峰值（相對於計算前）平均
+        retained_bytes_per_request: 全部執行完並回收垃圾後，平均每次留存的位元組
+        retained_blocks_per_request: 同上，以配置區塊數計
+    需在 tracemalloc 追蹤中呼叫；未追蹤時暫時開啟並在結束後關閉
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(1)
+    try:
+        fn(-1)  # 預熱：首次呼叫的快取與延遲載入不列入留存量
+        gc.collect()
+        base_current, _ = tracemalloc.get_traced_memory()
+        base_blocks = sys.getallocatedblocks()
+
+        peaks = []
+        for i in range(requests):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = fn(i)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            del result
+
+        gc.collect()
+        end_current, _ = tracemalloc.get_traced_memory()
+        end_blocks = sys.getallocatedblocks()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    requests = max(requests, 1)
+    return {
+        'requests': requests,
+        'peak_kb_per_request': round(sum(peaks) / len(peaks) / 1024, 2) if peaks else 0.0,
+        'max_peak_kb': round(max(peaks) / 1024, 2) if peaks else 0.0,
+        'retained_bytes_per_request': round((end_current - base_current) / requests, 1),
+        'retained_blocks_per_request': round((end_blocks - base_blocks) / requests, 2),
+    }
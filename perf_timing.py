@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+請求階段計時模組
+記錄計算流程各階段耗時，輸出為標準 Server-Timing 標頭
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class StageTimer:
+    """
+    階段計時器
+    以 perf_counter 記錄每個階段的耗時（毫秒），同名階段會累加
+    """
+
+    enabled = True
+
+    def __init__(self):
+        """初始化計時器"""
+        self._stages: List[Tuple[str, float]] = []
+        self._index: Dict[str, int] = {}
+        self._created = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """計時一個階段"""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """記錄階段耗時（秒）"""
+        if name in self._index:
+            i = self._index[name]
+            self._stages[i] = (name, self._stages[i][1] + seconds)
+        else:
+            self._index[name] = len(self._stages)
+            self._stages.append((name, seconds))
+
+    def merge(self, other) -> None:
+        """合併另一個計時器的階段記錄"""
+        for name, seconds in getattr(other, '_stages', ()):
+            self.record(name, seconds)
+
+    def elapsed(self) -> float:
+        """計時器建立至今的秒數"""
+        return time.perf_counter() - self._created
+
+    def as_dict(self) -> Dict[str, float]:
+        """以毫秒回傳各階段耗時"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self._stages}
+
+    def server_timing_header(self, total: Optional[float] = None) -> str:
+        """
+        產生 Server-Timing 標頭值
+
+        Args:
+            total: 總耗時（秒），提供時附加 total 項目
+
+        Returns:
+            例如 "parse;dur=0.12, ephemeris;dur=8.4, total;dur=10.2"
+        """
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self._stages]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(parts)
+
+
+class _NullStage:
+    """停用計時時使用的空上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullTimer:
+    """
+    停用狀態的計時器
+    與 StageTimer 介面相同，但所有操作皆為空操作，避免停用時的額外開銷
+    """
+
+    enabled = False
+
+    def stage(self, name: str):
+        return _NULL_STAGE
+
+    def record(self, name: str, seconds: float) -> None:
+        pass
+
+    def merge(self, other) -> None:
+        pass
+
+    def elapsed(self) -> float:
+        return 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {}
+
+    def server_timing_header(self, total: Optional[float] = None) -> str:
+        return ""
+
+
+NULL_TIMER = NullTimer()
+
+
+def new_timer(enabled: bool):
+    """依設定建立計時器"""
+    return StageTimer() if enabled else NULL_TIMER
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+准入控制與速率限制
+- 以客戶端 IP 或 API Key 為鍵的令牌桶限流
+- 可選的共享記憶體後端，讓同一台機器上的多個 worker 共用額度
+- 進行中計算數量超過門檻時快速拒絕（負載削減）
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，僅能使用程序內後端
+    fcntl = None
+
+
+class TokenBucketLimiter:
+    """
+    程序內令牌桶限流器
+    每個鍵以 rate 個/秒補充令牌，最多累積 burst 個
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        """
+        Args:
+            rate: 每秒補充令牌數
+            burst: 桶容量
+            max_keys: 追蹤的鍵上限，超過時淘汰最久未使用的鍵
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        嘗試取得令牌
+
+        Returns:
+            (是否允許, 建議重試秒數)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class SharedMemoryLimiter:
+    """
+    共享記憶體令牌桶限流器
+    以 mmap 檔案保存固定數量的桶槽位，鍵經雜湊映射到槽位，跨程序以 flock 互斥。
+    槽位衝突時兩個鍵共用一個桶，屬於可接受的保守近似。
+    """
+
+    _SLOT = struct.Struct('<Qdd')  # 鍵雜湊、令牌數、上次補充時間
+
+    def __init__(self, rate: float, burst: int, path: Optional[str] = None, slots: int = 4096):
+        """
+        Args:
+            rate: 每秒補充令牌數
+            burst: 桶容量
+            path: 共享檔案路徑，預設放在 /dev/shm（不存在時使用暫存目錄）
+            slots: 槽位數量
+        """
+        if fcntl is None:
+            raise RuntimeError('共享記憶體後端需要 fcntl 支援')
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.slots = slots
+        if path is None:
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+            path = os.path.join(base, 'star_rate_limit.bin')
+        size = self._SLOT.size * slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """嘗試取得令牌，語意同 TokenBucketLimiter.acquire"""
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        offset = (digest % self.slots) * self._SLOT.size
+        now = time.time()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                stored_key, tokens, last = self._SLOT.unpack_from(self._map, offset)
+                if stored_key != digest or last <= 0:
+                    tokens, last = self.burst, now
+                tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._SLOT.pack_into(self._map, offset, digest, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class AdmissionController:
+    """
+    負載削減
+    追蹤進行中的計算數量，超過門檻時直接拒絕新的計算請求
+    """
+
+    def __init__(self, max_pending: int, retry_after: float = 1.0):
+        """
+        Args:
+            max_pending: 允許同時進行的計算數量
+            retry_after: 拒絕時建議的重試秒數
+        """
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def try_enter(self) -> bool:
+        """嘗試佔用一個計算名額"""
+        with self._lock:
+            if self.max_pending > 0 and self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+            return True
+
+    def leave(self) -> None:
+        """釋放計算名額"""
+        with self._lock:
+            self._pending = max(0, self._pending - 1)
+
+
+def create_limiter(backend: str, rate: float, burst: int):
+    """
+    依設定建立限流器
+
+    Args:
+        backend: 'memory' 或 'shm'
+        rate: 每秒補充令牌數
+        burst: 桶容量
+    """
+    if backend == 'shm':
+        return SharedMemoryLimiter(rate, burst)
+    return TokenBucketLimiter(rate, burst)
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 標頭值（整數秒，至少 1）"""
+    return str(max(1, int(math.ceil(seconds))))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+出生時間敏感度掃描（校正用）
+不確定出生時間時，一次算出時間窗內上升、天頂、月亮星座、各行星宮位與 D&D 職業的變化區段：
+1. 以解析星曆在整個分鐘網格上向量化計算星盤
+2. 找出相鄰網格點間有變化的欄位，所有變化一起以二分法收斂到秒級的邊界時刻
+3. 依時間順序套用邊界事件，推得每個區段的職業（同一組星座與宮位只判定一次）
+
+網格間距內同一欄位來回變化兩次的情況會被略過；上升點每 4 分鐘約移動 1 度，
+1-15 分鐘的間距不會發生。
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from analytic_ephemeris import (PRECISION_LEVELS, compute_chart_arrays, datetime_from_jd, local_julian_day,
+                                sign_index, timezone_info)
+from zodiac import PLANET_KEYS, SIGN_CODES, SIGN_NAMES
+
+MAX_WINDOW_MINUTES = 720
+MAX_STEP_MINUTES = 15
+DEFAULT_RESOLUTION_SECONDS = 1.0
+
+# 狀態欄位：上升星座、天頂星座、十個天體的星座、十個天體的宮位
+_ASC, _MC = 0, 1
+_SIGN_BASE = 2
+_HOUSE_BASE = _SIGN_BASE + len(PLANET_KEYS)
+_MOON = _SIGN_BASE + PLANET_KEYS.index('moon')
+
+
+def _states(jd, latitude: float, longitude: float, precision: str, house_system: str) -> np.ndarray:
+    """每個時刻的離散狀態，形狀 (N, 22)"""
+    arrays = compute_chart_arrays(jd, latitude, longitude, precision, house_system)
+    return np.column_stack([
+        sign_index(arrays['ascendant']),
+        sign_index(arrays['midheaven']),
+        sign_index(arrays['longitudes']),
+        arrays['houses'],
+    ])
+
+
+def _refine(jd: np.ndarray, states: np.ndarray, latitude: float, longitude: float,
+            precision: str, house_system: str, resolution_seconds: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    二分法收斂所有變化的邊界時刻，每輪只呼叫一次向量化星曆
+
+    Returns:
+        (邊界儒略日, 欄位索引, 變化後的值)
+    """
+    brackets, columns = np.nonzero(states[1:] != states[:-1])
+    if brackets.size == 0:
+        return np.empty(0), columns, np.empty(0, dtype=np.int64)
+    lo, hi = jd[brackets], jd[brackets + 1]
+    before = states[brackets, columns]
+    span_seconds = float(jd[1] - jd[0]) * 86400.0
+    rows = np.arange(brackets.size)
+    for _ in range(max(0, math.ceil(math.log2(span_seconds / resolution_seconds)))):
+        mid = (lo + hi) / 2
+        unchanged = _states(mid, latitude, longitude, precision, house_system)[rows, columns] == before
+        lo = np.where(unchanged, mid, lo)
+        hi = np.where(unchanged, hi, mid)
+    return (lo + hi) / 2, columns, states[brackets + 1, columns]
+
+
+class BirthTimeSweep:
+    """
+    出生時間敏感度掃描器
+
+    Args:
+        generator: DnDCharacterGenerator，用於判定每個區段的職業
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def _classify(self, state: Tuple[int, ...]) -> str:
+        planets = {
+            key: {'sign_code': SIGN_CODES[state[_SIGN_BASE + i]], 'house': int(state[_HOUSE_BASE + i])}
+            for i, key in enumerate(PLANET_KEYS)
+        }
+        return self.generator.determine_dnd_class({'planets': planets, 'houses': {}})[0]
+
+    def sweep(self, year: int, month: int, day: int, hour: int, minute: int,
+              latitude: float, longitude: float, timezone: str,
+              window_minutes: int = 120, step_minutes: int = 1, precision: str = 'fast',
+              house_system: str = 'placidus',
+              resolution_seconds: float = DEFAULT_RESOLUTION_SECONDS) -> Dict:
+        """
+        掃描出生時間前後 window_minutes 分鐘
+
+        Returns:
+            ascendant / midheaven / moon_sign / class: 區段清單
+            houses: 各天體的宮位區段
+            summary: 各項目的區段數與出生時間所在區段佔整個時間窗的比例
+        """
+        if precision not in PRECISION_LEVELS:
+            raise ValueError(f"未知的精度層級: {precision}")
+        if not 1 <= window_minutes <= MAX_WINDOW_MINUTES:
+            raise ValueError(f"window_minutes 必須在 1-{MAX_WINDOW_MINUTES} 之間")
+        if not 1 <= step_minutes <= min(MAX_STEP_MINUTES, window_minutes):
+            raise ValueError(f"step_minutes 必須在 1-{MAX_STEP_MINUTES} 之間且不大於 window_minutes")
+
+        center = local_julian_day(year, month, day, hour, minute, timezone)
+        steps = window_minutes // step_minutes
+        jd = center + np.arange(-steps, steps + 1) * (step_minutes / 1440.0)
+        states = _states(jd, latitude, longitude, precision, house_system)
+        boundaries, columns, values = _refine(jd, states, latitude, longitude, precision, house_system,
+                                              resolution_seconds)
+
+        # 依時間順序套用邊界事件；職業依整組星座與宮位判定並快取
+        classes: Dict[Tuple[int, ...], str] = {}
+
+        def classify(state: np.ndarray) -> str:
+            key = tuple(int(v) for v in state)
+            if key not in classes:
+                classes[key] = self._classify(key)
+            return classes[key]
+
+        state = states[0].copy()
+        starts = {column: [(jd[0], int(state[column]))] for column in range(states.shape[1])}
+        class_starts = [(jd[0], classify(state))]
+        for index in np.argsort(boundaries, kind='stable'):
+            t, column, value = boundaries[index], int(columns[index]), int(values[index])
+            state[column] = value
+            starts[column].append((t, value))
+            dnd_class = classify(state)
+            if dnd_class != class_starts[-1][1]:
+                class_starts.append((t, dnd_class))
+
+        tz = timezone_info(timezone)
+        end = jd[-1]
+
+        def segments(points: List[Tuple[float, object]], describe) -> List[Dict]:
+            result = []
+            for i, (start, value) in enumerate(points):
+                stop = points[i + 1][0] if i + 1 < len(points) else end
+                result.append({
+                    'start': datetime_from_jd(start, tz).isoformat(),
+                    'end': datetime_from_jd(stop, tz).isoformat(),
+                    'duration_minutes': round((stop - start) * 1440.0, 2),
+                    **describe(value),
+                })
+            return result
+
+        def sign(value: int) -> Dict:
+            code = SIGN_CODES[value]
+            return {'sign': SIGN_NAMES[code], 'sign_code': code}
+
+        def dnd_class(value: str) -> Dict:
+            return {'key': value, 'name': self.generator.dnd_classes[value]['name']}
+
+        result = {
+            'center': datetime_from_jd(center, tz).isoformat(),
+            'start': datetime_from_jd(jd[0], tz).isoformat(),
+            'end': datetime_from_jd(end, tz).isoformat(),
+            'ascendant': segments(starts[_ASC], sign),
+            'midheaven': segments(starts[_MC], sign),
+            'moon_sign': segments(starts[_MOON], sign),
+            'houses': {
+                key: segments(starts[_HOUSE_BASE + i], lambda value: {'house': value})
+                for i, key in enumerate(PLANET_KEYS)
+            },
+            'class': segments(class_starts, dnd_class),
+        }
+        result['summary'] = {
+            name: _center_share(result[name], center, jd[0], end)
+            for name in ('ascendant', 'midheaven', 'moon_sign', 'class')
+        }
+        result['summary']['grid_points'] = int(jd.size)
+        result['summary']['boundaries'] = int(boundaries.size)
+        return result
+
+
+def _center_share(segments: List[Dict], center: float, start: float, end: float) -> Dict:
+    """區段數，以及出生時間所在區段佔整個時間窗的比例（越接近 1 越不受出生時間誤差影響）"""
+    total = (end - start) * 1440.0
+    offset = (center - start) * 1440.0
+    elapsed = 0.0
+    share = 1.0
+    for segment in segments:
+        if elapsed <= offset <= elapsed + segment['duration_minutes']:
+            share = segment['duration_minutes'] / total if total > 0 else 1.0
+            break
+        elapsed += segment['duration_minutes']
+    return {'segments': len(segments), 'center_share': round(share, 3)}
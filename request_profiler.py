@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+單一請求剖析
+在不重新部署的情況下剖析個別請求，找出時間花在 kerykeion 內部、時區解析還是本專案的資料組裝：
+- deterministic: cProfile，完整呼叫次數與呼叫關係（開銷較高，約 1.5-3 倍）
+- sampling: 背景執行緒定期擷取請求執行緒的呼叫堆疊，輸出 folded stacks（可直接畫火焰圖）；
+  約每毫秒一次取樣，適合數十毫秒以上的慢請求
+
+剖析結果保存在 worker 記憶體中的環狀緩衝區，每個 worker 各自保存。
+"""
+
+import cProfile
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_MODES = ('deterministic', 'sampling')
+
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 依檔案路徑歸類自身耗時
+_CATEGORIES = (
+    ('kerykeion', ('kerykeion', 'swisseph')),
+    ('timezone', ('pytz', 'zoneinfo', 'tzdata', 'dateutil')),
+    ('framework', ('flask', 'werkzeug', 'jinja2', 'flask_cors')),
+    ('json', ('json',)),
+    ('numpy', ('numpy',)),
+)
+
+
+def categorize(filename: str, name: str = '') -> str:
+    """
+    將函式歸類為 kerykeion / timezone / framework / json / numpy / app / builtin / other
+    C 擴充函式（cProfile 以 ~ 表示檔名）改由函式名稱判斷，例如 <built-in method swisseph.calc_ut>
+    """
+    normalized = filename.replace('\\', '/')
+    if normalized == '~':
+        for category, packages in _CATEGORIES:
+            if any(f"{p}." in name for p in packages):
+                return category
+        return 'builtin'
+    parts = normalized.split('/')
+    for category, packages in _CATEGORIES:
+        if any(p in parts for p in packages):
+            return category
+    if normalized.startswith(_REPO_DIR.replace('\\', '/')) and 'site-packages' not in normalized:
+        return 'app'
+    if normalized.startswith('<'):
+        return 'builtin'
+    return 'other'
+
+
+def _function_label(filename: str, lineno: int, name: str) -> str:
+    return f"{os.path.basename(filename)}:{lineno}({name})" if lineno else f"{filename}({name})"
+
+
+class SamplingProfiler:
+    """
+    取樣剖析器
+    以背景執行緒每 interval 秒讀取目標執行緒的堆疊。CPU 密集的目標執行緒預設每 5ms 才釋放 GIL，
+    取樣期間暫時把直譯器切換間隔降到 interval（程序層級設定，最後一個取樣器結束時還原），
+    實際取樣數記錄於結果中。C 擴充函式內的時間歸屬於呼叫它的 Python 函式。
+    """
+
+    _active = 0
+    _saved_switch_interval = 0.0
+    _switch_lock = threading.Lock()
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        cls = SamplingProfiler
+        with cls._switch_lock:
+            if cls._active == 0:
+                cls._saved_switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(cls._saved_switch_interval, self.interval))
+            cls._active += 1
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            cls = SamplingProfiler
+            with cls._switch_lock:
+                cls._active -= 1
+                if cls._active == 0:
+                    sys.setswitchinterval(cls._saved_switch_interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+
+class RequestProfile:
+    """進行中的單一請求剖析"""
+
+    def __init__(self, mode: str):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的剖析模式: {mode}")
+        self.mode = mode
+        self._profiler = cProfile.Profile() if mode == 'deterministic' else SamplingProfiler()
+        self._started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self.mode == 'deterministic':
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def stop(self) -> None:
+        if self.mode == 'deterministic':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        self.duration = time.perf_counter() - self._started
+
+    def result(self, limit: int = 40) -> Dict:
+        """彙整為可序列化的結果"""
+        if self.mode == 'deterministic':
+            return self._deterministic_result(limit)
+        return self._sampling_result(limit)
+
+    def _deterministic_result(self, limit: int) -> Dict:
+        stats = pstats.Stats(self._profiler)
+        by_category: Counter = Counter()
+        functions = []
+        edges = []
+        for (filename, lineno, name), (cc, nc, tottime, cumtime, callers) in stats.stats.items():
+            label = _function_label(filename, lineno, name)
+            category = categorize(filename, name)
+            by_category[category] += tottime
+            functions.append({
+                'function': label, 'category': category, 'ncalls': nc,
+                'tottime_ms': round(tottime * 1000, 3), 'cumtime_ms': round(cumtime * 1000, 3),
+            })
+            for (c_file, c_line, c_name), caller_stats in callers.items():
+                edges.append({
+                    'caller': _function_label(c_file, c_line, c_name), 'callee': label,
+                    'cumtime_ms': round(caller_stats[3] * 1000, 3),
+                })
+        functions.sort(key=lambda f: f['cumtime_ms'], reverse=True)
+        edges.sort(key=lambda e: e['cumtime_ms'], reverse=True)
+        return {
+            'functions': functions[:limit],
+            'call_edges': edges[:limit * 2],
+            'by_category_ms': {k: round(v * 1000, 3) for k, v in by_category.most_common()},
+            'raw': marshal.dumps(stats.stats),  # 原始 pstats 資料，可用 pstats / snakeviz 開啟
+        }
+
+    def _sampling_result(self, limit: int) -> Dict:
+        sampler: SamplingProfiler = self._profiler
+        total = max(sampler.samples, 1)
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        by_category: Counter = Counter()
+        folded = {}
+        for stack, count in sampler.stacks.items():
+            labels = [_function_label(*frame) for frame in stack]
+            folded[';'.join(labels)] = count
+            own[labels[-1]] += count
+            by_category[categorize(stack[-1][0], stack[-1][2])] += count
+            for label in set(labels):
+                inclusive[label] += count
+        scale = self.duration * 1000 / total
+        functions = [{
+            'function': label, 'samples': inclusive[label], 'own_samples': own[label],
+            'cumtime_ms': round(inclusive[label] * scale, 3), 'tottime_ms': round(own[label] * scale, 3),
+        } for label, _ in inclusive.most_common(limit)]
+        return {
+            'samples': sampler.samples,
+            'functions': functions,
+            'folded_stacks': dict(sorted(folded.items(), key=lambda kv: kv[1], reverse=True)[:limit * 5]),
+            'by_category_ms': {k: round(v * scale, 3) for k, v in by_category.most_common()},
+        }
+
+
+class ProfileStore:
+    """最近剖析結果的環狀緩衝區（執行緒安全）"""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, path: str, profile: RequestProfile, status_code: int, extra: Optional[Dict] = None) -> str:
+        """保存剖析結果，回傳剖析 ID"""
+        result = profile.result()
+        profile_id = f"{os.getpid()}-{next(self._ids)}"
+        record = dict(result, **{
+            'id': profile_id,
+            'timestamp': datetime.now().isoformat(),
+            'path': path,
+            'mode': profile.mode,
+            'status_code': status_code,
+            'duration_ms': round(profile.duration * 1000, 3),
+        }, **(extra or {}))
+        with self._lock:
+            self._profiles.append(record)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            for record in self._profiles:
+                if record['id'] == profile_id:
+                    return record
+        return None
+
+    def summaries(self, top: int = 5) -> List[Dict]:
+        """由新到舊的摘要（不含完整呼叫資料）"""
+        with self._lock:
+            records = list(self._profiles)
+        return [{
+            'id': r['id'], 'timestamp': r['timestamp'], 'path': r['path'], 'mode': r['mode'],
+            'status_code': r['status_code'], 'duration_ms': r['duration_ms'],
+            'by_category_ms': r['by_category_ms'],
+            'top_functions': [f['function'] for f in r['functions'][:top]],
+        } for r in reversed(records)]
+
+
+def requested_mode(header_value: Optional[str]) -> Optional[str]:
+    """解析剖析請求標頭：1 / true / deterministic / cprofile → deterministic，sample / sampling → sampling"""
+    if not header_value:
+        return None
+    value = header_value.strip().lower()
+    if value in ('1', 'true', 'deterministic', 'cprofile'):
+        return 'deterministic'
+    if value in ('sample', 'sampling'):
+        return 'sampling'
+    return None
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+出生資料請求結構定義
+以宣告式欄位描述請求內容，編譯一次後重複使用：
+- validate(): 單筆請求，型別轉換、範圍檢查與日曆有效性（如 2 月 30 日）一次回報
+- validate_columns(): 欄位式批次資料（工作佇列與欄式匯出），以 NumPy 向量化一次驗證整批，結果與逐筆驗證相同
+"""
+
+import calendar
+import math
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analytic_ephemeris import timezone_info
+from zodiac import HOUSE_SYSTEMS
+
+
+
+@dataclass(frozen=True)
+class Field:
+    """欄位定義"""
+    name: str
+    type: type
+    label: str
+    required: bool = True
+    min: Optional[float] = None
+    max: Optional[float] = None
+    default: Any = None
+    choices: Optional[Tuple[str, ...]] = None  # 字串欄位的允許值
+    check: Optional[Callable[[str], bool]] = None  # 字串欄位的額外檢查，不通過時回報 range_message
+    range_message: str = ''
+    type_message: str = ''
+
+
+@dataclass
+class ValidationResult:
+    """單筆驗證結果"""
+    values: Dict[str, Any]
+    missing_fields: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing_fields and not self.errors
+
+
+@dataclass
+class BatchValidationResult:
+    """批次驗證結果；missing_fields 與 errors 以列索引記錄，內容同 ValidationResult"""
+    columns: Dict[str, np.ndarray]
+    present: Dict[str, np.ndarray]
+    valid: np.ndarray
+    missing_fields: Dict[int, List[str]]
+    errors: Dict[int, List[str]]
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.valid.all())
+
+    def values(self, row: int) -> Dict[str, Any]:
+        """單列轉換後的值，與 validate() 的 values 相同（未提供且無預設值的選填欄位省略）"""
+        return {name: column[row].item() if isinstance(column[row], np.generic) else column[row]
+                for name, column in self.columns.items() if self.present[name][row]}
+
+
+def _days_in_month(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def _convert(raw: Any, ftype: type):
+    """
+    單一數值的轉換，validate() 與 validate_columns() 共用同一規則：
+    int 欄位接受整數、整數值的浮點數與整數字串（"12.5"、12.5 皆無效）；數值必須有限（拒絕 NaN 與無限大）
+
+    Raises:
+        ValueError, TypeError: 無法轉換
+    """
+    if ftype is int:
+        if isinstance(raw, str):
+            return int(raw)
+        value = float(raw)
+        if not value.is_integer():
+            raise ValueError(raw)
+        return int(value)
+    value = ftype(raw)
+    if not math.isfinite(value):
+        raise ValueError(raw)
+    return value
+
+
+class CompiledSchema:
+    """
+    編譯後的驗證器
+    欄位表在建構時攤平為 tuple，驗證時只做一次迴圈，不再查詢欄位屬性
+    """
+
+    def __init__(self, fields: Sequence[Field]):
+        self.fields = tuple(fields)
+        self.required_fields = tuple(f.name for f in self.fields if f.required)
+        self._plan = tuple(
+            (f.name, f.type, f.required, f.min, f.max, f.default, f.choices, f.check, f.range_message, f.type_message)
+            for f in self.fields
+        )
+
+    def validate(self, data: Dict) -> ValidationResult:
+        """
+        驗證單筆請求
+
+        Args:
+            data: 請求 JSON
+
+        Returns:
+            ValidationResult，values 為轉換後的值
+        """
+        values: Dict[str, Any] = {}
+        missing: List[str] = []
+        errors: List[str] = []
+
+        for name, ftype, required, lo, hi, default, choices, check, range_msg, type_msg in self._plan:
+            raw = data.get(name)
+            if raw is None:
+                if required:
+                    missing.append(name)
+                elif default is not None:
+                    values[name] = default
+                continue
+            if ftype is str:
+                value = raw if isinstance(raw, str) else str(raw)
+                if (choices is not None and value not in choices) or (check is not None and not check(value)):
+                    errors.append(range_msg)
+                    continue
+                values[name] = value
+                continue
+            try:
+                value = _convert(raw, ftype)
+            except (ValueError, TypeError, OverflowError):
+                errors.append(type_msg)
+                continue
+            if (lo is not None and value < lo) or (hi is not None and value > hi):
+                errors.append(range_msg)
+                continue
+            values[name] = value
+
+        # 日曆有效性：年月日各自合法時才檢查組合
+        if 'year' in values and 'month' in values and 'day' in values:
+            if values['day'] > _days_in_month(values['year'], values['month']):
+                errors.append(f"日期無效: {values['year']}年{values['month']}月沒有{values['day']}日")
+
+        return ValidationResult(values=values, missing_fields=missing, errors=errors)
+
+    def validate_columns(self, columns: Dict[str, Sequence]) -> BatchValidationResult:
+        """
+        向量化驗證欄位式批次資料，每列的結果與逐筆 validate() 相同
+
+        Args:
+            columns: 欄位名稱 -> 等長序列；缺少的欄位或 None 元素視為未提供
+
+        Returns:
+            BatchValidationResult，valid 為每列是否通過的布林陣列
+        """
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('批次欄位長度不一致')
+        n = lengths.pop() if lengths else 0
+
+        valid = np.ones(n, dtype=bool)
+        missing_fields: Dict[int, List[str]] = {}
+        errors: Dict[int, List[str]] = {}
+        converted: Dict[str, np.ndarray] = {}
+        present: Dict[str, np.ndarray] = {}
+        field_bad: Dict[str, np.ndarray] = {}
+
+        def flag(mask: np.ndarray, message: str, target: Dict[int, List[str]] = errors) -> None:
+            for row in np.flatnonzero(mask):
+                target.setdefault(int(row), []).append(message)
+            valid[mask] = False
+
+        for f in self.fields:
+            raw = columns.get(f.name)
+            if raw is None:
+                raw = [None] * n
+            numeric_input = isinstance(raw, np.ndarray) and raw.dtype.kind in 'biuf'
+            missing = np.zeros(n, dtype=bool) if numeric_input else np.array([v is None for v in raw], dtype=bool)
+            if f.required:
+                flag(missing, f.name, missing_fields)
+            present[f.name] = ~missing | (f.default is not None)
+
+            if f.type is str:
+                arr = np.empty(n, dtype=object)
+                arr[:] = [v if v is None or isinstance(v, str) else str(v) for v in raw]
+                # 允許值與額外檢查只對不重複的值各做一次
+                rejected = {v for v in set(arr[~missing]) if (f.choices is not None and v not in f.choices)
+                            or (f.check is not None and not f.check(v))}
+                if rejected:
+                    flag(np.array([v in rejected for v in arr], dtype=bool), f.range_message)
+                if f.default is not None:
+                    arr[missing] = f.default
+                converted[f.name] = arr
+                continue
+
+            numeric, bad = _coerce_numeric(raw, f.type, numeric_input)
+            bad &= ~missing
+            flag(bad, f.type_message)
+            out = np.zeros(n, dtype=bool)
+            if f.min is not None:
+                out |= numeric < f.min
+            if f.max is not None:
+                out |= numeric > f.max
+            out &= ~(bad | missing)
+            flag(out, f.range_message)
+            if f.default is not None:
+                numeric[missing] = f.default
+            converted[f.name] = numeric
+            field_bad[f.name] = bad | out | missing
+
+        if all(k in field_bad for k in ('year', 'month', 'day')):
+            year, month, day = converted['year'], converted['month'], converted['day']
+            ok = ~(field_bad['year'] | field_bad['month'] | field_bad['day'])
+            month_idx = np.where(ok, month, 0).astype(np.int64)
+            leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+            limit = _DAYS_IN_MONTH[month_idx] + ((month_idx == 2) & leap)
+            bad_date = ok & (day > limit)
+            for row in np.flatnonzero(bad_date):
+                errors.setdefault(int(row), []).append(
+                    f"日期無效: {int(year[row])}年{int(month[row])}月沒有{int(day[row])}日")
+            valid[bad_date] = False
+
+        return BatchValidationResult(columns=converted, present=present, valid=valid,
+                                     missing_fields=missing_fields, errors=errors)
+
+
+def _coerce_numeric(raw: Sequence, ftype: type, numeric_input: bool):
+    """
+    將欄位轉為數值陣列
+    數值陣列整欄直接檢查；其他輸入（含字串或 None）逐元素以 _convert 轉換
+
+    Returns:
+        (數值陣列, 無法轉換的布林遮罩)
+    """
+    dtype = np.int64 if ftype is int else np.float64
+    if numeric_input:
+        values = np.asarray(raw, dtype=np.float64)
+        bad = ~np.isfinite(values)
+        if ftype is int:
+            bad |= np.trunc(np.where(bad, 0, values)) != np.where(bad, 0, values)
+    else:
+        values = np.zeros(len(raw), dtype=np.float64)
+        bad = np.zeros(len(raw), dtype=bool)
+        for i, item in enumerate(raw):
+            if item is None:
+                continue
+            try:
+                values[i] = _convert(item, ftype)
+            except (ValueError, TypeError, OverflowError):
+                bad[i] = True
+    return np.where(bad, 0, values).astype(dtype), bad
+
+
+@lru_cache(maxsize=1024)
+def known_timezone(name: str) -> bool:
+    """IANA 時區名稱是否可解析（同 analytic_ephemeris.timezone_info）"""
+    try:
+        timezone_info(name)
+    except ValueError:
+        return False
+    return True
+
+
+def compile_schema(fields: Sequence[Field]) -> CompiledSchema:
+    """編譯欄位定義"""
+    return CompiledSchema(fields)
+
+
+# 出生資料請求結構，/api/calculate_chart 與批次路徑共用
+BIRTH_DATA_FIELDS = (
+    Field('name', str, '姓名'),
+    Field('year', int, '年份', min=1900, max=2050,
+          range_message='年份必須在1900-2050之間', type_message='年份必須是數字'),
+    Field('month', int, '月份', min=1, max=12,
+          range_message='月份必須在1-12之間', type_message='月份必須是數字'),
+    Field('day', int, '日期', min=1, max=31,
+          range_message='日期必須在1-31之間', type_message='日期必須是數字'),
+    Field('hour', int, '小時', min=0, max=23,
+          range_message='小時必須在0-23之間', type_message='小時必須是數字'),
+    Field('minute', int, '分鐘', min=0, max=59,
+          range_message='分鐘必須在0-59之間', type_message='分鐘必須是數字'),
+    Field('city', str, '城市'),
+    Field('longitude', float, '經度', min=-180, max=180,
+          range_message='經度必須在-180到180之間', type_message='經度必須是數字'),
+    Field('latitude', float, '緯度', min=-90, max=90,
+          range_message='緯度必須在-90到90之間', type_message='緯度必須是數字'),
+    Field('timezone', str, '時區', required=False, default='Asia/Taipei', check=known_timezone,
+          range_message='時區無法識別，請使用 IANA 時區名稱（如 Asia/Taipei）'),
+    Field('precision', str, '計算精度', required=False, choices=('exact', 'fast', 'approx'),
+          range_message='precision 必須是 exact、fast 或 approx'),
+    Field('house_system', str, '宮位制', required=False, default='placidus', choices=tuple(HOUSE_SYSTEMS),
+          range_message=f"house_system 必須是 {'、'.join(HOUSE_SYSTEMS)}"),
+)
+
+BIRTH_DATA_SCHEMA = compile_schema(BIRTH_DATA_FIELDS)
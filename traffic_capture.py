@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+流量擷取
+將 /api/calculate_chart 的請求內容（去識別化）、回應狀態、耗時與輸出摘要寫入輪替的 NDJSON 檔，
+供 benchmarks/replay_capture.py 重播，以真實的出生年份、時區與重複率分佈調校快取：
+- 姓名以帶鹽 HMAC 轉為代號，經緯度四捨五入到 0.01 度（約 1 公里），只保留結構中定義的欄位
+- 寫檔由背景執行緒負責，請求執行緒只把記錄放入佇列
+- 每個 worker 各自寫入檔名含 PID 的檔案，避免多程序同時輪替同一個檔案
+
+輸出摘要只包含與隨機無關的欄位（星座、宮位、度數、職業），重播時可直接比對。
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from concurrency import AtomicCounter
+
+CAPTURE_VERSION = 1
+
+# 保留的請求欄位；經緯度另行四捨五入
+_KEPT_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'city', 'longitude', 'latitude',
+                'timezone', 'precision', 'house_system')
+_COORDINATE_FIELDS = ('longitude', 'latitude')
+_MAX_STRING_LENGTH = 64
+
+
+def sanitize_payload(data, salt: bytes) -> Optional[Dict]:
+    """
+    去識別化的請求內容；非物件的 body 回傳 None
+    型別錯誤的值原樣保留（截斷長字串），重播時才能重現相同的驗證錯誤
+    """
+    if not isinstance(data, dict):
+        return None
+    payload = {}
+    name = data.get('name')
+    if name is not None:
+        digest = hmac.new(salt, str(name).encode('utf-8'), hashlib.sha256).hexdigest()
+        payload['name'] = f"anon-{digest[:12]}"
+    for key in _KEPT_FIELDS:
+        if key not in data:
+            continue
+        value = data[key]
+        if key in _COORDINATE_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(float(value), 2)
+        elif isinstance(value, str):
+            value = value[:_MAX_STRING_LENGTH]
+        elif not isinstance(value, (int, float, bool)) and value is not None:
+            value = str(value)[:_MAX_STRING_LENGTH]
+        payload[key] = value
+    return payload
+
+
+def output_fingerprint(result: Dict) -> Optional[Dict]:
+    """計算結果中與隨機無關部分的摘要；屬性與背景故事含亂數，不列入"""
+    astro = result.get('astro_data')
+    character = result.get('character')
+    if not astro or not character:
+        return None
+    # 依鍵排序：回應序列化時 Flask 預設會重排物件鍵，擷取與 HTTP 重播的順序不同
+    summary = {
+        'planets': sorted((k, p['sign_code'], p['house'], round(p['position'], 2))
+                          for k, p in astro['planets'].items()),
+        'houses': sorted((k, round(h['position'], 2)) for k, h in astro['houses'].items()),
+        'angles': sorted((k, round(a['position'], 2)) for k, a in astro['angles'].items()),
+        'class': character['class']['key'],
+    }
+    digest = hashlib.sha1(json.dumps(summary, sort_keys=True).encode('utf-8')).hexdigest()
+    return {
+        'hash': digest[:16],
+        'class': summary['class'],
+        'signs': {k: p['sign_code'] for k, p in astro['planets'].items()},
+    }
+
+
+class _JsonLineFormatter(logging.Formatter):
+    """記錄的 msg 即為要寫出的 dict，在背景執行緒才序列化"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False, separators=(',', ':'))
+
+
+class TrafficCapture:
+    """
+    輪替檔案的流量擷取器
+    首次寫入時才建立背景執行緒與檔案（gunicorn 預載時，fork 後的每個 worker 各自開檔）
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 sample_rate: float = 1.0, salt: str = ''):
+        self.path_template = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        # 未設定鹽時每個程序隨機產生：同一 worker 內同名者代號一致，但無法跨檔案反查
+        self._salt = salt.encode('utf-8') if salt else os.urandom(16)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self.path: Optional[str] = None
+        self.records = AtomicCounter()
+
+    def should_capture(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _ensure_started(self) -> queue.SimpleQueue:
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._queue
+        with self._lock:
+            if self._pid != pid:
+                # fork 前的背景執行緒不會被繼承，子程序重新開檔
+                self.path = self.path_template.replace('{pid}', str(pid))
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+                handler.setFormatter(_JsonLineFormatter())
+                self._queue = queue.SimpleQueue()
+                self._listener = logging.handlers.QueueListener(self._queue, handler)
+                self._listener.start()
+                self._pid = pid
+        return self._queue
+
+    def record(self, data, status: int, duration_ms: float, result: Optional[Dict] = None) -> None:
+        """
+        加入一筆擷取記錄
+
+        Args:
+            data: 原始請求 body（於此去識別化）
+            status: 回應狀態碼
+            duration_ms: 請求總耗時
+            result: 成功時的計算結果，用於輸出摘要與實際精度層級
+        """
+        entry = {
+            'v': CAPTURE_VERSION,
+            'ts': round(time.time(), 4),
+            'worker': os.getpid(),
+            'status': status,
+            'duration_ms': round(duration_ms, 3),
+            'payload': sanitize_payload(data, self._salt),
+        }
+        if result is not None:
+            metadata = result.get('metadata', {})
+            entry['precision'] = metadata.get('precision')
+            entry['calculation_ms'] = round(metadata.get('calculation_time', 0) * 1000, 3)
+            if metadata.get('degraded_reason'):
+                entry['degraded_reason'] = metadata['degraded_reason']
+            entry['output'] = output_fingerprint(result)
+        self._ensure_started().put(logging.makeLogRecord({'msg': entry}))
+        self.records.increment()
+
+    def close(self) -> None:
+        """寫出佇列中剩餘的記錄並關閉檔案"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+            self._listener = None
+            self._pid = None
+
+    def status(self) -> Dict:
+        return {
+            'path': self.path or self.path_template,
+            'sample_rate': self.sample_rate,
+            'records': self.records.value,
+            'max_bytes': self.max_bytes,
+            'backups': self.backups,
+        }
+
+
+def capture_files(paths: Iterable[str]) -> List[str]:
+    """展開擷取檔清單，並納入輪替產生的 .1、.2 … 舊檔（由舊到新）"""
+    files = []
+    for path in paths:
+        rotated = []
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            rotated.append(f"{path}.{index}")
+            index += 1
+        files.extend(reversed(rotated))
+        if os.path.exists(path):
+            files.append(path)
+    return files
+
+
+def read_capture(paths: Iterable[str]) -> Iterator[Dict]:
+    """逐行讀取擷取檔；無法解析的行（例如寫到一半被中止）略過"""
+    for path in capture_files(paths):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and entry.get('v') == CAPTURE_VERSION:
+                    yield entry
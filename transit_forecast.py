@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+行運預測
+回傳日期範圍內行運天體與本命盤各點形成的每個相位，含入相、出相與精確時刻：
+1. 依天體速度決定取樣間距，以解析星曆在整個範圍上向量化計算黃經（外行星共用每日一點的網格，一次算完）
+2. 對所有（行運天體 × 本命點 × 相位目標）序列同時計算與精確相位的角距，
+   由相鄰取樣點找出進出容許度與角距變號（精確）的區間
+3. 所有區間一起以二分法收斂到秒級，每輪每組天體只呼叫一次向量化星曆
+
+取樣間距使每步移動量不超過容許度，入相到出相不會整段落在兩個取樣點之間；
+逆行停滯時只擦過容許度邊緣（兩個取樣點間進出各一次）的情況會被略過。
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analytic_ephemeris import BODY_GROUPS, PRECISION_LEVELS, body_group, datetime_from_jd
+from chart_wheel import wheel_points
+from zodiac import ASPECT_NAMES, ASPECTS, PLANET_KEYS, PLANET_NAMES
+
+DEFAULT_BODIES = ('jupiter', 'saturn', 'uranus', 'neptune', 'pluto')
+NATAL_POINTS = tuple(PLANET_KEYS) + ('ascendant', 'midheaven')
+ANGLE_NAMES = {'ascendant': '上升點', 'midheaven': '天頂'}
+DEFAULT_ORB = 1.0
+MAX_ORB = 10.0
+MAX_SAMPLES = 200000  # 單一天體的取樣點上限（月亮每度約 1.6 小時）
+DEFAULT_RESOLUTION_SECONDS = 1.0
+
+# 天體最大視速度（度/日），決定取樣間距；外行星以每日一點為上限
+MAX_SPEED = {
+    'sun': 1.02, 'moon': 15.4, 'mercury': 2.2, 'venus': 1.26, 'mars': 0.8,
+    'jupiter': 0.25, 'saturn': 0.13, 'uranus': 0.07, 'neptune': 0.04, 'pluto': 0.04,
+}
+MAX_STEP_DAYS = 1.0
+
+# 快速天體：每年與每個本命點形成數十至上千次相位，成本隨範圍內的相位數增長，API 對這些天體另設較短的範圍上限
+FAST_BODIES = ('sun', 'moon', 'mercury', 'venus', 'mars')
+
+_GROUP_OF = {body: (group, column) for group, bodies in BODY_GROUPS for column, body in enumerate(bodies)}
+
+
+def point_name(key: str) -> str:
+    return ANGLE_NAMES.get(key) or PLANET_NAMES[key.capitalize()]
+
+
+def sample_step(body: str, orb: float) -> float:
+    """取樣間距（日）：每步移動量不超過容許度"""
+    return min(MAX_STEP_DAYS, orb / MAX_SPEED[body])
+
+
+def natal_from_arrays(arrays: Dict[str, np.ndarray], row: int = 0) -> Dict[str, float]:
+    """compute_chart_arrays 結果中一列的本命點黃經"""
+    natal = {key: float(arrays['longitudes'][row, i]) for i, key in enumerate(PLANET_KEYS)}
+    natal.update(ascendant=float(arrays['ascendant'][row]), midheaven=float(arrays['midheaven'][row]))
+    return natal
+
+
+def natal_from_astro_data(astro_data: Dict) -> Dict[str, float]:
+    """已儲存角色的 astro_data 轉本命點黃經（星座內度數只到 0.01 度）"""
+    points = wheel_points(astro_data)
+    natal = {key: longitude for key, longitude, _ in points['planets']}
+    natal.update(ascendant=points['ascendant'], midheaven=points['midheaven'])
+    return natal
+
+
+def _wrap(angle: np.ndarray) -> np.ndarray:
+    """角度差換算到 [-180, 180)"""
+    return np.mod(angle + 180.0, 360.0) - 180.0
+
+
+def _longitudes(jd: np.ndarray, bodies: np.ndarray, keys: List[str],
+                precision: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每個時刻各自指定天體的黃經與逆行旗標，同組天體共用一次 body_group
+
+    Args:
+        jd: 形狀 (M,)
+        bodies: 形狀 (M,)，keys 的索引
+    """
+    longitudes = np.empty(jd.shape)
+    retrograde = np.zeros(jd.shape, dtype=bool)
+    for group, _ in BODY_GROUPS:
+        members = [i for i, key in enumerate(keys) if _GROUP_OF[key][0] == group]
+        mask = np.isin(bodies, members)
+        if not mask.any():
+            continue
+        columns = np.array([_GROUP_OF[keys[i]][1] if i in members else 0 for i in range(len(keys))])
+        values, motion = body_group(group, jd[mask], precision)
+        rows = np.arange(values.shape[0])
+        selected = columns[bodies[mask]]
+        longitudes[mask] = values[rows, selected]
+        if motion is not None:
+            retrograde[mask] = motion[rows, selected] < 0
+    return longitudes, retrograde
+
+
+def _targets(natal: Dict[str, float], aspects: Iterable[str]) -> List[Tuple[str, str, float]]:
+    """相位目標：(本命點, 相位, 目標黃經)；合相與對分相一個目標，其餘相位在本命點兩側各一個"""
+    targets = []
+    for point in NATAL_POINTS:
+        if point not in natal:
+            continue
+        for aspect in aspects:
+            angle = ASPECTS[aspect][0]
+            for side in ((angle,) if angle in (0.0, 180.0) else (angle, -angle)):
+                targets.append((point, aspect, float(np.mod(natal[point] + side, 360.0))))
+    return targets
+
+
+def transit_forecast(natal: Dict[str, float], start_jd: float, end_jd: float,
+                     bodies: Iterable[str] = DEFAULT_BODIES, aspects: Iterable[str] = tuple(ASPECTS),
+                     orb: float = DEFAULT_ORB, precision: str = 'fast', tz=None,
+                     resolution_seconds: float = DEFAULT_RESOLUTION_SECONDS) -> Dict:
+    """
+    行運天體對本命點的相位
+
+    Args:
+        natal: 本命點黃經（NATAL_POINTS 的子集）
+        start_jd, end_jd: UT 儒略日範圍
+        orb: 所有相位共用的容許度（度）
+        tz: 輸出時間的時區；None 為 UTC
+
+    Returns:
+        transits: 每段在容許度內的期間（依開始時間排序）；範圍開始時已在容許度內則 start 為 None，結束時仍在則 end 為 None
+        summary: 期間數、精確次數與取樣點數
+    """
+    bodies, aspects = list(bodies), list(aspects)
+    if precision not in PRECISION_LEVELS:
+        raise ValueError(f"未知的精度層級: {precision}")
+    unknown = [key for key in bodies if key not in PLANET_KEYS] + [key for key in aspects if key not in ASPECTS]
+    if unknown:
+        raise ValueError(f"未知的天體或相位: {', '.join(unknown)}")
+    if not bodies or not aspects:
+        raise ValueError("至少需要一個行運天體與一個相位")
+    if not 0 < orb <= MAX_ORB:
+        raise ValueError(f"orb 必須在 0-{MAX_ORB} 度之間")
+    if not end_jd > start_jd:
+        raise ValueError("結束日期必須晚於開始日期")
+
+    targets = _targets(natal, aspects)
+    target_longitudes = np.array([target[2] for target in targets])
+
+    # 取樣：相同間距的天體共用網格，每組天體一次向量化計算
+    grids: Dict[float, List[int]] = {}
+    for b, body in enumerate(bodies):
+        grids.setdefault(sample_step(body, orb), []).append(b)
+    series = []  # (天體索引, 時刻, 角距 (N, T))
+    samples = 0
+    for step, members in grids.items():
+        count = math.ceil((end_jd - start_jd) / step) + 1
+        if count > MAX_SAMPLES:
+            raise ValueError(f"日期範圍過長：{bodies[members[0]]} 需要 {count} 個取樣點，請縮短範圍或加大 orb")
+        jd = np.minimum(start_jd + np.arange(count) * step, end_jd)
+        index = np.repeat(np.array(members), count)
+        longitudes, _ = _longitudes(np.tile(jd, len(members)), index, bodies, precision)
+        for k, b in enumerate(members):
+            series.append((b, jd, _wrap(longitudes[k * count:(k + 1) * count, None] - target_longitudes)))
+        samples += count * len(members)
+
+    # 偵測：進出容許度（c = ±orb）與精確相位（c = 0）的區間；h(t) = 角距 - c 在區間兩端異號
+    brackets = []  # (序列索引, 取樣索引, 目標索引, c, 種類)
+    for s, (b, jd, offset) in enumerate(series):
+        inside = np.abs(offset) <= orb
+        rows, columns = np.nonzero(inside[1:] != inside[:-1])
+        outside = np.where(inside[rows, columns], offset[rows + 1, columns], offset[rows, columns])
+        for i, t, c, entering in zip(rows, columns, np.sign(outside) * orb, ~inside[rows, columns]):
+            brackets.append((s, i, t, c, 'enter' if entering else 'exit'))
+        positive = offset >= 0
+        rows, columns = np.nonzero((positive[1:] != positive[:-1]) & (np.abs(offset[:-1]) < 90.0))
+        for i, t in zip(rows, columns):
+            brackets.append((s, i, t, 0.0, 'exact'))
+
+    times, retrograde = _refine(brackets, series, bodies, target_longitudes, precision, resolution_seconds)
+
+    # 依時間順序組成每段容許度內的期間
+    events: Dict[Tuple[int, int], List] = {}
+    for (s, i, t, _, kind), moment, backward in zip(brackets, times, retrograde):
+        events.setdefault((s, t), []).append((moment, kind, bool(backward)))
+    periods = []
+    for s, (b, jd, offset) in enumerate(series):
+        columns = set(np.nonzero(np.abs(offset[0]) <= orb)[0]) | {t for (e, t) in events if e == s}
+        for t in columns:
+            periods.extend(_periods(bodies[b], targets[t], jd, offset[:, t], orb,
+                                    sorted(events.get((s, t), []), key=lambda event: event[0])))
+    periods.sort(key=lambda period: (period['_start'], period['_first']))
+
+    def local(jd: Optional[float]) -> Optional[str]:
+        return datetime_from_jd(jd, tz).isoformat() if jd is not None else None
+
+    transits = []
+    for period in periods:
+        transits.append({
+            'transit': period['transit'],
+            'transit_name': point_name(period['transit']),
+            'natal': period['natal'],
+            'natal_name': point_name(period['natal']),
+            'aspect': period['aspect'],
+            'aspect_name': ASPECT_NAMES[period['aspect']],
+            'angle': ASPECTS[period['aspect']][0],
+            'start': local(period['start']),
+            'end': local(period['end']),
+            'exact': [{'time': local(moment), 'retrograde': backward} for moment, backward in period['exact']],
+            'closest_orb': period['closest_orb'],
+        })
+    return {
+        'start': local(start_jd),
+        'end': local(end_jd),
+        'transits': transits,
+        'summary': {
+            'periods': len(transits),
+            'exact_hits': sum(len(period['exact']) for period in periods),
+            'series': len(bodies) * len(targets),
+            'samples': samples,
+            'refined': len(brackets),
+        },
+    }
+
+
+def _refine(brackets: List, series: List, bodies: List[str], target_longitudes: np.ndarray,
+            precision: str, resolution_seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+    """二分法收斂所有區間，回傳 (時刻, 時刻的逆行旗標)"""
+    if not brackets:
+        return np.empty(0), np.empty(0, dtype=bool)
+    sequence = np.array([bracket[0] for bracket in brackets])
+    rows = np.array([bracket[1] for bracket in brackets])
+    target = target_longitudes[[bracket[2] for bracket in brackets]]
+    c = np.array([bracket[3] for bracket in brackets])
+    body = np.array([series[s][0] for s in sequence])
+    lo = np.array([series[s][1][i] for s, i in zip(sequence, rows)])
+    hi = np.array([series[s][1][i + 1] for s, i in zip(sequence, rows)])
+    positive = np.array([series[s][2][i, t] for s, i, t, _, _ in brackets]) - c >= 0
+    span_seconds = float(np.max(hi - lo)) * 86400.0
+    for _ in range(max(0, math.ceil(math.log2(span_seconds / resolution_seconds)))):
+        mid = (lo + hi) / 2
+        longitudes, _ = _longitudes(mid, body, bodies, precision)
+        same = (_wrap(longitudes - target) - c >= 0) == positive
+        lo = np.where(same, mid, lo)
+        hi = np.where(same, hi, mid)
+    moment = (lo + hi) / 2
+    return moment, _longitudes(moment, body, bodies, precision)[1]
+
+
+def _periods(body: str, target: Tuple[str, str, float], jd: np.ndarray, offset: np.ndarray,
+             orb: float, events: List) -> List[Dict]:
+    """單一序列的容許度內期間；closest_orb 為期間內最接近精確的角距（有精確時刻時為 0）"""
+    natal, aspect, _ = target
+    periods = []
+    current = None
+
+    def close(end: Optional[float]) -> None:
+        first, last = np.searchsorted(jd, current['start'] if current['start'] is not None else jd[0]), \
+            np.searchsorted(jd, end if end is not None else jd[-1], side='right')
+        window = np.abs(offset[first:last])
+        closest = 0.0 if current['exact'] or window.size == 0 else float(window.min())
+        current.update(end=end, closest_orb=round(closest, 3))
+        periods.append(current)
+
+    def open_period(start: Optional[float]) -> Dict:
+        return {'transit': body, 'natal': natal, 'aspect': aspect, 'start': start, 'exact': [],
+                '_start': start if start is not None else jd[0]}
+
+    if abs(offset[0]) <= orb:
+        current = open_period(None)
+    for moment, kind, backward in events:
+        if kind == 'enter':
+            current = open_period(moment)
+        elif kind == 'exit':
+            if current is not None:
+                close(moment)
+            current = None
+        elif current is not None:
+            current['exact'].append((moment, backward))
+    if current is not None:
+        close(None)
+    for period in periods:
+        period['_first'] = period['exact'][0][0] if period['exact'] else period['_start']
+    return periods
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+互動式「如果…會怎樣」工作階段
+用戶端建立工作階段後開啟 Server-Sent Events 串流，之後每次拖動只送出變動的欄位（出生分鐘、城市、宮位制…），
+伺服器保留該工作階段的星盤狀態，以增量計算重算後只推送有變化的欄位：
+- 推送內容為 JSON Merge Patch (RFC 7396)：只含變動的鍵，被移除的鍵為 null
+- 每個工作階段固定屬性亂數種子，同一星盤的屬性不會因重算而跳動
+- 閒置超過 idle_seconds 的工作階段過期；總數或估計記憶體超過上限時淘汰最久未使用者
+- 工作階段存在 worker 記憶體中，多 worker 部署需讓同一工作階段的請求落在同一 worker
+
+用戶端的串流佇列有上限，消費太慢時清空並改送 resync 事件，由用戶端重新取得完整文件。
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from concurrency import AtomicCounter
+
+# 每個工作階段除文件外的固定開銷估計（物件、鎖、星盤狀態陣列）
+_SESSION_OVERHEAD_BYTES = 8 * 1024
+
+_CLOSED = object()
+
+
+def merge_patch(old, new):
+    """
+    產生由 old 變為 new 的 JSON Merge Patch
+    相同時回傳 None（呼叫端以此判斷沒有變化）
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return None if old == new else new
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+            continue
+        child = merge_patch(old[key], value)
+        if child is not None or (value is None and old[key] is not None):
+            patch[key] = child
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch or None
+
+
+def format_event(event: str, data: Dict, event_id: Optional[int] = None) -> str:
+    """Server-Sent Events 格式的一則事件"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _document_size(document: Dict) -> int:
+    return _SESSION_OVERHEAD_BYTES + len(json.dumps(document, ensure_ascii=False).encode('utf-8'))
+
+
+class SessionClosed(Exception):
+    """工作階段已關閉、過期或被淘汰"""
+
+
+class WhatIfSession:
+    """
+    單一工作階段
+    inputs 為用戶端送出的欄位（套用增量用）；data 為補齊與驗證後的計算輸入
+    document 為目前的完整文件；state 為增量計算的基準狀態
+    """
+
+    def __init__(self, session_id: str, data: Dict, inputs: Dict, seed: int):
+        self.id = session_id
+        self.data = data
+        self.inputs = inputs
+        self.seed = seed
+        self.state = None
+        self.document: Dict = {}
+        self.seq = 0
+        self.size = _SESSION_OVERHEAD_BYTES
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        self.closed_reason: Optional[str] = None
+        self.lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+
+    def rng(self) -> random.Random:
+        """每次重算都從相同種子開始，屬性的隨機變化在工作階段內固定"""
+        return random.Random(self.seed)
+
+    def publish(self, event: str, data: Dict, queue_size: int) -> None:
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # 消費太慢：丟棄積壓的增量，改送 resync 讓用戶端重新取得完整文件
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(('resync', {'seq': self.seq}))
+
+    def subscribe(self, queue_size: int) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=queue_size)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self.lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def close(self, reason: str) -> None:
+        self.closed_reason = reason
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(_CLOSED)
+            except queue.Full:
+                subscriber.get_nowait()
+                subscriber.put_nowait(_CLOSED)
+        self._subscribers.clear()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+class SessionStore:
+    """
+    工作階段儲存
+
+    Args:
+        compute: compute(data, base_state, rng) -> (文件, 新狀態, 重用的階段)
+        max_sessions: 工作階段數上限
+        max_bytes: 全部工作階段估計記憶體上限
+        idle_seconds: 閒置多久後過期
+        queue_size: 每個串流的事件佇列上限
+        max_streams: 同時開啟的串流上限（每個串流佔用一個 worker 執行緒）；0 表示不限
+    """
+
+    def __init__(self, compute: Callable[[Dict, object, random.Random], Tuple[Dict, object, List[str]]],
+                 max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_seconds: float = 900, queue_size: int = 32, max_streams: int = 0):
+        self.compute = compute
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.queue_size = queue_size
+        self.max_streams = max_streams
+        self._sessions: 'OrderedDict[str, WhatIfSession]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._streams = 0
+        self.created = AtomicCounter()
+        self.updates = AtomicCounter()
+        self.expired = AtomicCounter()
+        self.evicted = AtomicCounter()
+        self.patch_bytes = AtomicCounter()
+        self.document_bytes = AtomicCounter()
+
+    def create(self, data: Dict, inputs: Dict) -> WhatIfSession:
+        """建立工作階段並計算初始文件"""
+        session = WhatIfSession(os.urandom(12).hex(), data, inputs, int.from_bytes(os.urandom(8), 'little'))
+        document, session.state, _ = self.compute(data, None, session.rng())
+        session.document = document
+        session.size = _document_size(document)
+        with self._lock:
+            self._expire_idle_locked()
+            self._sessions[session.id] = session
+            self._bytes += session.size
+            self._evict_locked()
+        self.created.increment()
+        return session
+
+    def get(self, session_id: str, touch: bool = True) -> Optional[WhatIfSession]:
+        """取得工作階段；已過期者回傳 None"""
+        with self._lock:
+            self._expire_idle_locked()
+            session = self._sessions.get(session_id)
+            if session is not None and touch:
+                session.last_active = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def update(self, session: WhatIfSession, data: Dict, inputs: Dict) -> Tuple[int, Optional[Dict], List[str]]:
+        """
+        以新輸入重算，推送與前一版文件的差異
+
+        Returns:
+            (序號, merge patch（沒有變化時為 None）, 重用的階段)
+        """
+        with session.lock:
+            if session.closed_reason is not None:
+                raise SessionClosed(session.closed_reason)
+            document, state, reused = self.compute(data, session.state, session.rng())
+            patch = merge_patch(session.document, document)
+            session.data, session.inputs, session.state, session.document = data, inputs, state, document
+            session.seq += 1
+            seq = session.seq
+            size = _document_size(document)
+            self.document_bytes.increment(size - _SESSION_OVERHEAD_BYTES)
+            if patch is not None:
+                self.patch_bytes.increment(len(json.dumps(patch, ensure_ascii=False).encode('utf-8')))
+                session.publish('patch', {'seq': seq, 'patch': patch, 'reused_stages': reused}, self.queue_size)
+        with self._lock:
+            if self._sessions.get(session.id) is session:
+                self._bytes += size - session.size
+                session.size = size
+                self._evict_locked()
+        self.updates.increment()
+        return seq, patch, reused
+
+    def close(self, session_id: str, reason: str = 'closed') -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._bytes -= session.size
+        session.close(reason)
+        return True
+
+    def _expire_idle_locked(self) -> None:
+        deadline = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_active > deadline:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= session.size
+            session.close('expired')
+            self.expired.increment()
+
+    def _evict_locked(self) -> None:
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, session = self._sessions.popitem(last=False)
+            self._bytes -= session.size
+            session.close('evicted')
+            self.evicted.increment()
+
+    def try_open_stream(self) -> bool:
+        """
+        保留一個串流名額；已達 max_streams 時回傳 False
+        檢查與保留在同一個鎖內完成，同時開啟的請求不會超過上限；保留成功者須呼叫 release_stream 歸還
+        """
+        with self._lock:
+            if self.max_streams and self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def release_stream(self) -> None:
+        """歸還 try_open_stream 保留的名額"""
+        with self._lock:
+            self._streams = max(0, self._streams - 1)
+
+    def stream(self, session: WhatIfSession, heartbeat: float = 15.0) -> Iterator[str]:
+        """
+        工作階段的 SSE 串流：先送出完整文件，再逐一轉送增量
+        工作階段關閉時送出 closed 事件並結束
+        """
+        with session.lock:
+            subscriber = session.subscribe(self.queue_size)
+            yield format_event('snapshot', {'seq': session.seq, 'document': session.document}, session.seq)
+        try:
+            while True:
+                try:
+                    item = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    # 註解行維持連線，同時讓閒置的工作階段有機會過期
+                    self.get(session.id, touch=False)
+                    yield ": keepalive\n\n"
+                    continue
+                if item is _CLOSED:
+                    yield format_event('closed', {'reason': session.closed_reason})
+                    return
+                event, data = item
+                yield format_event(event, data, data.get('seq'))
+        finally:
+            session.unsubscribe(subscriber)
+
+    def status(self) -> Dict:
+        with self._lock:
+            self._expire_idle_locked()
+            count, size, streams = len(self._sessions), self._bytes, self._streams
+        document_bytes = self.document_bytes.value
+        return {
+            'sessions': count,
+            'max_sessions': self.max_sessions,
+            'estimated_bytes': size,
+            'max_bytes': self.max_bytes,
+            'idle_seconds': self.idle_seconds,
+            'streams': streams,
+            'max_streams': self.max_streams,
+            'created': self.created.value,
+            'updates': self.updates.value,
+            'expired': self.expired.value,
+            'evicted': self.evicted.value,
+            # 推送的增量相對完整文件的位元組比例
+            'patch_ratio': round(self.patch_bytes.value / document_bytes, 3) if document_bytes else None,
+        }
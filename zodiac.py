@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+黃道星座與行星對照表
+真實引擎與解析星曆引擎共用，不依賴 kerykeion
+"""
+
+# 依黃經順序排列的星座代碼，索引 = int(黃經 // 30)
+SIGN_CODES = ['Ari', 'Tau', 'Gem', 'Can', 'Leo', 'Vir', 'Lib', 'Sco', 'Sag', 'Cap', 'Aqu', 'Pis']
+
+SIGN_NAMES = {
+    'Ari': '牡羊座', 'Tau': '金牛座', 'Gem': '雙子座', 'Can': '巨蟹座',
+    'Leo': '獅子座', 'Vir': '處女座', 'Lib': '天秤座', 'Sco': '天蠍座',
+    'Sag': '射手座', 'Cap': '摩羯座', 'Aqu': '水瓶座', 'Pis': '雙魚座'
+}
+
+PLANET_NAMES = {
+    'Sun': '太陽', 'Moon': '月亮', 'Mercury': '水星', 'Venus': '金星',
+    'Mars': '火星', 'Jupiter': '木星', 'Saturn': '土星',
+    'Uranus': '天王星', 'Neptune': '海王星', 'Pluto': '冥王星'
+}
+
+# 星盤輸出使用的行星鍵，順序與 calculate_natal_chart 一致
+PLANET_KEYS = ['sun', 'moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto']
+
+# 支援的宮位制與對應的 Swiss Ephemeris 代碼
+HOUSE_SYSTEMS = {'placidus': 'P', 'porphyry': 'O', 'equal': 'A', 'whole_sign': 'W'}
+
+HOUSE_KEYS = ['1st', '2nd', '3rd', '4th', '5th', '6th', '7th', '8th', '9th', '10th', '11th', '12th']
+
+# 星座元素和性質
+ELEMENTS = {
+    'Ari': '火', 'Leo': '火', 'Sag': '火',
+    'Tau': '土', 'Vir': '土', 'Cap': '土',
+    'Gem': '風', 'Lib': '風', 'Aqu': '風',
+    'Can': '水', 'Sco': '水', 'Pis': '水'
+}
+
+QUALITIES = {
+    'Ari': '開創', 'Can': '開創', 'Lib': '開創', 'Cap': '開創',
+    'Tau': '固定', 'Leo': '固定', 'Sco': '固定', 'Aqu': '固定',
+    'Gem': '變動', 'Vir': '變動', 'Sag': '變動', 'Pis': '變動'
+}
+
+# 星盤圖使用的符號（附加 U+FE0E 以文字樣式顯示，避免被繪成彩色表情符號）
+SIGN_GLYPHS = {code: glyph + '\ufe0e' for code, glyph in zip(SIGN_CODES, '♈♉♊♋♌♍♎♏♐♑♒♓')}
+PLANET_GLYPHS = {key: glyph + '\ufe0e' for key, glyph in zip(PLANET_KEYS, '☉☽☿♀♂♃♄♅♆♇')}
+
+# 主要相位：名稱 → (角度, 容許度)
+ASPECTS = {
+    'conjunction': (0.0, 8.0),
+    'sextile': (60.0, 6.0),
+    'square': (90.0, 8.0),
+    'trine': (120.0, 8.0),
+    'opposition': (180.0, 8.0),
+}
+
+ASPECT_NAMES = {
+    'conjunction': '合相', 'sextile': '六分相', 'square': '四分相', 'trine': '三分相', 'opposition': '對分相'
+}